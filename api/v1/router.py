@@ -1,7 +1,11 @@
 from fastapi import APIRouter
 from controllers.search_controller import router as search_router
 from controllers.common_controller import router as common_router
+from controllers.jobs_controller import router as jobs_router
+from controllers.admin_controller import router as admin_router
 
 api_router = APIRouter()
 api_router.include_router(search_router, prefix="/domclick", tags=["domclick"])
-api_router.include_router(common_router, prefix="/common", tags=["common"])
\ No newline at end of file
+api_router.include_router(common_router, prefix="/common", tags=["common"])
+api_router.include_router(jobs_router, prefix="/jobs", tags=["jobs"])
+api_router.include_router(admin_router, prefix="/admin", tags=["admin"])
\ No newline at end of file
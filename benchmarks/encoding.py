@@ -0,0 +1,96 @@
+"""
+Size and CPU cost of a /common/process response body in each encoding the
+API negotiates: JSON or MessagePack, uncompressed, gzip or zstd. Decode
+time is what a client spends parsing the uncompressed body:
+
+    python -m benchmarks.encoding --responses 1000 --iterations 20
+"""
+import argparse
+import gzip
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+from core.config import settings
+from core.schemas.response import StandardResponse
+from domain.models.search import SearchResult
+from infrastructure.serialization import encode_msgpack, encode_responses, msgpack
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional encoding
+    zstandard = None
+
+
+def batch(count: int) -> List[StandardResponse]:
+    """count found-user responses, shaped like /common/process output"""
+    return [
+        StandardResponse.model_construct(
+            headers={"sender": "domclick-service"},
+            body={"results": [SearchResult(
+                first_name="Иван",
+                middle_name="Петрович",
+                last_name="Сидоров",
+                user_id=1000000 + i,
+                is_registered="Да",
+                is_partner="Да",
+                avatar=f"https://example.com/avatar/{1000000 + i}.jpg",
+                partner_link=f"https://domclick.ru/partner/{1000000 + i}",
+                client_review="4.8",
+                registered_at="2022-03-15T10:30:00Z",
+                deals_count=45,
+                client_comments_count=23
+            )]},
+            extra={
+                "query": f"7931{i:07d}",
+                "data_type": "phone",
+                "providers": {"domclick": {"status": "ok", "latency_ms": 120.5}},
+                "results_count": 1,
+                "service_used": "DomClick",
+            }
+        )
+        for i in range(count)
+    ]
+
+
+def time_ms(call: Callable[[], Any], iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call()
+    return (time.perf_counter() - started) / iterations * 1000
+
+
+def run(count: int, iterations: int) -> Dict[str, Any]:
+    responses = batch(count)
+    formats = {"json": (lambda: encode_responses(responses), json.loads)}
+    if msgpack is not None:
+        formats["msgpack"] = (lambda: encode_msgpack(responses), msgpack.unpackb)
+    compressors = {"identity": lambda body: body, "gzip": lambda body: gzip.compress(body, settings.GZIP_LEVEL)}
+    if zstandard is not None:
+        compressors["zstd"] = zstandard.ZstdCompressor(level=settings.ZSTD_LEVEL).compress
+
+    results = {}
+    for name, (encode, decode) in formats.items():
+        body = encode()
+        encode_ms = time_ms(encode, iterations)
+        decode_ms = time_ms(lambda: decode(body), iterations)
+        for encoding, compress in compressors.items():
+            results[f"{name}+{encoding}"] = {
+                "bytes": len(compress(body)),
+                "encode_ms": round(encode_ms + time_ms(lambda: compress(body), iterations), 3),
+                "decode_ms": round(decode_ms, 3),
+            }
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--responses", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.responses, args.iterations), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
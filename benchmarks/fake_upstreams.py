@@ -0,0 +1,127 @@
+import asyncio
+import random
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from aiohttp import web
+from domain.services.classifier import classify
+
+
+@dataclass
+class UpstreamBehavior:
+    """How a fake upstream answers: latency in seconds, rates as probabilities"""
+    latency: float = 0.02
+    jitter: float = 0.01
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: Optional[float] = None
+
+    async def delay(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def failure(self) -> Optional[web.Response]:
+        roll = random.random()
+        if roll < self.throttle_rate:
+            headers = {"Retry-After": str(self.retry_after)} if self.retry_after else None
+            return web.Response(status=429, headers=headers)
+        if roll < self.throttle_rate + self.error_rate:
+            return web.Response(status=500)
+        return None
+
+
+class FakeUpstreams:
+    """
+    Local stand-ins for Validator IS and the DomClick user_info endpoint,
+    served by one aiohttp app and counting every call they receive.
+    """
+
+    def __init__(
+        self,
+        validator: Optional[UpstreamBehavior] = None,
+        domclick: Optional[UpstreamBehavior] = None,
+        found_rate: float = 0.8
+    ):
+        self.validator = validator or UpstreamBehavior()
+        self.domclick = domclick or UpstreamBehavior()
+        self.found_rate = found_rate
+        self.calls = Counter()
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url: Optional[str] = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/v1/validate", self._validate)
+        app.router.add_get("/portal/api/v1/user_info", self._user_info)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.calls)
+
+    async def _validate(self, request: web.Request) -> web.Response:
+        self.calls["validator"] += 1
+        await self.validator.delay()
+        failure = self.validator.failure()
+        if failure is not None:
+            self.calls[f"validator_{failure.status}"] += 1
+            return failure
+
+        queries: List[str] = (await request.json())["query"]
+        self.calls["validator_queries"] += len(queries)
+        return web.json_response([
+            {
+                "headers": {"sender": "tw.tools.validator"},
+                "body": {
+                    "request_data": query,
+                    "type": classification.data_type,
+                    "clean_data": classification.clean_data
+                },
+                "extra": {}
+            }
+            for query, classification in zip(queries, classify(queries))
+        ])
+
+    async def _user_info(self, request: web.Request) -> web.Response:
+        self.calls["domclick"] += 1
+        await self.domclick.delay()
+        failure = self.domclick.failure()
+        if failure is not None:
+            self.calls[f"domclick_{failure.status}"] += 1
+            return failure
+
+        phone = request.query.get("phone", "")
+        if random.random() >= self.found_rate:
+            return web.json_response({})
+        return web.json_response(self._user(phone))
+
+    @staticmethod
+    def _user(phone: str) -> Dict[str, Any]:
+        cas_id = int(phone[-7:] or 0) + 1000000
+        return {
+            "casId": cas_id,
+            "firstName": "Иван",
+            "middleName": "Петрович",
+            "lastName": "Сидоров",
+            "partnerCard": {
+                "photoUrl": f"https://example.com/avatar/{cas_id}.jpg",
+                "clientReview": "4.8",
+                "registeredAt": "2022-03-15T10:30:00Z",
+                "dealsCount": 45,
+                "clientCommentsCount": 23
+            }
+        }
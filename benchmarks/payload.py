@@ -0,0 +1,76 @@
+"""
+CPU cost of turning a DomClick user_info body into SearchResults: the
+previous path (decode to text, json.loads, adapt) against
+decode_user_info (bytes, pruned and checked, then adapt):
+
+    python -m benchmarks.payload --iterations 20000 --reviews 200
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+from domain.services.domclick_service import DomClickService
+from infrastructure.external.domclick_payload import decode_user_info
+
+
+def user_info(reviews: int) -> bytes:
+    """A found user whose partnerCard carries `reviews` entries nobody reads"""
+    payload = {
+        "casId": 1234567,
+        "firstName": "Иван",
+        "middleName": "Петрович",
+        "lastName": "Сидоров",
+        "partnerCard": {
+            "photoUrl": "https://example.com/avatar/1234567.jpg",
+            "clientReview": "4.8",
+            "registeredAt": "2022-03-15T10:30:00Z",
+            "dealsCount": 45,
+            "clientCommentsCount": 23,
+            "reviews": [
+                {"id": i, "author": f"Клиент {i}", "rating": 5, "text": "Отличный агент, рекомендую " * 4}
+                for i in range(reviews)
+            ],
+        },
+    }
+    return json.dumps(payload, ensure_ascii=False).encode()
+
+
+def time_path(decode: Callable[[bytes], Dict[str, Any]], body: bytes, iterations: int) -> float:
+    """Mean microseconds per lookup for decode plus adapt"""
+    adapt = DomClickService._adapt_response
+    started = time.perf_counter()
+    for _ in range(iterations):
+        adapt(None, decode(body))
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+
+def run(iterations: int, reviews: List[int]) -> Dict[str, Any]:
+    previous = lambda body: json.loads(body.decode("utf-8"))
+    results = {}
+    for count in reviews:
+        body = user_info(count)
+        assert DomClickService._adapt_response(None, previous(body)) == \
+            DomClickService._adapt_response(None, decode_user_info(body))
+        before = time_path(previous, body, iterations)
+        after = time_path(decode_user_info, body, iterations)
+        results[f"reviews_{count}"] = {
+            "payload_bytes": len(body),
+            "previous_us": round(before, 2),
+            "fast_path_us": round(after, 2),
+            "speedup": round(before / after, 2) if after else None,
+        }
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--reviews", type=int, nargs="+", default=[0, 20, 200], help="partnerCard sizes to try")
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.iterations, args.reviews), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""
+Load/latency benchmark for the API against local fake upstreams.
+
+Starts FakeUpstreams in this process and the app under uvicorn in a
+subprocess pointed at them, then drives each scenario at a fixed
+concurrency and prints a JSON report:
+
+    python -m benchmarks.run --concurrency 50 --duration 20 --output bench.json
+    python -m benchmarks.run --baseline bench.json  # exits 1 on regression
+
+Each run starts with an empty lookup store in a temporary directory, so
+results do not depend on earlier runs; --lookup-store keeps one across
+runs to measure warm starts.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import aiohttp
+from benchmarks.fake_upstreams import FakeUpstreams, UpstreamBehavior
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("process", "search")
+
+# The app's own DomClick rate limit would cap every run at DOMCLICK_RATE,
+# so it is lifted unless overridden with --env
+APP_ENV = {"MODE": "benchmark", "DOMCLICK_RATE": "0", "JOB_WORKERS": "0"}
+
+Send = Callable[[aiohttp.ClientSession], Awaitable[Tuple[int, int]]]
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(
+    latencies: List[float],
+    statuses: Counter,
+    failed_items: int,
+    elapsed: float,
+    queries_per_request: int
+) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    requests = len(ordered)
+    ms = lambda value: round(value * 1000, 2)
+    return {
+        "requests": requests,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2) if elapsed > 0 else 0.0,
+        "queries_per_second": round(requests * queries_per_request / elapsed, 2) if elapsed > 0 else 0.0,
+        "status_codes": dict(statuses),
+        "errors": sum(count for status, count in statuses.items() if status != "200"),
+        "failed_items": failed_items,
+        "latency_ms": {
+            "min": ms(ordered[0]) if ordered else 0.0,
+            "mean": ms(sum(ordered) / requests) if ordered else 0.0,
+            "p50": ms(percentile(ordered, 50)),
+            "p95": ms(percentile(ordered, 95)),
+            "p99": ms(percentile(ordered, 99)),
+            "max": ms(ordered[-1]) if ordered else 0.0,
+        },
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of throughput or tail latency beyond tolerance against a previous report"""
+    regressions = []
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {current['throughput_rps']} rps < baseline {previous['throughput_rps']} rps"
+            )
+        for key in ("p95", "p99"):
+            now, before = current["latency_ms"][key], previous["latency_ms"][key]
+            if now > before * (1 + tolerance):
+                regressions.append(f"{name}: {key} {now} ms > baseline {before} ms")
+    return regressions
+
+
+class Shed(Exception):
+    """The app answered 503; a well-behaved client waits Retry-After seconds"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Shed, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def check_shed(response: aiohttp.ClientResponse):
+    if response.status == 503:
+        raise Shed(float(response.headers.get("Retry-After", 1)))
+
+
+def phone_pool(size: int) -> List[str]:
+    return [f"7931{number:07d}" for number in range(size)]
+
+
+def process_request(base_url: str, phones: List[str], batch_size: int) -> Send:
+    async def send(session: aiohttp.ClientSession) -> Tuple[int, int]:
+        queries = random.sample(phones, batch_size)
+        async with session.post(f"{base_url}/api/v1/common/process", json={"queries": queries}) as response:
+            check_shed(response)
+            if response.status != 200:
+                return response.status, 0
+            items = await response.json()
+            return response.status, sum(1 for item in items if "error" in item["body"])
+    return send
+
+
+def search_request(base_url: str, phones: List[str]) -> Send:
+    async def send(session: aiohttp.ClientSession) -> Tuple[int, int]:
+        async with session.get(f"{base_url}/api/v1/domclick/search/phone/{random.choice(phones)}") as response:
+            check_shed(response)
+            await response.read()
+            return response.status, 0
+    return send
+
+
+async def drive(
+    session: aiohttp.ClientSession,
+    send: Send,
+    concurrency: int,
+    duration: float,
+    total: Optional[int] = None
+) -> Tuple[List[float], Counter, int, float]:
+    """Keep `concurrency` requests in flight until duration or total requests is reached"""
+    latencies: List[float] = []
+    statuses = Counter()
+    failed_items = 0
+    issued = 0
+    started = time.perf_counter()
+    deadline = started + duration
+
+    async def worker():
+        nonlocal issued, failed_items
+        while time.perf_counter() < deadline and (total is None or issued < total):
+            issued += 1
+            sent = time.perf_counter()
+            backoff = 0.0
+            try:
+                status, failed = await send(session)
+            except Shed as e:
+                status, failed, backoff = 503, 0, e.retry_after
+            except Exception as e:
+                status, failed = type(e).__name__, 0
+            latencies.append(time.perf_counter() - sent)
+            statuses[str(status)] += 1
+            failed_items += failed
+            if backoff:
+                await asyncio.sleep(min(backoff, max(0.0, deadline - time.perf_counter())))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, failed_items, time.perf_counter() - started
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(port: int, workers: int, env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "infrastructure.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning", "--no-access-log"
+        ],
+        cwd=ROOT,
+        env={**os.environ, **env},
+    )
+
+
+async def wait_ready(session: aiohttp.ClientSession, base_url: str, app: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if app.poll() is not None:
+            raise RuntimeError(f"App exited with code {app.returncode} during startup")
+        try:
+            async with session.get(f"{base_url}/ready") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"App did not become ready within {timeout}s")
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    fakes = FakeUpstreams(
+        validator=UpstreamBehavior(latency=args.validator_latency, jitter=args.jitter, error_rate=args.validator_error_rate),
+        domclick=UpstreamBehavior(
+            latency=args.domclick_latency,
+            jitter=args.jitter,
+            error_rate=args.domclick_error_rate,
+            throttle_rate=args.domclick_throttle_rate,
+            retry_after=args.retry_after
+        ),
+        found_rate=args.found_rate
+    )
+    upstream_url = await fakes.start()
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = {
+            **APP_ENV,
+            "VALIDATOR_ENDPOINT": upstream_url,
+            "DOMCLICK_BASE_URL": upstream_url,
+            "JOB_DB_PATH": os.path.join(data_dir, "jobs.sqlite3"),
+            "LOOKUP_STORE_PATH": args.lookup_store or os.path.join(data_dir, "lookups.sqlite3"),
+            **dict(item.split("=", 1) for item in args.env),
+        }
+        app = start_app(port, args.workers, env)
+        connector = aiohttp.TCPConnector(limit=0)
+        timeout = aiohttp.ClientTimeout(total=args.request_timeout)
+        try:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+                await wait_ready(session, base_url, app)
+                phones = phone_pool(args.unique_phones)
+                senders = {
+                    "process": (process_request(base_url, phones, args.batch_size), args.batch_size),
+                    "search": (search_request(base_url, phones), 1),
+                }
+                scenarios = {}
+                for name in args.scenarios:
+                    send, queries_per_request = senders[name]
+                    if args.warmup > 0:
+                        await drive(session, send, args.concurrency, args.warmup)
+                    before = Counter(fakes.calls)
+                    latencies, statuses, failed_items, elapsed = await drive(
+                        session, send, args.concurrency, args.duration, args.requests
+                    )
+                    scenarios[name] = summarize(latencies, statuses, failed_items, elapsed, queries_per_request)
+                    scenarios[name]["upstream_calls"] = dict(Counter(fakes.calls) - before)
+        finally:
+            app.terminate()
+            app.wait(timeout=10)
+            await fakes.stop()
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "scenarios": scenarios,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    parser.add_argument("--requests", type=int, default=None, help="stop a scenario after this many requests")
+    parser.add_argument("--warmup", type=float, default=2, help="unrecorded seconds before each scenario")
+    parser.add_argument("--batch-size", type=int, default=10, help="queries per /common/process request")
+    parser.add_argument("--unique-phones", type=int, default=100000, help="phone pool size; smaller means more cache hits")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--request-timeout", type=float, default=30)
+    parser.add_argument("--validator-latency", type=float, default=0.02)
+    parser.add_argument("--validator-error-rate", type=float, default=0.0)
+    parser.add_argument("--domclick-latency", type=float, default=0.05)
+    parser.add_argument("--domclick-error-rate", type=float, default=0.0)
+    parser.add_argument("--domclick-throttle-rate", type=float, default=0.0, help="share of DomClick calls answered 429")
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After sent with 429 responses")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--found-rate", type=float, default=0.8)
+    parser.add_argument("--lookup-store", help="persistent lookup store to start warm from; default is a fresh one")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra app setting")
+    parser.add_argument("--output", help="write the report here instead of stdout")
+    parser.add_argument("--baseline", help="previous report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative regression")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            report["regressions"] = compare(report, json.load(baseline), args.tolerance)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as out:
+            out.write(output + "\n")
+    else:
+        print(output)
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
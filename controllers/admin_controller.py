@@ -0,0 +1,44 @@
+import hmac
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from core.config import settings
+from infrastructure.loop_watchdog import loop_watchdog
+from infrastructure.profiler import ProfilerBusy, folded_text, profiler
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    # Without ADMIN_TOKEN the admin endpoints do not exist as far as clients can tell
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.get("/loop")
+async def event_loop_stalls():
+    """Event loop lag and the stacks of the most recent stalls in this worker"""
+    return {**loop_watchdog.stats(), "recent": list(loop_watchdog.recent)}
+
+@router.post("/profile")
+async def profile_worker(
+    seconds: float = Query(10, gt=0),
+    interval: float = Query(0.005, ge=0.001, le=1),
+    format: str = Query("json", pattern="^(json|folded)$")
+):
+    """
+    Sample the event loop of the worker that receives this request for
+    `seconds` (at most PROFILE_MAX_SECONDS) and return where it spent its
+    time; format=folded returns flamegraph input instead.
+    """
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Profiles are limited to {settings.PROFILE_MAX_SECONDS}s")
+    try:
+        report = await profiler.profile(seconds, interval)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "folded":
+        return PlainTextResponse(folded_text(report))
+    return report
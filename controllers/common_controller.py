@@ -1,43 +1,292 @@
-from fastapi import APIRouter, HTTPException
-import aiohttp
-from typing import List
+import asyncio
+import logging
+import time
+from fastapi import APIRouter, Body, HTTPException, Query, Request
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
 from core.schemas.response import StandardResponse
 from core.config import settings
+from core.constants import Lanes, ServiceNames
+from core.request_context import DeadlineExceeded, allow_stale, bind_request, client_id, remaining
+from domain.services.provider_registry import ProviderResult, ProviderStatus
+from domain.services.normalizer import canonical_form, dedupe, normalize_query
+from domain.services.providers import domclick_search_service, provider_registry
+from infrastructure.admission import admit_queries
+from infrastructure.external.validator_client import ValidatorClient
+from infrastructure.metrics import deduplicated_queries, stage_seconds
+from infrastructure.serialization import MSGPACK, NDJSON, encode_msgpack, encode_response, negotiated_response, response_type
+from infrastructure.streaming import DuplexStreamingResponse, iter_queries
 
 router = APIRouter()
+validator_client = ValidatorClient()
+domclick_service = domclick_search_service
 
 @router.post("/process", response_model=List[StandardResponse])
-async def process_queries(queries: List[str]):
-    results = []
-    
-    for query in queries:
-        # Validate query type using Validator IS
-        data_type = await _get_data_type(query)
-        
-        # Route to appropriate service based on data type
-        if data_type == "phone":
-            result = await _call_phone_service(query)
-            results.append(result)
-
-        
-    return results
-
-async def _get_data_type(query: str) -> str:
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
-            f"{settings.VALIDATOR_ENDPOINT}/api/v1/validate",
-            json={"query": [query]}
-        ) as response:
-            if response.status == 200:
-                data = await response.json()
-                return data[0]["body"]["type"] if data else "unknown"
-    return "unknown"
-
-async def _call_phone_service(phone: str) -> StandardResponse:
-   
-   
-    return StandardResponse(
-        headers={"sender": "phone-service"},
-        body={"processed": True, "query": phone},
-        extra={"data_type": "phone"}
-    )
\ No newline at end of file
+async def process_queries(
+    request: Request,
+    queries: List[str] = Body(..., embed=True),
+    stale_ok: bool = Query(settings.LOOKUP_STALE_OK)
+):
+    if not queries:
+        raise HTTPException(status_code=400, detail="No queries provided")
+    admit_queries(len(queries))
+    allow_stale.set(stale_ok)
+    # Small batches are served like interactive lookups, large ones share the bulk lane
+    lane = Lanes.INTERACTIVE if len(queries) <= settings.SCHEDULER_INTERACTIVE_BATCH else Lanes.BULK
+    bind_request(lane, client_id(request))
+
+    # Validate each distinct normalized input using Validator IS in one batched stage
+    normalized = [normalize_query(query) for query in queries]
+    inputs, input_slots = dedupe(normalized)
+    try:
+        classified = await classify_queries([normalized[position] for position in inputs])
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    validated = [classified[slot] for slot in input_slots]
+
+    # Spellings of the same value share one lookup; its result is fanned back
+    # out to every position. Lookups run concurrently, bounded per batch
+    lookups, lookup_slots = dedupe([lookup_key(query, item) for query, item in zip(queries, validated)])
+    if len(lookups) < len(queries):
+        deduplicated_queries.inc(amount=len(queries) - len(lookups))
+    semaphore = asyncio.Semaphore(settings.PROCESS_CONCURRENCY)
+    responses = await asyncio.gather(
+        *(_process_query_bounded(queries[position], validated[position], semaphore) for position in lookups)
+    )
+    return negotiated_response(request, [
+        _for_query(responses[slot], query) for query, slot in zip(queries, lookup_slots)
+    ])
+
+@router.post("/process/stream")
+async def process_queries_stream(request: Request, stale_ok: bool = Query(settings.LOOKUP_STALE_OK)):
+    """
+    Streaming variant of /process: the body is a JSON array or NDJSON and is
+    parsed incrementally; each result is written as one NDJSON line as soon
+    as it completes, with its input position in extra.index. Clients that
+    prefer application/msgpack get a sequence of MessagePack objects instead.
+    """
+    body_read = asyncio.Event()
+    binary = response_type(request) == MSGPACK
+    response = DuplexStreamingResponse(
+        _stream_results(
+            request.stream(), body_read, stale_ok, client_id(request), encode_msgpack if binary else _ndjson_line
+        ),
+        body_read=body_read,
+        media_type=MSGPACK if binary else NDJSON
+    )
+    response.headers["Vary"] = "Accept"
+    return response
+
+async def classify_queries(queries: List[str]) -> List[Any]:
+    started = time.perf_counter()
+    validated = await validator_client.validate_queries(queries)
+    if len(validated) != len(queries):
+        stage_seconds.observe(time.perf_counter() - started, "classify", "all", "error")
+        raise ValueError(f"Validator returned {len(validated)} results for {len(queries)} queries")
+    stage_seconds.observe(time.perf_counter() - started, "classify", "all", "ok")
+    return validated
+
+def data_type_of(item: Any) -> str:
+    # Validator items arrive either as ValidatorResponseItem or raw dicts
+    body = item["body"] if isinstance(item, dict) else item.body
+    return body.get("type", "unknown")
+
+def lookup_key(query: str, item: Any) -> Tuple[str, str]:
+    """Data type and canonical value a classified query is looked up under"""
+    body = item["body"] if isinstance(item, dict) else item.body
+    data_type = data_type_of(item)
+    return data_type, canonical_form(data_type, body.get("clean_data") or query)
+
+def upstreams_for(item: Any) -> List[str]:
+    """Upstreams a query will call, used for rate limiting bulk work"""
+    return provider_registry.upstreams_for(data_type_of(item))
+
+async def _process_query_bounded(query: str, item: Any, semaphore: asyncio.Semaphore) -> StandardResponse:
+    async with semaphore:
+        return await process_query(query, item)
+
+async def process_query(query: str, item: Any) -> StandardResponse:
+    """Process one classified query; failures and timeouts become error responses"""
+    started = time.perf_counter()
+    timeout = settings.QUERY_TIMEOUT
+    try:
+        # Bounded by the request's deadline as well as the per-query limit
+        timeout = remaining(settings.QUERY_TIMEOUT)
+        response = await asyncio.wait_for(_process_query(query, item), timeout)
+        status = "error" if "error" in response.body else "ok"
+    except DeadlineExceeded:
+        response = _error_response(query, "Request deadline exceeded")
+        status = "deadline"
+    except asyncio.TimeoutError:
+        logging.error(f"Query timed out after {round(timeout, 3)}s: {query}")
+        response = _error_response(query, f"Query timed out after {round(timeout, 3)}s")
+        status = "timeout"
+    except Exception as e:
+        logging.error(f"Query processing failed for {query}: {e}")
+        response = _error_response(query, f"Processing failed: {e}")
+        status = "error"
+    stage_seconds.observe(time.perf_counter() - started, "query", data_type_of(item), status)
+    return response
+
+async def _process_query(query: str, item: Any) -> StandardResponse:
+    data_type, value = lookup_key(query, item)
+
+    # Every provider registered for the data type is queried concurrently
+    providers = provider_registry.providers_for(data_type)
+    if not providers:
+        return _error_response(query, f"Unsupported data type: {data_type}", data_type)
+
+    started = time.perf_counter()
+    results = await provider_registry.dispatch(data_type, value)
+    status = "ok" if any(result.succeeded for result in results) else "error"
+    stage_seconds.observe(time.perf_counter() - started, "lookup", data_type, status)
+
+    with stage_seconds.time("build", data_type, "ok"):
+        return _provider_response(query, data_type, results)
+
+def _provider_response(query: str, data_type: str, results: List[ProviderResult]) -> StandardResponse:
+    # Fields are built here from validated SearchResult models, so the
+    # response is constructed without another validation pass
+    succeeded = [result for result in results if result.succeeded]
+    sender = results[0].provider.sender if len(results) == 1 else ServiceNames.COMMON
+    extra = {
+        "query": query,
+        "data_type": data_type,
+        "providers": {
+            result.provider.name: _provider_extra(result) for result in results
+        },
+    }
+    if not succeeded:
+        errors = "; ".join(result.error for result in results)
+        return StandardResponse.model_construct(
+            headers={"sender": sender},
+            body={"error": f"Processing failed: {errors}"},
+            extra=extra
+        )
+
+    found = [found for result in succeeded for found in result.results]
+    extra["results_count"] = len(found)
+    extra["service_used"] = ", ".join(result.provider.label for result in succeeded)
+    if len(succeeded) < len(results):
+        extra["partial"] = True
+    if any(result.status == ProviderStatus.STALE for result in succeeded):
+        extra["stale"] = True
+    return StandardResponse.model_construct(headers={"sender": sender}, body={"results": found}, extra=extra)
+
+def _for_query(response: StandardResponse, query: str) -> StandardResponse:
+    if response.extra is None or response.extra.get("query") == query:
+        return response
+    return response.model_copy(update={"extra": {**response.extra, "query": query}})
+
+def _provider_extra(result: ProviderResult) -> dict:
+    extra = {"status": result.status, "latency_ms": result.latency_ms}
+    if result.status == ProviderStatus.STALE:
+        extra["fetched_at"] = result.results.fetched_at
+    if result.error:
+        extra["error"] = result.error
+    return extra
+
+async def _stream_results(
+    chunks: AsyncIterator[bytes],
+    body_read: asyncio.Event,
+    stale_ok: bool = False,
+    client: str = "anonymous",
+    encode: Optional[Callable[[StandardResponse], bytes]] = None
+) -> AsyncIterator[bytes]:
+    # The generator runs outside the route's context, so request state is set here for the tasks below
+    allow_stale.set(stale_ok)
+    bind_request(Lanes.BULK, client)
+    # Every stage hands off through a bounded queue, so a slow reader on either
+    # side stalls the pipeline instead of growing memory
+    parsed = asyncio.Queue(maxsize=settings.STREAM_BUFFER_SIZE)
+    classified = asyncio.Queue(maxsize=settings.STREAM_BUFFER_SIZE)
+    completed = asyncio.Queue(maxsize=settings.STREAM_BUFFER_SIZE)
+    workers = settings.PROCESS_CONCURRENCY
+
+    tasks = [
+        asyncio.create_task(_read_stream(chunks, parsed, body_read)),
+        asyncio.create_task(_classify_stream(parsed, classified, workers)),
+    ] + [asyncio.create_task(_stream_worker(classified, completed, encode or _ndjson_line)) for _ in range(workers)]
+    try:
+        finished = 0
+        while finished < workers:
+            line = await completed.get()
+            if line is None:
+                finished += 1
+            else:
+                yield line
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def _read_stream(chunks: AsyncIterator[bytes], parsed: asyncio.Queue, body_read: asyncio.Event):
+    index = 0
+    try:
+        async for query in iter_queries(chunks):
+            await parsed.put((index, query))
+            index += 1
+    except Exception as e:
+        logging.error(f"Invalid query stream after {index} queries: {e}")
+        await parsed.put((None, f"Invalid request stream: {e}"))
+    finally:
+        body_read.set()
+    await parsed.put(None)
+
+async def _classify_stream(parsed: asyncio.Queue, classified: asyncio.Queue, workers: int):
+    done = False
+    while not done:
+        # Micro-batch whatever is already parsed into one validator call
+        entries = [await parsed.get()]
+        while len(entries) < settings.VALIDATOR_BATCH_SIZE and not parsed.empty():
+            entries.append(parsed.get_nowait())
+        if entries[-1] is None:
+            done = True
+            entries.pop()
+
+        queries = [entry for entry in entries if entry[0] is not None]
+        if queries:
+            try:
+                items = await classify_queries([query for _, query in queries])
+            except ValueError:
+                items = [None] * len(queries)
+            for (index, query), item in zip(queries, items):
+                await classified.put((index, query, item))
+        for _, error in (entry for entry in entries if entry[0] is None):
+            await classified.put((None, error, None))
+
+    for _ in range(workers):
+        await classified.put(None)
+
+async def _stream_worker(
+    classified: asyncio.Queue,
+    completed: asyncio.Queue,
+    encode: Callable[[StandardResponse], bytes]
+):
+    while True:
+        entry = await classified.get()
+        if entry is None:
+            await completed.put(None)
+            return
+        index, query, item = entry
+        if index is None:
+            response = _error_response(None, query)
+        elif item is None:
+            response = _error_response(query, "Validator returned no result")
+        else:
+            response = await process_query(query, item)
+        response.extra = {**(response.extra or {}), "index": index}
+        with stage_seconds.time("serialize", data_type_of(item) if item is not None else "unknown", "ok"):
+            line = encode(response)
+        await completed.put(line)
+
+def _ndjson_line(response: StandardResponse) -> bytes:
+    return encode_response(response) + b"\n"
+
+def _error_response(query: Optional[str], error: str, data_type: str = None) -> StandardResponse:
+    extra = {"query": query}
+    if data_type:
+        extra["data_type"] = data_type
+    return StandardResponse.model_construct(
+        headers={"sender": ServiceNames.COMMON},
+        body={"error": error},
+        extra=extra
+    )
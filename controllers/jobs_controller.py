@@ -0,0 +1,99 @@
+import json
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import List
+from core.config import settings
+from core.constants import ServiceNames
+from core.schemas.response import StandardResponse
+from controllers.common_controller import classify_queries, process_query, upstreams_for
+from domain.services.job_runner import JobRunner
+from infrastructure.external.http_pool import Upstreams
+from infrastructure.job_store import JobStore
+from infrastructure.rate_limit import create_rate_limiter
+from infrastructure.streaming import iter_queries
+
+router = APIRouter()
+job_runner = JobRunner(
+    store=JobStore(settings.JOB_DB_PATH, lease=settings.JOB_LEASE_SECONDS),
+    classify=classify_queries,
+    process=process_query,
+    upstreams_for=upstreams_for,
+    rate_limits={
+        Upstreams.DOMCLICK: create_rate_limiter(f"jobs:{Upstreams.DOMCLICK}", settings.JOB_DOMCLICK_RATE),
+        Upstreams.VALIDATOR: create_rate_limiter(f"jobs:{Upstreams.VALIDATOR}", settings.JOB_VALIDATOR_RATE),
+    },
+    classify_upstream=Upstreams.VALIDATOR,
+    workers=settings.JOB_WORKERS,
+    chunk_size=settings.JOB_CHUNK_SIZE,
+    query_concurrency=settings.JOB_QUERY_CONCURRENCY
+)
+
+@router.post("", response_model=StandardResponse, status_code=202)
+async def submit_job(request: Request):
+    queries = await _read_queries(request)
+    if not queries:
+        raise HTTPException(status_code=400, detail="No queries provided")
+    if len(queries) > settings.JOB_MAX_QUERIES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Job exceeds {settings.JOB_MAX_QUERIES} queries"
+        )
+
+    job_id = await job_runner.submit(queries)
+    return StandardResponse(
+        headers={"sender": ServiceNames.JOBS},
+        body={"job_id": job_id, "status": "queued", "total": len(queries)}
+    )
+
+@router.get("", response_model=StandardResponse)
+async def queue_stats():
+    return StandardResponse(
+        headers={"sender": ServiceNames.JOBS},
+        body=await job_runner.stats()
+    )
+
+@router.get("/{job_id}", response_model=StandardResponse)
+async def job_status(job_id: str):
+    job = await job_runner.job_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return StandardResponse(headers={"sender": ServiceNames.JOBS}, body=job)
+
+@router.get("/{job_id}/results", response_model=StandardResponse)
+async def job_results(
+    job_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    job = await job_runner.job_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+
+    rows = await job_runner.get_results(job_id, offset, limit)
+    return StandardResponse(
+        headers={"sender": ServiceNames.JOBS},
+        body={
+            "results": [
+                {"index": idx, "query": query, "response": json.loads(result) if result else None}
+                for idx, query, result in rows
+            ]
+        },
+        extra={"job_id": job_id, "status": job["status"], "offset": offset, "limit": limit, "total": job["total"]}
+    )
+
+async def _read_queries(request: Request) -> List[str]:
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            data = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        if isinstance(data, dict):
+            data = data.get("queries")
+        if not isinstance(data, list) or not all(isinstance(query, str) for query in data):
+            raise HTTPException(status_code=400, detail="Expected a list of query strings")
+        return data
+
+    # NDJSON, plain text or a raw uploaded file, one query per line
+    try:
+        return [query async for query in iter_queries(request.stream())]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid query file: {e}")
\ No newline at end of file
@@ -1,18 +1,39 @@
-from fastapi import APIRouter, HTTPException
-from domain.services.domclick_service import DomClickService
+from fastapi import APIRouter, HTTPException, Query, Request
+from core.config import settings
+from core.constants import Lanes
+from core.request_context import DeadlineExceeded, allow_stale, bind_request, client_id
+from domain.models.search import StaleResults
+from domain.services.classifier import normalize_phone
+from domain.services.providers import domclick_search_service
 from core.schemas.response import StandardResponse
+from infrastructure.serialization import negotiated_response
 
 router = APIRouter()
-search_service = DomClickService()
+search_service = domclick_search_service
 
 @router.get("/search/phone/{phone}", response_model=StandardResponse)
-async def search_phone(phone: str):
+async def search_phone(request: Request, phone: str, stale_ok: bool = Query(settings.LOOKUP_STALE_OK)):
+    canonical = normalize_phone(phone)
+    if canonical is None:
+        raise HTTPException(status_code=400, detail=f"Invalid phone number: {phone}")
+    allow_stale.set(stale_ok)
+    bind_request(Lanes.INTERACTIVE, client_id(request))
     try:
-        results = await search_service.search(phone)
-        return StandardResponse(
+        results = await search_service.search(canonical)
+        # Built from already validated SearchResult models, so not validated again
+        return negotiated_response(request, StandardResponse.model_construct(
             headers={"sender": "domclick-service"},
-            body={"results": [result.dict() for result in results]},
-            extra={"query": phone, "results_count": len(results)}
-        )
+            body={"results": results},
+            extra=_extra(phone, results)
+        ))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _extra(phone: str, results: list) -> dict:
+    extra = {"query": phone, "results_count": len(results)}
+    if isinstance(results, StaleResults):
+        extra["stale"] = True
+        extra["fetched_at"] = results.fetched_at
+    return extra
\ No newline at end of file
@@ -7,6 +7,88 @@ load_dotenv()
 @dataclass
 class Settings:
     MODE: str = os.getenv("MODE", "dev")
+    FAST_START: bool = os.getenv("FAST_START", "false").lower() == "true"
     VALIDATOR_ENDPOINT: str = os.getenv("VALIDATOR_ENDPOINT", "http://localhost:8001")
+    PROCESS_CONCURRENCY: int = int(os.getenv("PROCESS_CONCURRENCY", "20"))
+    QUERY_TIMEOUT: float = float(os.getenv("QUERY_TIMEOUT", "15"))
+    PROVIDER_TIMEOUT: float = float(os.getenv("PROVIDER_TIMEOUT", "10"))
+    REQUEST_DEADLINE: float = float(os.getenv("REQUEST_DEADLINE", "0"))
+    REQUEST_DEADLINE_MAX: float = float(os.getenv("REQUEST_DEADLINE_MAX", "300"))
+    STREAM_BUFFER_SIZE: int = int(os.getenv("STREAM_BUFFER_SIZE", "1000"))
+    VALIDATOR_BATCH_SIZE: int = int(os.getenv("VALIDATOR_BATCH_SIZE", "100"))
+    VALIDATOR_TIMEOUT: float = float(os.getenv("VALIDATOR_TIMEOUT", "10"))
+    VALIDATOR_LOCAL_FIRST: bool = os.getenv("VALIDATOR_LOCAL_FIRST", "false").lower() == "true"
+    VALIDATOR_CONCURRENCY: int = int(os.getenv("VALIDATOR_CONCURRENCY", "10"))
+    SCHEDULER_BULK_SHARE: float = float(os.getenv("SCHEDULER_BULK_SHARE", "0.5"))
+    SCHEDULER_INTERACTIVE_BATCH: int = int(os.getenv("SCHEDULER_INTERACTIVE_BATCH", "10"))
+    HTTP_POOL_LIMIT: int = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+    HTTP_POOL_LIMIT_PER_HOST: int = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))
+    HTTP_KEEPALIVE_TIMEOUT: float = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+    HTTP_DNS_TTL: int = int(os.getenv("HTTP_DNS_TTL", "300"))
+    DOMCLICK_BASE_URL: str = os.getenv("DOMCLICK_BASE_URL", "https://api.domclick.ru")
+    DOMCLICK_TIMEOUT: float = float(os.getenv("DOMCLICK_TIMEOUT", "10"))
+    DOMCLICK_MAX_PAYLOAD: int = int(os.getenv("DOMCLICK_MAX_PAYLOAD", "1048576"))
+    DOMCLICK_RATE: float = float(os.getenv("DOMCLICK_RATE", "20"))
+    DOMCLICK_MIN_RATE: float = float(os.getenv("DOMCLICK_MIN_RATE", "1"))
+    DOMCLICK_CONCURRENCY: int = int(os.getenv("DOMCLICK_CONCURRENCY", "20"))
+    DOMCLICK_RETRIES: int = int(os.getenv("DOMCLICK_RETRIES", "2"))
+    DOMCLICK_BACKOFF_BASE: float = float(os.getenv("DOMCLICK_BACKOFF_BASE", "0.2"))
+    DOMCLICK_BACKOFF_MAX: float = float(os.getenv("DOMCLICK_BACKOFF_MAX", "2"))
+    DOMCLICK_BREAKER_THRESHOLD: int = int(os.getenv("DOMCLICK_BREAKER_THRESHOLD", "5"))
+    DOMCLICK_BREAKER_RESET: float = float(os.getenv("DOMCLICK_BREAKER_RESET", "30"))
+    DOMCLICK_HEDGE: bool = os.getenv("DOMCLICK_HEDGE", "false").lower() == "true"
+    HEDGE_PERCENTILE: float = float(os.getenv("HEDGE_PERCENTILE", "95"))
+    HEDGE_MAX_RATE: float = float(os.getenv("HEDGE_MAX_RATE", "0.05"))
+    HEDGE_MIN_DELAY: float = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))
+    HEDGE_MIN_SAMPLES: int = int(os.getenv("HEDGE_MIN_SAMPLES", "50"))
+    JOB_DB_PATH: str = os.getenv("JOB_DB_PATH", "data/jobs.sqlite3")
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_CHUNK_SIZE: int = int(os.getenv("JOB_CHUNK_SIZE", "100"))
+    JOB_QUERY_CONCURRENCY: int = int(os.getenv("JOB_QUERY_CONCURRENCY", "10"))
+    JOB_MAX_QUERIES: int = int(os.getenv("JOB_MAX_QUERIES", "100000"))
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+    JOB_DOMCLICK_RATE: float = float(os.getenv("JOB_DOMCLICK_RATE", "5"))
+    JOB_VALIDATOR_RATE: float = float(os.getenv("JOB_VALIDATOR_RATE", "10"))
+    LOOKUP_STORE_PATH: str = os.getenv("LOOKUP_STORE_PATH", "data/lookups.sqlite3")
+    LOOKUP_STORE_BATCH_SIZE: int = int(os.getenv("LOOKUP_STORE_BATCH_SIZE", "200"))
+    LOOKUP_STORE_FLUSH_INTERVAL: float = float(os.getenv("LOOKUP_STORE_FLUSH_INTERVAL", "1"))
+    LOOKUP_WARM_LIMIT: int = int(os.getenv("LOOKUP_WARM_LIMIT", "10000"))
+    LOOKUP_STALE_OK: bool = os.getenv("LOOKUP_STALE_OK", "false").lower() == "true"
+    LOOKUP_STALE_MAX_AGE: float = float(os.getenv("LOOKUP_STALE_MAX_AGE", "604800"))
+    METRICS_DIR: str = os.getenv("METRICS_DIR", "")
+    METRICS_FLUSH_INTERVAL: float = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+    WORKERS: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+    SIDECAR_SOCKET: str = os.getenv("SIDECAR_SOCKET", "")
+    SIDECAR_TIMEOUT: float = float(os.getenv("SIDECAR_TIMEOUT", "0.5"))
+    SIDECAR_RETRY_INTERVAL: float = float(os.getenv("SIDECAR_RETRY_INTERVAL", "5"))
+    SIDECAR_LIMITER_MAX_WAIT: float = float(os.getenv("SIDECAR_LIMITER_MAX_WAIT", "5"))
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_MAX_SIZE: int = int(os.getenv("CACHE_MAX_SIZE", "10000"))
+    CACHE_TTL: float = float(os.getenv("CACHE_TTL", "3600"))
+    CACHE_NEGATIVE_TTL: float = float(os.getenv("CACHE_NEGATIVE_TTL", "300"))
+    REFRESH_AHEAD: bool = os.getenv("REFRESH_AHEAD", "true").lower() == "true"
+    REFRESH_AHEAD_SECONDS: float = float(os.getenv("REFRESH_AHEAD_SECONDS", "60"))
+    REFRESH_GRACE: float = float(os.getenv("REFRESH_GRACE", "30"))
+    REFRESH_CONCURRENCY: int = int(os.getenv("REFRESH_CONCURRENCY", "2"))
+    REFRESH_MIN_HITS: float = float(os.getenv("REFRESH_MIN_HITS", "5"))
+    REFRESH_WINDOW: float = float(os.getenv("REFRESH_WINDOW", "600"))
+    REFRESH_INTERVAL: float = float(os.getenv("REFRESH_INTERVAL", "5"))
+    COMPRESSION: bool = os.getenv("COMPRESSION", "true").lower() == "true"
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    GZIP_LEVEL: int = int(os.getenv("GZIP_LEVEL", "6"))
+    ZSTD_LEVEL: int = int(os.getenv("ZSTD_LEVEL", "3"))
+    LOOP_WATCHDOG: bool = os.getenv("LOOP_WATCHDOG", "true").lower() == "true"
+    LOOP_LAG_INTERVAL: float = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+    LOOP_STALL_THRESHOLD: float = float(os.getenv("LOOP_STALL_THRESHOLD", "0.25"))
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+    PROFILE_MAX_SECONDS: float = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+    ADMISSION_CONTROL: bool = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+    ADMISSION_INITIAL_LIMIT: float = float(os.getenv("ADMISSION_INITIAL_LIMIT", "100"))
+    ADMISSION_MIN_LIMIT: float = float(os.getenv("ADMISSION_MIN_LIMIT", "10"))
+    ADMISSION_MAX_LIMIT: float = float(os.getenv("ADMISSION_MAX_LIMIT", "1000"))
+    ADMISSION_LATENCY_TOLERANCE: float = float(os.getenv("ADMISSION_LATENCY_TOLERANCE", "2.0"))
+    ADMISSION_BACKOFF: float = float(os.getenv("ADMISSION_BACKOFF", "0.9"))
+    ADMISSION_MAX_BACKLOG: float = float(os.getenv("ADMISSION_MAX_BACKLOG", "2"))
+    ADMISSION_RETRY_AFTER: int = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
     
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -1,8 +1,28 @@
 class ServiceNames:
     DOMCLICK = "domclick-service"
     COMMON = "common-controller"
+    JOBS = "job-service"
+
+class Lanes:
+    INTERACTIVE = "interactive"
+    BULK = "bulk"
 
 class DataTypes:
     PHONE = "phone"
     EMAIL = "email"
+    SNILS = "snils"
+    INN = "inn"
+    OGRN = "ogrn"
+    PASSPORT_RF = "passport_rf"
+    BANK_CARD = "bank_card"
+    BIC = "bic"
+    VIN = "vin"
+    CAR_PLATE = "car_plate"
+    IPV4 = "ipv4"
+    IPV6 = "ipv6"
+    MAC = "mac"
+    DOMAIN = "domain"
+    DATE = "date"
+    BITCOIN = "bitcoin"
+    UNKNOWN = "unknown"
     
\ No newline at end of file
@@ -0,0 +1,38 @@
+import importlib
+import threading
+from typing import Any, Optional
+
+
+class LazyInstance:
+    """
+    Stands in for an instance of module:factory that is only imported and
+    built on first attribute access, so heavy modules (and the libraries
+    they import) stay out of startup until something actually uses them.
+    """
+
+    def __init__(self, module: str, factory: str, *args: Any, **kwargs: Any):
+        self._module = module
+        self._factory = factory
+        self._args = args
+        self._kwargs = kwargs
+        self._instance: Optional[Any] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def load(self) -> Any:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    factory = getattr(importlib.import_module(self._module), self._factory)
+                    self._instance = factory(*self._args, **self._kwargs)
+        return self._instance
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.load(), name)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<LazyInstance {self._module}:{self._factory} ({state})>"
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from contextvars import Context, ContextVar, copy_context
+from typing import Awaitable, Optional, TypeVar
+from core.config import settings
+from core.constants import Lanes
+
+T = TypeVar("T")
+
+# Set by controllers per request; lets lookups fall back to stored results when the upstream fails
+allow_stale: ContextVar[bool] = ContextVar("allow_stale", default=settings.LOOKUP_STALE_OK)
+
+# Scheduling lane and API client of the current request, read by the upstream schedulers
+request_lane: ContextVar[str] = ContextVar("request_lane", default=Lanes.INTERACTIVE)
+request_client: ContextVar[str] = ContextVar("request_client", default="anonymous")
+
+# End-to-end deadline of the current request on the time.monotonic() clock, None for no deadline
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's deadline passed before the operation could start"""
+
+
+def client_id(request) -> str:
+    """API client of a request: its X-Client-Id header, else its address"""
+    client = request.headers.get("x-client-id")
+    if client:
+        return client
+    return request.client.host if request.client else "anonymous"
+
+
+def bind_request(lane: str, client: str):
+    request_lane.set(lane)
+    request_client.set(client)
+
+
+def set_deadline(seconds: Optional[float]):
+    """Give the current request `seconds` from now; None or <= 0 leaves it unbounded"""
+    request_deadline.set(time.monotonic() + seconds if seconds and seconds > 0 else None)
+
+
+def remaining(timeout: float) -> float:
+    """
+    timeout, shortened to what is left of the request's deadline. Raises
+    DeadlineExceeded when nothing is left, so no call is started that could not finish.
+    """
+    deadline = request_deadline.get()
+    if deadline is None:
+        return timeout
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(timeout, left)
+
+
+def within_deadline(delay: float) -> bool:
+    """Whether something started after delay seconds would still be within the deadline"""
+    deadline = request_deadline.get()
+    return deadline is None or time.monotonic() + delay < deadline
+
+
+def shared_context() -> Context:
+    """
+    Context for upstream work that several requests may wait on: a copy of
+    the current one without a deadline, since each waiter bounds its own
+    wait with wait_shared().
+    """
+    context = copy_context()
+    context.run(request_deadline.set, None)
+    return context
+
+
+def join_lane(context: Context):
+    """Move shared work to the interactive lane when an interactive request waits on it"""
+    if request_lane.get() != Lanes.INTERACTIVE or context.get(request_lane, Lanes.INTERACTIVE) == Lanes.INTERACTIVE:
+        return
+    try:
+        context.run(request_lane.set, Lanes.INTERACTIVE)
+    except RuntimeError:
+        # The shared work is running this very moment; its next step sees the old lane
+        pass
+
+
+async def wait_shared(future: "asyncio.Future[T]") -> T:
+    """
+    Wait for shared work until the current request's deadline. The work
+    itself is neither bound by that deadline nor cancelled when it passes.
+    """
+    deadline = request_deadline.get()
+    if deadline is None:
+        return await asyncio.shield(future)
+    left = deadline - time.monotonic()
+    if left > 0:
+        await asyncio.wait((future,), timeout=left)
+    if not future.done():
+        raise DeadlineExceeded("Request deadline exceeded")
+    return future.result()
@@ -0,0 +1,27 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+from domain.models.search import SearchResult
+
+class ILookupStore(ABC):
+    """Durable record of lookup results, keyed by namespace and query"""
+
+    @abstractmethod
+    def record(self, namespace: str, query: str, results: List[SearchResult]) -> None:
+        """Queue a write; must not block the caller"""
+        pass
+
+    @abstractmethod
+    async def get(self, namespace: str, query: str) -> Optional[Tuple[List[SearchResult], float]]:
+        """Stored results and the time they were fetched"""
+        pass
+
+    @abstractmethod
+    async def recent(
+        self, namespace: str, limit: int, max_age: float
+    ) -> List[Tuple[str, List[SearchResult], float]]:
+        """Most recently fetched (query, results, fetched_at) rows"""
+        pass
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        pass
\ No newline at end of file
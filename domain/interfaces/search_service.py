@@ -5,4 +5,8 @@ from domain.models.search import SearchResult
 class ISearchService(ABC):
     @abstractmethod
     async def search(self, query: str) -> List[SearchResult]:
-        pass
\ No newline at end of file
+        pass
+
+    async def fetch(self, query: str) -> List[SearchResult]:
+        """Like search, but upstream failures propagate instead of returning []"""
+        return await self.search(query)
\ No newline at end of file
@@ -13,4 +13,12 @@ class SearchResult(BaseModel):
     client_review: Optional[str] = None
     registered_at: Optional[str] = None
     deals_count: Optional[int] = None
-    client_comments_count: Optional[int] = None
\ No newline at end of file
+    client_comments_count: Optional[int] = None
+
+
+class StaleResults(list):
+    """Results served from the lookup store because the upstream failed"""
+
+    def __init__(self, results, fetched_at: float):
+        super().__init__(results)
+        self.fetched_at = fetched_at
\ No newline at end of file
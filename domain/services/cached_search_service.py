@@ -0,0 +1,120 @@
+import logging
+import time
+from typing import List, Optional
+from core.config import settings
+from core.request_context import allow_stale
+from domain.interfaces.cache import ICacheBackend
+from domain.interfaces.lookup_store import ILookupStore
+from domain.interfaces.search_service import ISearchService
+from domain.models.search import SearchResult, StaleResults
+from domain.services.refresh_ahead import RefreshAhead
+from infrastructure.singleflight import SingleFlight
+
+class CachedSearchService(ISearchService):
+    """
+    Caches results of another search service; empty results use their own TTL.
+    Upstream failures propagate so callers can tell them apart from "not found",
+    unless the request allows stale results and the lookup store has some.
+    With refresh_ahead, frequently used entries are re-fetched before they expire.
+    """
+
+    def __init__(
+        self,
+        service: ISearchService,
+        cache: ICacheBackend,
+        namespace: str,
+        ttl: Optional[float] = None,
+        negative_ttl: Optional[float] = None,
+        store: Optional[ILookupStore] = None,
+        stale_max_age: Optional[float] = None,
+        refresh_ahead: Optional[RefreshAhead] = None
+    ):
+        self.service = service
+        self.cache = cache
+        self.namespace = namespace
+        self.ttl = settings.CACHE_TTL if ttl is None else ttl
+        self.negative_ttl = settings.CACHE_NEGATIVE_TTL if negative_ttl is None else negative_ttl
+        self.store = store
+        self.stale_max_age = settings.LOOKUP_STALE_MAX_AGE if stale_max_age is None else stale_max_age
+        self.refresh_ahead = refresh_ahead
+        self.inflight = SingleFlight()
+        self.stale_served = 0
+
+    def _key(self, query: str) -> str:
+        return f"{self.namespace}:{query.strip()}"
+
+    async def search(self, query: str) -> List[SearchResult]:
+        return await self.fetch(query)
+
+    async def fetch(self, query: str) -> List[SearchResult]:
+        key = self._key(query)
+        if self.refresh_ahead is not None:
+            self.refresh_ahead.hit(key)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached
+        if self.refresh_ahead is not None:
+            # A hot entry that just expired is answered at once and refreshed behind the scenes
+            recent = self.refresh_ahead.stale(key, self.refresh)
+            if recent is not None:
+                return recent
+
+        # Concurrent misses for the same key share one upstream call
+        try:
+            return await self.inflight.do(key, lambda: self._load(query, key))
+        except Exception as e:
+            stale = await self._stale(query)
+            if stale is None:
+                raise
+            logging.warning(f"Serving stored results for {query} after upstream failure: {e}")
+            return stale
+
+    async def refresh(self, query: str) -> List[SearchResult]:
+        """Fetch query from the upstream and cache it, whether or not it is cached now"""
+        key = self._key(query)
+        return await self.inflight.do(key, lambda: self._load(query, key))
+
+    async def start(self):
+        if self.refresh_ahead is not None:
+            await self.refresh_ahead.start(self.refresh)
+
+    async def stop(self):
+        if self.refresh_ahead is not None:
+            await self.refresh_ahead.stop()
+
+    async def warm(self, limit: int) -> int:
+        """Load the most recent stored results that are still fresh into the cache"""
+        if self.store is None or limit <= 0:
+            return 0
+        now = time.time()
+        warmed = 0
+        for query, results, fetched_at in await self.store.recent(self.namespace, limit, self.ttl):
+            ttl = (self.ttl if results else self.negative_ttl) - (now - fetched_at)
+            if ttl > 0:
+                await self.cache.set(self._key(query), results, ttl)
+                warmed += 1
+        return warmed
+
+    async def _load(self, query: str, key: str) -> List[SearchResult]:
+        # Failures propagate and are never cached
+        results = await self.service.fetch(query)
+        ttl = self.ttl if results else self.negative_ttl
+        await self.cache.set(key, results, ttl)
+        if self.refresh_ahead is not None:
+            self.refresh_ahead.stored(key, query.strip(), results, ttl)
+        if self.store is not None:
+            self.store.record(self.namespace, query.strip(), results)
+        return results
+
+    async def _stale(self, query: str) -> Optional[StaleResults]:
+        if self.store is None or not allow_stale.get():
+            return None
+        try:
+            stored = await self.store.get(self.namespace, query.strip())
+        except Exception as e:
+            logging.error(f"Lookup store read failed for {query}: {e}")
+            return None
+        if stored is None or time.time() - stored[1] > self.stale_max_age:
+            return None
+        self.stale_served += 1
+        return StaleResults(*stored)
\ No newline at end of file
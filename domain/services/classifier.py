@@ -0,0 +1,232 @@
+import ipaddress
+import logging
+import re
+from datetime import date
+from typing import List, NamedTuple, Optional, Tuple
+from core.constants import DataTypes
+
+# Compiled once at import; each input is only tried against the patterns
+# its first character, length and character class can still satisfy
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+DOMAIN_RE = re.compile(r'^(?=.{4,253}$)(?:[a-zA-Z0-9а-яА-ЯёЁ](?:[a-zA-Z0-9а-яА-ЯёЁ-]{0,61}[a-zA-Z0-9а-яА-ЯёЁ])?\.)+[a-zA-Zа-яА-Я]{2,63}$')
+MAC_RE = re.compile(r'^[0-9A-Fa-f]{2}([:-])(?:[0-9A-Fa-f]{2}\1){4}[0-9A-Fa-f]{2}$')
+VIN_RE = re.compile(r'^[A-HJ-NPR-Z0-9]{17}$')
+BITCOIN_RE = re.compile(r'^(?:bc1[02-9ac-hj-np-z]{11,71}|[13][1-9A-HJ-NP-Za-km-z]{25,34})$')
+# [0-9] rather than \d: \d also matches non-ASCII digits such as '٩'
+CAR_PLATE_RE = re.compile(r'^[АВЕКМНОРСТУХ][0-9]{3}[АВЕКМНОРСТУХ]{2}[0-9]{2,3}$')
+PASSPORT_RF_RE = re.compile(r'^[0-9]{2} ?[0-9]{2} [0-9]{6}$')
+DATE_ISO_RE = re.compile(r'^([0-9]{4})-([0-9]{2})-([0-9]{2})$')
+DATE_RU_RE = re.compile(r'^([0-9]{2})\.([0-9]{2})\.([0-9]{4})$')
+
+# Latin letters that look like the Cyrillic ones allowed on RF plates
+_PLATE_LATIN = str.maketrans("ABEKMHOPCTYX", "АВЕКМНОРСТУХ")
+_DIGIT_SEPARATORS = str.maketrans("", "", " -()")
+
+_INN10_WEIGHTS = (2, 4, 10, 3, 5, 9, 4, 6, 8)
+_INN12_WEIGHTS_1 = (7, 2, 4, 10, 3, 5, 9, 4, 6, 8)
+_INN12_WEIGHTS_2 = (3, 7, 2, 4, 10, 3, 5, 9, 4, 6, 8)
+
+
+class Classification(NamedTuple):
+    data_type: str
+    clean_data: str
+    candidates: Tuple[str, ...]
+
+    @property
+    def ambiguous(self) -> bool:
+        """True when the input is unknown or matches more than one type"""
+        return len(self.candidates) != 1
+
+
+def _is_digits(value: str) -> bool:
+    """ASCII digits only: str.isdigit() also accepts '²' or '٩', which the checksums cannot read"""
+    return value.isascii() and value.isdigit()
+
+
+def _weighted_check(digits: str, weights: Tuple[int, ...]) -> int:
+    return sum(int(d) * w for d, w in zip(digits, weights)) % 11 % 10
+
+
+def is_valid_inn(digits: str) -> bool:
+    if len(digits) == 10:
+        return _weighted_check(digits, _INN10_WEIGHTS) == int(digits[9])
+    if len(digits) == 12:
+        return (
+            _weighted_check(digits, _INN12_WEIGHTS_1) == int(digits[10])
+            and _weighted_check(digits, _INN12_WEIGHTS_2) == int(digits[11])
+        )
+    return False
+
+
+def is_valid_snils(digits: str) -> bool:
+    if len(digits) != 11:
+        return False
+    total = sum(int(d) * (9 - i) for i, d in enumerate(digits[:9]))
+    if total > 101:
+        total %= 101
+    control = 0 if total in (100, 101) else total
+    return control == int(digits[9:])
+
+
+def is_valid_ogrn(digits: str) -> bool:
+    if len(digits) == 13:
+        return int(digits[:12]) % 11 % 10 == int(digits[12])
+    if len(digits) == 15:
+        return int(digits[:14]) % 13 % 10 == int(digits[14])
+    return False
+
+
+def is_valid_luhn(digits: str) -> bool:
+    total = 0
+    for i, d in enumerate(reversed(digits)):
+        n = int(d)
+        if i % 2:
+            n *= 2
+            if n > 9:
+                n -= 9
+        total += n
+    return total % 10 == 0
+
+
+def _is_valid_date(year: str, month: str, day: str) -> bool:
+    try:
+        date(int(year), int(month), int(day))
+        return True
+    except ValueError:
+        return False
+
+
+def _result(candidates: List[Tuple[str, str]], query: str) -> Classification:
+    if not candidates:
+        return Classification(DataTypes.UNKNOWN, query, ())
+    data_type, clean_data = candidates[0]
+    return Classification(data_type, clean_data, tuple(c[0] for c in candidates))
+
+
+def _classify_digits(digits: str, value: str) -> List[Tuple[str, str]]:
+    length = len(digits)
+    candidates = []
+    if length == 11:
+        if digits[0] in "78":
+            candidates.append((DataTypes.PHONE, "7" + digits[1:]))
+        if is_valid_snils(digits):
+            candidates.append((DataTypes.SNILS, digits))
+    elif length == 10:
+        if digits[0] == "9":
+            candidates.append((DataTypes.PHONE, "7" + digits))
+        if is_valid_inn(digits):
+            candidates.append((DataTypes.INN, digits))
+        if PASSPORT_RF_RE.match(value):
+            candidates.append((DataTypes.PASSPORT_RF, digits))
+    elif length == 12:
+        if is_valid_inn(digits):
+            candidates.append((DataTypes.INN, digits))
+    elif length == 13 or length == 15:
+        if is_valid_ogrn(digits):
+            candidates.append((DataTypes.OGRN, digits))
+    elif length == 9:
+        if digits.startswith("04"):
+            candidates.append((DataTypes.BIC, digits))
+    if 13 <= length <= 19 and digits[0] in "2345689" and is_valid_luhn(digits):
+        candidates.append((DataTypes.BANK_CARD, digits))
+    return candidates
+
+
+def _classify_dotted(value: str) -> List[Tuple[str, str]]:
+    dots = value.count(".")
+    if dots == 3 and _is_digits(value.replace(".", "")):
+        try:
+            ipaddress.IPv4Address(value)
+            return [(DataTypes.IPV4, value)]
+        except ValueError:
+            return []
+    if dots == 2:
+        match = DATE_RU_RE.match(value)
+        if match:
+            day, month, year = match.groups()
+            return [(DataTypes.DATE, f"{year}-{month}-{day}")] if _is_valid_date(year, month, day) else []
+    if DOMAIN_RE.match(value):
+        return [(DataTypes.DOMAIN, value.lower())]
+    return []
+
+
+def classify_one(query: str) -> Classification:
+    """Classify one input; an input the classifier cannot handle is unknown rather than an error"""
+    try:
+        return _classify_one(query)
+    except Exception as e:
+        logging.error(f"Failed to classify query {query!r}: {e}")
+        return _result([], query)
+
+
+def _classify_one(query: str) -> Classification:
+    value = query.strip()
+    if not value:
+        return _result([], query)
+
+    if "@" in value:
+        return _result([(DataTypes.EMAIL, value)] if EMAIL_RE.match(value) else [], query)
+
+    length = len(value)
+    if length == 17 and MAC_RE.match(value):
+        return _result([(DataTypes.MAC, value.upper().replace("-", ":"))], query)
+
+    if ":" in value:
+        try:
+            return _result([(DataTypes.IPV6, ipaddress.IPv6Address(value).compressed)], query)
+        except ValueError:
+            return _result([], query)
+
+    if length == 10 and value[4] == "-":
+        match = DATE_ISO_RE.match(value)
+        if match and _is_valid_date(*match.groups()):
+            return _result([(DataTypes.DATE, value)], query)
+
+    compact = value.translate(_DIGIT_SEPARATORS)
+    if not compact:
+        return _result([], query)
+    if _is_digits(compact):
+        return _result(_classify_digits(compact, value), query)
+    if compact[0] == "+" and _is_digits(compact[1:]):
+        if compact[1] == "7" and len(compact) == 12:
+            return _result([(DataTypes.PHONE, compact[1:])], query)
+        return _result([], query)
+
+    if "." in value:
+        return _result(_classify_dotted(value), query)
+
+    if length == 17:
+        upper = value.upper()
+        if VIN_RE.match(upper):
+            return _result([(DataTypes.VIN, upper)], query)
+
+    if 8 <= len(compact) <= 9:
+        plate = compact.upper().translate(_PLATE_LATIN)
+        if CAR_PLATE_RE.match(plate):
+            return _result([(DataTypes.CAR_PLATE, plate)], query)
+
+    if value[0] in "13b" and 26 <= length <= 74 and BITCOIN_RE.match(value):
+        return _result([(DataTypes.BITCOIN, value)], query)
+
+    return _result([], query)
+
+
+def normalize_phone(value: str) -> Optional[str]:
+    """Canonical 7XXXXXXXXXX form of a Russian phone number, or None if it is not one"""
+    compact = value.strip().translate(_DIGIT_SEPARATORS)
+    if compact.startswith("+"):
+        compact = compact[1:]
+        if not compact.startswith("7"):
+            return None
+    if not _is_digits(compact):
+        return None
+    if len(compact) == 11 and compact[0] in "78":
+        return "7" + compact[1:]
+    if len(compact) == 10 and compact[0] == "9":
+        return "7" + compact
+    return None
+
+
+def classify(queries: List[str]) -> List[Classification]:
+    """Classify a whole batch in one pass"""
+    return [classify_one(query) for query in queries]
@@ -3,6 +3,7 @@ from typing import List
 from domain.interfaces.search_service import ISearchService
 from domain.models.search import SearchResult
 from infrastructure.external.domclick_client import DomClickClient
+from infrastructure.metrics import stage_seconds
 
 class DomClickService(ISearchService):
     def __init__(self):
@@ -10,11 +11,15 @@ class DomClickService(ISearchService):
     
     async def search(self, phone: str) -> List[SearchResult]:
         try:
-            response = await self.client.search_user(phone)
-            return self._adapt_response(response)
+            return await self.fetch(phone)
         except Exception as e:
             logging.error(f"DomClick search failed for {phone}: {e}")
             return []
+
+    async def fetch(self, phone: str) -> List[SearchResult]:
+        response = await self.client.search_user(phone)
+        with stage_seconds.time("domclick_adapt", "phone", "ok"):
+            return self._adapt_response(response)
     
     def _adapt_response(self, response: dict) -> List[SearchResult]:
         cas_id = response.get("casId")
@@ -26,7 +31,8 @@ class DomClickService(ISearchService):
         last_name = response.get("lastName")
         partner_card = response.get("partnerCard", {})
         
-        return [SearchResult(
+        # Straight from the payload without validation; every field is set, absent ones to None (their default anyway)
+        return [SearchResult.model_construct(
             first_name=first_name,
             middle_name=middle_name,
             last_name=last_name,
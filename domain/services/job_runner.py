@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+from core.constants import Lanes
+from core.request_context import bind_request
+from core.schemas.response import StandardResponse
+from infrastructure.job_store import JobStore, JobStatus
+from infrastructure.rate_limit import SharedRateLimiter, TokenBucket
+
+
+class JobRunner:
+    """
+    Drains bulk jobs from the JobStore with a pool of workers. Each job is
+    processed in chunks: one rate-limited classification call per chunk, then
+    the chunk's queries run concurrently, each taking a token from the bucket
+    of every upstream it will call.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        classify: Callable[[List[str]], Awaitable[List[Any]]],
+        process: Callable[[str, Any], Awaitable[StandardResponse]],
+        upstreams_for: Callable[[Any], List[str]],
+        rate_limits: Dict[str, Union[TokenBucket, SharedRateLimiter]],
+        classify_upstream: str,
+        workers: int,
+        chunk_size: int,
+        query_concurrency: int,
+        poll_interval: float = 1.0
+    ):
+        self.store = store
+        self.classify = classify
+        self.process = process
+        self.upstreams_for = upstreams_for
+        self.rate_limits = rate_limits
+        self.classify_upstream = classify_upstream
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.query_concurrency = query_concurrency
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._running: Set[str] = set()
+
+    @property
+    def active_jobs(self) -> int:
+        return len(self._running)
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._running:
+            await asyncio.to_thread(self.store.release_jobs, list(self._running))
+            self._running.clear()
+        await asyncio.to_thread(self.store.close)
+
+    async def submit(self, queries: List[str]) -> str:
+        job_id = await asyncio.to_thread(self.store.create_job, queries)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def job_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await asyncio.to_thread(self.store.get_job, job_id)
+        if job is None:
+            return None
+        started, finished = job["started_at"], job["finished_at"]
+        elapsed = ((finished or time.time()) - started) if started else 0.0
+        job["progress"] = round(job["processed"] / job["total"], 4) if job["total"] else 1.0
+        job["queries_per_second"] = round(job["processed"] / elapsed, 2) if elapsed > 0 else 0.0
+        return job
+
+    async def get_results(self, job_id: str, offset: int, limit: int) -> List[Tuple[int, str, Optional[str]]]:
+        return await asyncio.to_thread(self.store.get_results, job_id, offset, limit)
+
+    async def stats(self) -> Dict[str, Any]:
+        stats = await asyncio.to_thread(self.store.queue_stats)
+        stats["workers"] = len(self._tasks)
+        stats["active_jobs"] = self.active_jobs
+        stats["rate_limits"] = {name: bucket.stats() for name, bucket in self.rate_limits.items()}
+        return stats
+
+    async def _worker(self):
+        # Job traffic always queues behind interactive requests
+        bind_request(Lanes.BULK, "jobs")
+        while True:
+            try:
+                job_id = await asyncio.to_thread(self.store.claim_next_job)
+            except Exception as e:
+                logging.error(f"Failed to claim job: {e}")
+                job_id = None
+            if job_id is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self.run_job(job_id)
+
+    async def run_job(self, job_id: str):
+        self._running.add(job_id)
+        try:
+            while True:
+                items = await asyncio.to_thread(self.store.pending_items, job_id, self.chunk_size)
+                if not items:
+                    break
+                results = await self._run_chunk(items)
+                await asyncio.to_thread(self.store.save_results, job_id, results)
+            await asyncio.to_thread(self.store.finish_job, job_id, JobStatus.COMPLETED)
+            self._running.discard(job_id)
+        except asyncio.CancelledError:
+            # Stays in _running so stop() puts it back in the queue
+            raise
+        except Exception as e:
+            self._running.discard(job_id)
+            logging.error(f"Job {job_id} failed: {e}")
+            await asyncio.to_thread(self.store.finish_job, job_id, JobStatus.FAILED, str(e))
+
+    async def _acquire(self, upstream: Optional[str]):
+        bucket = self.rate_limits.get(upstream)
+        if bucket is not None:
+            await bucket.acquire()
+
+    async def _run_chunk(self, items: List[Tuple[int, str]]) -> List[Tuple[int, str, bool]]:
+        queries = [query for _, query in items]
+        await self._acquire(self.classify_upstream)
+        classified = await self.classify(queries)
+        semaphore = asyncio.Semaphore(self.query_concurrency)
+
+        async def run(idx: int, query: str, item: Any) -> Tuple[int, str, bool]:
+            async with semaphore:
+                for upstream in self.upstreams_for(item):
+                    await self._acquire(upstream)
+                response = await self.process(query, item)
+                return idx, response.model_dump_json(), "error" in response.body
+
+        return await asyncio.gather(
+            *(run(idx, query, item) for (idx, query), item in zip(items, classified))
+        )
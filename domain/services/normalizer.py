@@ -0,0 +1,37 @@
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+from core.constants import DataTypes
+from domain.services.classifier import normalize_phone
+
+# Types whose values have several spellings; each returns None when it cannot tell
+_CANONICALIZERS: Dict[str, Callable[[str], Optional[str]]] = {
+    DataTypes.PHONE: normalize_phone,
+}
+
+
+def normalize_query(query: str) -> str:
+    """Normalization applied to every raw query before classification"""
+    return query.strip()
+
+
+def canonical_form(data_type: str, value: str) -> str:
+    """The form a value is looked up and cached under"""
+    canonicalize = _CANONICALIZERS.get(data_type)
+    canonical = canonicalize(value) if canonicalize is not None else None
+    return canonical or value.strip()
+
+
+def dedupe(keys: List[Hashable]) -> Tuple[List[int], List[int]]:
+    """
+    Positions of the first occurrence of each distinct key, and for every
+    position the index of its key in that list, to fan results back out.
+    """
+    first: Dict[Hashable, int] = {}
+    positions: List[int] = []
+    slots: List[int] = []
+    for position, key in enumerate(keys):
+        slot = first.get(key)
+        if slot is None:
+            slot = first[key] = len(positions)
+            positions.append(position)
+        slots.append(slot)
+    return positions, slots
\ No newline at end of file
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, NamedTuple, Optional
+from core.request_context import DeadlineExceeded, remaining
+from domain.interfaces.search_service import ISearchService
+from domain.models.search import SearchResult, StaleResults
+
+
+class SearchProvider(NamedTuple):
+    name: str
+    service: ISearchService
+    sender: str
+    label: str
+    timeout: float
+    upstream: Optional[str] = None
+
+
+class ProviderResult(NamedTuple):
+    provider: SearchProvider
+    status: str
+    results: List[SearchResult]
+    latency_ms: float
+    error: Optional[str] = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.status in (ProviderStatus.OK, ProviderStatus.STALE)
+
+
+class ProviderStatus:
+    OK = "ok"
+    STALE = "stale"
+    ERROR = "error"
+    TIMEOUT = "timeout"
+
+
+class ProviderRegistry:
+    """Search providers keyed by data type; every provider for a type runs concurrently"""
+
+    def __init__(self):
+        self._providers: Dict[str, List[SearchProvider]] = {}
+
+    def register(
+        self,
+        data_type: str,
+        name: str,
+        service: ISearchService,
+        sender: str,
+        label: str,
+        timeout: float,
+        upstream: Optional[str] = None
+    ):
+        self._providers.setdefault(data_type, []).append(
+            SearchProvider(name, service, sender, label, timeout, upstream)
+        )
+
+    def providers_for(self, data_type: str) -> List[SearchProvider]:
+        return self._providers.get(data_type, [])
+
+    def upstreams_for(self, data_type: str) -> List[str]:
+        return [provider.upstream for provider in self.providers_for(data_type) if provider.upstream]
+
+    def data_types(self) -> List[str]:
+        return list(self._providers)
+
+    async def dispatch(self, data_type: str, query: str) -> List[ProviderResult]:
+        """Run every provider for data_type; slow or failing ones come back with their status"""
+        return await asyncio.gather(
+            *(self._run(provider, query) for provider in self.providers_for(data_type))
+        )
+
+    async def _run(self, provider: SearchProvider, query: str) -> ProviderResult:
+        started = time.perf_counter()
+        timeout = provider.timeout
+        try:
+            timeout = remaining(provider.timeout)
+            results = await asyncio.wait_for(provider.service.search(query), timeout)
+            status = ProviderStatus.STALE if isinstance(results, StaleResults) else ProviderStatus.OK
+            error = None
+        except DeadlineExceeded:
+            results, status = [], ProviderStatus.TIMEOUT
+            error = f"{provider.label}: request deadline exceeded"
+        except asyncio.TimeoutError:
+            results, status = [], ProviderStatus.TIMEOUT
+            error = f"{provider.label} timed out after {round(timeout, 3)}s"
+        except Exception as e:
+            logging.error(f"Provider {provider.name} failed for {query}: {e}")
+            results, status, error = [], ProviderStatus.ERROR, str(e)
+        latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        return ProviderResult(provider, status, results, latency_ms, error)
@@ -0,0 +1,47 @@
+from core.config import settings
+from core.constants import DataTypes, ServiceNames
+from core.lazy import LazyInstance
+from domain.services.cached_search_service import CachedSearchService
+from domain.services.provider_registry import ProviderRegistry
+from domain.services.refresh_ahead import RefreshAhead
+from infrastructure.cache import search_cache
+from infrastructure.external.http_pool import Upstreams
+from infrastructure.lookup_store import lookup_store
+
+# DomClickService pulls in aiohttp and the DomClick client, so it is built on
+# first use; preload_providers() does that at startup unless FAST_START is set
+domclick_service = LazyInstance("domain.services.domclick_service", "DomClickService")
+
+# One cached DomClick service per worker, shared by every route
+domclick_search_service = CachedSearchService(
+    domclick_service,
+    search_cache,
+    namespace="domclick:phone",
+    store=lookup_store,
+    # A few numbers get most lookups; keep them from ever expiring in front of a user
+    refresh_ahead=RefreshAhead(
+        "domclick:phone",
+        ahead=settings.REFRESH_AHEAD_SECONDS,
+        grace=settings.REFRESH_GRACE,
+        concurrency=settings.REFRESH_CONCURRENCY,
+        min_hits=settings.REFRESH_MIN_HITS,
+        window=settings.REFRESH_WINDOW,
+        interval=settings.REFRESH_INTERVAL
+    ) if settings.REFRESH_AHEAD else None
+)
+
+provider_registry = ProviderRegistry()
+provider_registry.register(
+    DataTypes.PHONE,
+    name="domclick",
+    service=domclick_search_service,
+    sender=ServiceNames.DOMCLICK,
+    label="DomClick API",
+    timeout=settings.PROVIDER_TIMEOUT,
+    upstream=Upstreams.DOMCLICK
+)
+
+
+def preload_providers():
+    """Build the lazily loaded provider services now instead of on the first lookup"""
+    domclick_service.load()
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from core.constants import Lanes
+from core.request_context import allow_stale, bind_request, request_deadline
+from infrastructure.metrics import cache_refreshes
+
+Refresh = Callable[[str], Awaitable[Any]]
+
+
+class RefreshAhead:
+    """
+    Keeps the hot keys of a cache warm. Accesses are counted with
+    exponential decay (half-life `window` seconds) and a key with at least
+    min_hits is hot. Hot entries are re-fetched once they are within `ahead`
+    seconds of expiring; after expiry their last value can still be served
+    for `grace` seconds while a refresh runs. Refreshes go through the bulk
+    lane, at most `concurrency` at a time; beyond that they are skipped, not queued.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ahead: float,
+        grace: float,
+        concurrency: int,
+        min_hits: float,
+        window: float,
+        interval: float,
+        max_keys: int = 10000
+    ):
+        self.namespace = namespace
+        self.ahead = ahead
+        self.grace = grace
+        self.concurrency = concurrency
+        self.min_hits = min_hits
+        self.window = window
+        self.interval = interval
+        self.max_keys = max_keys
+        self._counts: Dict[str, Tuple[float, float]] = {}
+        self._entries: Dict[str, Tuple[str, Any, float]] = {}
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._loop_task: Optional[asyncio.Task] = None
+        self.refreshed = 0
+        self.changed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.stale_served = 0
+
+    def hit(self, key: str) -> float:
+        now = time.monotonic()
+        count, updated = self._counts.get(key, (0.0, now))
+        count = self._decay(count, now - updated) + 1
+        self._counts[key] = (count, now)
+        if len(self._counts) > self.max_keys * 1.1:
+            self._prune(now)
+        return count
+
+    def is_hot(self, key: str) -> bool:
+        entry = self._counts.get(key)
+        if entry is None:
+            return False
+        count, updated = entry
+        return self._decay(count, time.monotonic() - updated) >= self.min_hits
+
+    def stored(self, key: str, query: str, value: Any, ttl: float):
+        """
+        A fresh value went into the cache. It is remembered for every tracked
+        key, so one that turns hot before expiring is refreshed in time.
+        """
+        if ttl > 0 and key in self._counts:
+            self._entries[key] = (query, value, time.monotonic() + ttl)
+        else:
+            self._entries.pop(key, None)
+
+    def stale(self, key: str, refresh: Refresh) -> Optional[Any]:
+        """The last value of an expired hot key, still within grace; starts its refresh"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        query, value, expires_at = entry
+        if time.monotonic() > expires_at + self.grace:
+            del self._entries[key]
+            return None
+        if not self.is_hot(key):
+            return None
+        self.trigger(key, query, refresh)
+        self.stale_served += 1
+        return value
+
+    def due(self) -> List[Tuple[str, str]]:
+        """Hot keys expiring within `ahead` seconds that are not being refreshed"""
+        now = time.monotonic()
+        due = []
+        for key, (query, _, expires_at) in list(self._entries.items()):
+            if expires_at + self.grace < now:
+                del self._entries[key]
+            elif expires_at - now <= self.ahead and key not in self._running and self.is_hot(key):
+                due.append((key, query))
+        return due
+
+    def trigger(self, key: str, query: str, refresh: Refresh) -> bool:
+        if key in self._running:
+            return False
+        if len(self._running) >= self.concurrency:
+            self.skipped += 1
+            cache_refreshes.inc(self.namespace, "skipped")
+            return False
+        self._running.add(key)
+        task = asyncio.get_running_loop().create_task(self._refresh(key, query, refresh))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def start(self, refresh: Refresh):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._refresh_periodically(refresh))
+
+    async def stop(self):
+        tasks = list(self._tasks)
+        if self._loop_task is not None:
+            tasks.append(self._loop_task)
+            self._loop_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tracked_keys": len(self._counts),
+            "hot_entries": len(self._entries),
+            "refreshing": len(self._running),
+            "refreshed": self.refreshed,
+            "changed": self.changed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "stale_served": self.stale_served,
+        }
+
+    async def _refresh_periodically(self, refresh: Refresh):
+        while True:
+            await asyncio.sleep(self.interval)
+            for key, query in self.due():
+                self.trigger(key, query, refresh)
+
+    async def _refresh(self, key: str, query: str, refresh: Refresh):
+        # Runs on spare capacity, unbounded by whichever request happened to start it
+        bind_request(Lanes.BULK, "refresh-ahead")
+        request_deadline.set(None)
+        allow_stale.set(False)
+        previous = self._entries.get(key)
+        try:
+            value = await refresh(query)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            cache_refreshes.inc(self.namespace, "failed")
+            logging.warning(f"Refresh of {key} failed: {e}")
+            return
+        finally:
+            self._running.discard(key)
+        self.refreshed += 1
+        if previous is not None and previous[1] != value:
+            self.changed += 1
+            cache_refreshes.inc(self.namespace, "changed")
+        else:
+            cache_refreshes.inc(self.namespace, "unchanged")
+
+    def _decay(self, count: float, elapsed: float) -> float:
+        return count * 0.5 ** (elapsed / self.window) if self.window > 0 else count
+
+    def _prune(self, now: float):
+        # Keep the max_keys most frequently used keys
+        decayed = sorted(
+            ((self._decay(count, now - updated), key) for key, (count, updated) in self._counts.items()),
+            reverse=True
+        )
+        for _, key in decayed[self.max_keys:]:
+            del self._counts[key]
+            self._entries.pop(key, None)
@@ -0,0 +1,248 @@
+import json
+import math
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, Sequence
+from starlette.datastructures import Headers
+from core.config import settings
+from infrastructure.metrics import (
+    admission_inflight, admission_limit, admission_queued_upstream, admission_rejections
+)
+
+
+class AdaptiveLimit:
+    """
+    Concurrency limit, in lookups, that follows latency and the upstream
+    backlog (AIMD). Each completed request reports its latency. A short
+    average is compared with a slow baseline. The limit is cut by `backoff`,
+    at most once per baseline round trip, when any of these holds:
+    - the short average is over `tolerance` times the baseline
+    - the request timed out
+    - more than `max_backlog` upstream calls per upstream slot are
+      queued, i.e. admitted work would wait that many upstream round
+      trips just to start
+    A request that
+    completes while the limit is at least half used raises it. Until the
+    first cut the raise is its full weight, so the limit roughly doubles
+    each round trip (slow start). After that it is weight / limit, about
+    one per round trip, until the limit passes the level it was last cut at.
+    """
+
+    def __init__(
+        self,
+        initial: float,
+        min_limit: float,
+        max_limit: float,
+        tolerance: float = 2.0,
+        backoff: float = 0.9,
+        queued: Optional[Callable[[], int]] = None,
+        capacity: int = 0,
+        max_backlog: float = 2.0,
+        smoothing: float = 0.2,
+        baseline_smoothing: float = 0.01
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.limit = float(min(max(initial, min_limit), self.max_limit))
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.queued = queued
+        self.capacity = capacity
+        self.max_backlog = max_backlog
+        self.smoothing = smoothing
+        self.baseline_smoothing = baseline_smoothing
+        self.inflight = 0.0
+        self.latency: Optional[float] = None
+        self.baseline: Optional[float] = None
+        self.admitted = 0
+        self.rejected = 0
+        self.decreases = 0
+        self._decreased_at = 0.0
+        self._slow_start_until = self.max_limit
+        admission_limit.set(self.limit)
+        admission_inflight.set(self.inflight)
+
+    def admits(self, weight: float = 1.0) -> bool:
+        """Whether weight more lookups fit; an idle worker admits anything. A refusal counts as a rejection"""
+        if self.inflight > 0 and self.inflight + weight > self.limit:
+            self.rejected += 1
+            return False
+        return True
+
+    def try_acquire(self, weight: float) -> bool:
+        if not self.admits(weight):
+            return False
+        self.inflight += weight
+        self.admitted += 1
+        admission_inflight.set(self.inflight)
+        return True
+
+    def adjust(self, delta: float):
+        """Change the weight of a request already admitted"""
+        self.inflight = max(0.0, self.inflight + delta)
+        admission_inflight.set(self.inflight)
+
+    def release(self, weight: float, latency: Optional[float] = None, overloaded: bool = False):
+        """End an admitted request; latency is None when it says nothing about load (streams)"""
+        utilized = self.inflight >= self.limit / 2
+        self.inflight = max(0.0, self.inflight - weight)
+        admission_inflight.set(self.inflight)
+        if latency is not None:
+            self._observe(latency)
+        queued = self.queued() if self.queued is not None else 0
+        admission_queued_upstream.set(queued)
+
+        backlogged = self.capacity > 0 and queued > self.capacity * self.max_backlog
+        if overloaded or backlogged or self._slow():
+            now = time.monotonic()
+            # One cut per unloaded round trip: requests already in flight report the same congestion
+            if now - self._decreased_at >= (self.baseline or 0.0):
+                self._decreased_at = now
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._slow_start_until = self.limit
+                self.decreases += 1
+        elif utilized and latency is not None:
+            step = weight if self.limit < self._slow_start_until else weight / self.limit
+            self.limit = min(self.max_limit, self.limit + step)
+        admission_limit.set(self.limit)
+
+    def retry_after(self) -> int:
+        """Seconds a shed client should wait: about one round trip, at least ADMISSION_RETRY_AFTER"""
+        return max(settings.ADMISSION_RETRY_AFTER, math.ceil(self.latency or 0.0))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "inflight": round(self.inflight, 2),
+            "queued_upstream": self.queued() if self.queued is not None else 0,
+            "latency_ms": round(self.latency * 1000, 2) if self.latency is not None else None,
+            "baseline_ms": round(self.baseline * 1000, 2) if self.baseline is not None else None,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "decreases": self.decreases,
+        }
+
+    def _observe(self, latency: float):
+        if self.latency is None:
+            self.latency = self.baseline = latency
+            return
+        self.latency += self.smoothing * (latency - self.latency)
+        # The baseline only learns from unloaded samples, so sustained overload cannot become the norm
+        if not self._slow():
+            self.baseline += self.baseline_smoothing * (latency - self.baseline)
+
+    def _slow(self) -> bool:
+        return self.baseline is not None and self.latency > self.baseline * self.tolerance
+
+
+class Admission:
+    """An admitted request's weight, and the query count its latency is divided by"""
+
+    def __init__(self, limit: AdaptiveLimit, weight: float):
+        self.limit = limit
+        self.weight = weight
+        self.queries = weight
+
+    def resize(self, queries: int):
+        weight = min(max(1, queries), settings.PROCESS_CONCURRENCY)
+        self.limit.adjust(weight - self.weight)
+        self.weight = weight
+        self.queries = max(1, queries)
+
+
+current_admission: ContextVar[Optional[Admission]] = ContextVar("current_admission", default=None)
+
+
+def admit_queries(queries: int):
+    """Report the query count of the current /process batch, once the route has parsed it"""
+    admission = current_admission.get()
+    if admission is not None:
+        admission.resize(queries)
+
+
+class AdmissionMiddleware:
+    """
+    Admits lookups under `paths` against an AdaptiveLimit and sheds the rest
+    at once with 503 and Retry-After. A /process batch weighs as many lookups
+    as it runs at a time (its query count, up to PROCESS_CONCURRENCY).
+    The body is not read here: a batch is admitted at the most its
+    Content-Length allows, and the route corrects that with admit_queries()
+    after parsing. Its latency is taken per round of PROCESS_CONCURRENCY
+    lookups, so batches and single lookups feed the same latency signal.
+    """
+
+    def __init__(self, app, limit: AdaptiveLimit, paths: Sequence[str]):
+        self.app = app
+        self.limit = limit
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        kind = self._kind(scope)
+        # When not even one more lookup fits, shed before reading the body
+        if not self.limit.admits():
+            await self._shed(kind, send)
+            return
+        weight = self._weigh(kind, scope)
+        if not self.limit.try_acquire(weight):
+            await self._shed(kind, send)
+            return
+        admission = Admission(self.limit, weight)
+        token = current_admission.set(admission)
+
+        started = time.monotonic()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_admission.reset(token)
+            latency = None
+            if kind != "stream":
+                rounds = math.ceil(admission.queries / settings.PROCESS_CONCURRENCY)
+                latency = (time.monotonic() - started) / rounds
+            self.limit.release(admission.weight, latency, overloaded=status == 504)
+
+    def _kind(self, scope) -> str:
+        if scope["path"].endswith("/process/stream"):
+            return "stream"
+        if scope["path"].endswith("/process") and scope["method"] == "POST":
+            return "batch"
+        return "lookup"
+
+    def _weigh(self, kind: str, scope) -> int:
+        """Weight to admit the request at before its body is read"""
+        if kind == "lookup":
+            return 1
+        if kind == "batch":
+            # Each query takes at least 4 bytes ("x",), which bounds a batch by its length
+            try:
+                length = int(Headers(scope=scope).get("content-length", ""))
+                return min(max(1, length // 4), settings.PROCESS_CONCURRENCY)
+            except ValueError:
+                pass
+        # A stream, or a batch of unknown length, runs up to PROCESS_CONCURRENCY lookups at a time
+        return settings.PROCESS_CONCURRENCY
+
+    async def _shed(self, kind: str, send):
+        admission_rejections.inc(kind)
+        body = json.dumps({"detail": "Server is overloaded, retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.limit.retry_after()).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
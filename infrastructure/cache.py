@@ -0,0 +1,144 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from pydantic import TypeAdapter
+from core.config import settings
+from domain.interfaces.cache import ICacheBackend
+from domain.models.search import SearchResult
+from infrastructure.sidecar_client import SidecarClient, SidecarUnavailable, sidecar
+
+_results = TypeAdapter(List[SearchResult])
+
+
+class InMemoryCache(ICacheBackend):
+    """Per-process TTL cache with LRU eviction once max_size is reached"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SharedCache(ICacheBackend):
+    """
+    Cache held by the sidecar, so a lookup made by one worker is a hit for
+    all of them. Values cross the socket as JSON text through encode and
+    decode; TTLs are kept by the sidecar. While the sidecar is unreachable
+    the worker-local fallback cache is used instead.
+    """
+
+    def __init__(
+        self,
+        client: SidecarClient,
+        encode: Callable[[Any], str],
+        decode: Callable[[str], Any],
+        fallback: ICacheBackend
+    ):
+        self.client = client
+        self.encode = encode
+        self.decode = decode
+        self.fallback = fallback
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            value = await self.client.call("cache.get", key)
+        except SidecarUnavailable:
+            self.fallbacks += 1
+            return await self.fallback.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.decode(value)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        encoded = self.encode(value)
+        # Once connected, a write needs no answer
+        if self.client.notify("cache.set", key, encoded, ttl):
+            return
+        try:
+            await self.client.call("cache.set", key, encoded, ttl)
+        except SidecarUnavailable:
+            self.fallbacks += 1
+            await self.fallback.set(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await self.fallback.delete(key)
+        try:
+            await self.client.call("cache.delete", key)
+        except SidecarUnavailable:
+            self.fallbacks += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "sidecar",
+            "hits": self.hits,
+            "misses": self.misses,
+            "fallbacks": self.fallbacks,
+            "fallback": self.fallback.stats(),
+        }
+
+
+def create_cache_backend(backend: Optional[str] = None) -> ICacheBackend:
+    backend = backend or settings.CACHE_BACKEND
+    if backend == "memory":
+        return InMemoryCache(settings.CACHE_MAX_SIZE)
+    if backend == "sidecar":
+        if sidecar is None:
+            raise ValueError("CACHE_BACKEND=sidecar needs SIDECAR_SOCKET")
+        return SharedCache(
+            sidecar,
+            encode=lambda results: _results.dump_json(results).decode(),
+            decode=_results.validate_json,
+            fallback=InMemoryCache(settings.CACHE_MAX_SIZE)
+        )
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+search_cache = create_cache_backend()
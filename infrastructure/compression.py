@@ -0,0 +1,110 @@
+import zlib
+from typing import Optional, Sequence
+from starlette.datastructures import Headers, MutableHeaders
+from infrastructure.metrics import response_bytes
+from infrastructure.serialization import parse_qvalues, preferred
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional encoding
+    zstandard = None
+
+
+class _Compressor:
+    """One response's compression stream; flush() ends a chunk so the client can decode it right away"""
+
+    def __init__(self, encoding: str, level: int):
+        if encoding == "zstd":
+            self._stream = zstandard.ZstdCompressor(level=level).compressobj()
+            self._flush = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            # wbits 31 writes a gzip header and trailer around the deflate stream
+            self._stream = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self._flush = zlib.Z_SYNC_FLUSH
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        compressed = self._stream.compress(data)
+        return compressed + (self._stream.flush() if final else self._stream.flush(self._flush))
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses under `paths` with zstd or gzip, whichever the
+    client's Accept-Encoding prefers (zstd on a tie, when zstandard is
+    installed). Only codings the client names are used: no header, or just
+    a * wildcard, gets the body uncompressed. A complete body smaller than minimum_size is sent as is.
+    Streamed bodies are compressed chunk by chunk, each chunk flushed, so
+    NDJSON lines are not held back; responses that already carry a
+    Content-Encoding pass through untouched.
+    """
+
+    def __init__(
+        self,
+        app,
+        paths: Sequence[str],
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        zstd_level: int = 3
+    ):
+        self.app = app
+        self.paths = tuple(paths)
+        self.minimum_size = minimum_size
+        self.levels = {"zstd": zstd_level, "gzip": gzip_level}
+        self.encodings = ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = Headers(scope=scope).get("accept-encoding")
+        listed = {coding for coding, q in parse_qvalues(accept_encoding) if q > 0}
+        encoding = preferred(accept_encoding, [coding for coding in self.encodings if coding in listed])
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(scope=start)
+                if "content-encoding" in headers or (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding, self.levels[encoding])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    # The compressed length is not known until the stream ends
+                    del headers["Content-Length"]
+                    await send(start)
+                else:
+                    compressed = compressor.compress(body, final=True)
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start)
+                    await self._send(send, encoding, body, compressed, False)
+                    return
+
+            compressed = compressor.compress(body, final=not more_body)
+            await self._send(send, encoding, body, compressed, more_body)
+
+        await self.app(scope, receive, send_compressed)
+
+    async def _send(self, send, encoding: str, body: bytes, compressed: bytes, more_body: bool):
+        response_bytes.inc(encoding, "raw", amount=len(body))
+        response_bytes.inc(encoding, "sent", amount=len(compressed))
+        await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
@@ -0,0 +1,37 @@
+import logging
+from typing import Optional
+from core.config import settings
+from core.request_context import set_deadline
+
+
+def parse_timeout(value: Optional[str]) -> Optional[float]:
+    """Seconds from an X-Request-Timeout header, None when absent or malformed"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        return None
+    return seconds if seconds > 0 else None
+
+
+class DeadlineMiddleware:
+    """
+    Starts each request's deadline: the client's X-Request-Timeout (seconds,
+    capped at REQUEST_DEADLINE_MAX), else REQUEST_DEADLINE, else none.
+    Upstream timeouts below are derived from what is left of it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            header = dict(scope["headers"]).get(b"x-request-timeout")
+            timeout = parse_timeout(header.decode("latin-1") if header else None)
+            if header and timeout is None:
+                logging.warning(f"Ignoring malformed X-Request-Timeout: {header!r}")
+            if timeout is not None and settings.REQUEST_DEADLINE_MAX > 0:
+                timeout = min(timeout, settings.REQUEST_DEADLINE_MAX)
+            set_deadline(timeout or settings.REQUEST_DEADLINE)
+        await self.app(scope, receive, send)
@@ -1,10 +1,33 @@
+import asyncio
 import aiohttp
 import logging
-from typing import Dict, Any
+import time
+from typing import Dict, Any, Optional, Union
+from core.config import settings
+from core.request_context import DeadlineExceeded, remaining, within_deadline
+from domain.services.classifier import normalize_phone
+from infrastructure.external.domclick_payload import MalformedPayload, decode_user_info
+from infrastructure.external.domclick_resilience import (
+    domclick_breaker, domclick_hedger, domclick_limiter, domclick_scheduler
+)
+from infrastructure.external.http_pool import http_pool, Upstreams
+from infrastructure.hedging import Hedger
+from infrastructure.metrics import upstream_request_seconds, upstream_retries
+from infrastructure.rate_limit import AdaptiveRateLimiter, SharedRateLimiter
+from infrastructure.scheduler import PriorityScheduler
+from infrastructure.resilience import (
+    CircuitBreaker, UpstreamError, backoff_delay, parse_retry_after
+)
 
 class DomClickClient:
-    def __init__(self):
-        self.base_url = "https://api.domclick.ru"
+    def __init__(
+        self,
+        limiter: Optional[Union[AdaptiveRateLimiter, SharedRateLimiter]] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        scheduler: Optional[PriorityScheduler] = None,
+        hedger: Optional[Hedger] = None
+    ):
+        self.base_url = settings.DOMCLICK_BASE_URL
         self.headers = {
             "Accept": "application/json",
             "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
@@ -12,23 +35,100 @@ class DomClickClient:
             "x-User-Context": "CUSTOMER",
             "x-User-Role": "CUSTOMER"
         }
-    
+        self.limiter = limiter or domclick_limiter
+        self.breaker = breaker or domclick_breaker
+        self.scheduler = scheduler or domclick_scheduler
+        self.hedger = hedger or domclick_hedger
+        self.retries = settings.DOMCLICK_RETRIES
+
     async def search_user(self, phone: str) -> Dict[str, Any]:
+        canonical = normalize_phone(phone)
+        if canonical is None:
+            raise ValueError(f"Invalid phone number: {phone}")
         params = {
-            "phone": phone[1:],  # Remove country code prefix
+            "phone": canonical[1:],  # National number without the country code
             "personTypeId": "21020"
         }
-        
-        async with aiohttp.ClientSession() as session:
+
+        # user_info is a read-only GET, so throttling and transient failures are retried
+        for attempt in range(self.retries + 1):
+            self.breaker.before_call()
+            try:
+                # Interactive requests get slots, and so tokens, before bulk ones
+                async with self.scheduler.slot():
+                    await self.limiter.acquire()
+                    # A hedge is an extra upstream call, so it needs a token that is free right now
+                    result = await self.hedger.run(
+                        lambda: self._get_user_info(params), self.limiter.try_acquire
+                    )
+            except UpstreamError as e:
+                self.breaker.record_failure()
+                if e.status == 429:
+                    self.limiter.on_throttled(e.retry_after)
+                delay = max(e.retry_after or 0.0, self._backoff(attempt))
+                if attempt == self.retries or not within_deadline(delay):
+                    raise
+            except DeadlineExceeded:
+                # The caller's budget ran out, which says nothing about DomClick's health
+                raise
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                self.breaker.record_failure()
+                delay = self._backoff(attempt)
+                if attempt == self.retries or not within_deadline(delay):
+                    raise
+            except Exception:
+                # The upstream answered, so this does not count against its health
+                self.breaker.record_success()
+                raise
+            else:
+                self.breaker.record_success()
+                self.limiter.on_success()
+                return result
+            logging.warning(f"DomClick request failed (attempt {attempt + 1}), retrying in {delay:.2f}s")
+            upstream_retries.inc(Upstreams.DOMCLICK)
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        return backoff_delay(attempt, settings.DOMCLICK_BACKOFF_BASE, settings.DOMCLICK_BACKOFF_MAX)
+
+    async def _get_user_info(self, params: Dict[str, str]) -> Dict[str, Any]:
+        session = http_pool.get_session(Upstreams.DOMCLICK)
+        # Never wait on DomClick past the request's deadline
+        timeout = remaining(settings.DOMCLICK_TIMEOUT)
+        started = time.perf_counter()
+        status = "error"
+        try:
             async with session.get(
                 f"{self.base_url}/portal/api/v1/user_info",
                 params=params,
                 headers=self.headers,
-                timeout=10
+                timeout=timeout
             ) as response:
+                status = str(response.status)
                 if response.status == 200:
-                    return await response.json()
+                    # Only the fields SearchResult needs are kept, and malformed bodies are rejected
+                    size = response.content_length
+                    if size is not None and size > settings.DOMCLICK_MAX_PAYLOAD:
+                        raise MalformedPayload(
+                            f"DomClick payload of {size} bytes exceeds {settings.DOMCLICK_MAX_PAYLOAD}"
+                        )
+                    return decode_user_info(await response.read(), settings.DOMCLICK_MAX_PAYLOAD)
                 elif response.status == 401:
                     raise Exception("Unauthorized access to DomClick API")
+                elif response.status == 429 or response.status >= 500:
+                    raise UpstreamError(
+                        response.status,
+                        f"DomClick API returned status: {response.status}",
+                        parse_retry_after(response.headers.get("Retry-After"))
+                    )
                 else:
-                    response.raise_for_status()
\ No newline at end of file
+                    response.raise_for_status()
+        except asyncio.TimeoutError as e:
+            if timeout < settings.DOMCLICK_TIMEOUT:
+                status = "deadline"
+                raise DeadlineExceeded("Request deadline exceeded waiting for DomClick") from e
+            status = "timeout"
+            raise
+        finally:
+            upstream_request_seconds.observe(time.perf_counter() - started, Upstreams.DOMCLICK, status)
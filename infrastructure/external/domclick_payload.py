@@ -0,0 +1,75 @@
+import json
+from typing import Any, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# Top-level and partnerCard keys that SearchResult is built from; everything else is dropped
+USER_FIELDS = ("casId", "firstName", "middleName", "lastName")
+PARTNER_FIELDS = ("photoUrl", "clientReview", "registeredAt", "dealsCount", "clientCommentsCount")
+_STRING_FIELDS = {"firstName", "middleName", "lastName", "photoUrl", "registeredAt"}
+_COUNT_FIELDS = {"dealsCount", "clientCommentsCount"}
+
+
+class MalformedPayload(ValueError):
+    """A DomClick user_info body that is not the expected JSON object"""
+
+
+def decode_user_info(body: bytes, max_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    The user_info fields SearchResult needs, straight from the response
+    bytes: no text decoding step, orjson when installed, and a payload
+    that is not a JSON object is rejected before it is parsed. The
+    result is the payload pruned to USER_FIELDS and PARTNER_FIELDS, each
+    type-checked, so DomClickService can adapt it as before.
+    """
+    if max_size is not None and len(body) > max_size:
+        raise MalformedPayload(f"DomClick payload of {len(body)} bytes exceeds {max_size}")
+    start = body.lstrip()[:1]
+    if start != b"{":
+        raise MalformedPayload(f"DomClick payload is not a JSON object: {body[:40]!r}")
+    try:
+        payload = orjson.loads(body) if orjson is not None else json.loads(body)
+    except ValueError as e:
+        raise MalformedPayload(f"DomClick payload is not valid JSON: {e}") from e
+
+    user = _pick(payload, USER_FIELDS)
+    cas_id = user.get("casId")
+    if cas_id is not None:
+        user["casId"] = _cas_id(cas_id)
+    partner_card = payload.get("partnerCard")
+    if partner_card is not None:
+        if not isinstance(partner_card, dict):
+            raise MalformedPayload(f"partnerCard is {type(partner_card).__name__}, expected an object")
+        user["partnerCard"] = _pick(partner_card, PARTNER_FIELDS)
+    return user
+
+
+def _pick(source: Dict[str, Any], fields: tuple) -> Dict[str, Any]:
+    picked = {}
+    for field in fields:
+        value = source.get(field)
+        if value is None:
+            continue
+        if field in _STRING_FIELDS and not isinstance(value, str):
+            raise MalformedPayload(f"{field} is {type(value).__name__}, expected a string")
+        if field in _COUNT_FIELDS and (isinstance(value, bool) or not isinstance(value, int)):
+            raise MalformedPayload(f"{field} is {type(value).__name__}, expected an integer")
+        if field == "clientReview":
+            # Ratings come as "4.8" or 4.8
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                raise MalformedPayload(f"clientReview is {type(value).__name__}, expected a rating")
+            value = str(value)
+        picked[field] = value
+    return picked
+
+
+def _cas_id(value: Any) -> int:
+    if isinstance(value, bool):
+        raise MalformedPayload("casId is a boolean")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise MalformedPayload(f"casId {value!r} is not an integer") from None
@@ -0,0 +1,26 @@
+from core.config import settings
+from infrastructure.external.http_pool import Upstreams
+from infrastructure.hedging import Hedger
+from infrastructure.rate_limit import create_rate_limiter
+from infrastructure.resilience import CircuitBreaker
+from infrastructure.scheduler import PriorityScheduler
+
+# Shared by every DomClickClient in the worker so limits and health are per upstream.
+# Kept apart from the client so /health can report them before the client is loaded.
+domclick_limiter = create_rate_limiter(Upstreams.DOMCLICK, settings.DOMCLICK_RATE, settings.DOMCLICK_MIN_RATE)
+domclick_breaker = CircuitBreaker(
+    Upstreams.DOMCLICK,
+    failure_threshold=settings.DOMCLICK_BREAKER_THRESHOLD,
+    reset_timeout=settings.DOMCLICK_BREAKER_RESET
+)
+domclick_scheduler = PriorityScheduler(
+    Upstreams.DOMCLICK, settings.DOMCLICK_CONCURRENCY, settings.SCHEDULER_BULK_SHARE
+)
+domclick_hedger = Hedger(
+    Upstreams.DOMCLICK,
+    enabled=settings.DOMCLICK_HEDGE,
+    percentile=settings.HEDGE_PERCENTILE,
+    max_rate=settings.HEDGE_MAX_RATE,
+    min_delay=settings.HEDGE_MIN_DELAY,
+    min_samples=settings.HEDGE_MIN_SAMPLES
+)
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Dict, Any, Optional
+from core.config import settings
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+class Upstreams:
+    DOMCLICK = "domclick"
+    VALIDATOR = "validator"
+
+
+class HttpSessionPool:
+    """App-scoped aiohttp sessions, one connection pool per upstream"""
+
+    def __init__(self):
+        self._sessions: Dict[str, "aiohttp.ClientSession"] = {}
+        self._loops: Dict[str, asyncio.AbstractEventLoop] = {}
+
+    def _create_session(self) -> "aiohttp.ClientSession":
+        # Imported here: aiohttp is the heaviest import of the app and no request may need it yet
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(
+            limit=settings.HTTP_POOL_LIMIT,
+            limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=settings.HTTP_DNS_TTL,
+        )
+        return aiohttp.ClientSession(connector=connector)
+
+    def get_session(self, upstream: str) -> "aiohttp.ClientSession":
+        """Return the pooled session for upstream, creating it on first use"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(upstream)
+        # A session is bound to the loop it was created on
+        if session is None or session.closed or self._loops.get(upstream) is not loop:
+            if session is not None:
+                self._retire(upstream, session, self._loops.get(upstream))
+            session = self._create_session()
+            self._sessions[upstream] = session
+            self._loops[upstream] = loop
+        return session
+
+    def _retire(self, upstream: str, session: "aiohttp.ClientSession", loop: Optional[asyncio.AbstractEventLoop]):
+        """Close a replaced session: on its own loop while that runs, otherwise its connector right away"""
+        if session.closed:
+            return
+        try:
+            if loop is not None and loop.is_running() and not loop.is_closed():
+                asyncio.run_coroutine_threadsafe(session.close(), loop)
+                return
+            # Its loop is gone, so nothing can await the close; drop the pooled connections directly
+            connector = session.connector
+            if connector is not None:
+                close = getattr(connector, "_close", None)
+                if close is None:
+                    raise RuntimeError("connector cannot be closed synchronously")
+                close()
+        except Exception as e:
+            logging.error(f"Failed to close replaced HTTP session for {upstream}: {e}")
+
+    async def start(self, *upstreams: str):
+        for upstream in upstreams or (Upstreams.DOMCLICK, Upstreams.VALIDATOR):
+            self.get_session(upstream)
+
+    async def close(self):
+        sessions, self._sessions = self._sessions, {}
+        self._loops = {}
+        for upstream, session in sessions.items():
+            try:
+                await session.close()
+            except Exception as e:
+                logging.error(f"Failed to close HTTP session for {upstream}: {e}")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """In-use and idle connection counts per upstream pool"""
+        result = {}
+        for upstream, session in self._sessions.items():
+            connector: Optional["aiohttp.BaseConnector"] = session.connector
+            if connector is None or session.closed:
+                continue
+            # aiohttp does not expose these counters publicly
+            acquired = getattr(connector, "_acquired", None) or ()
+            idle = getattr(connector, "_conns", None) or {}
+            result[upstream] = {
+                "in_use": len(acquired),
+                "idle": sum(len(conns) for conns in idle.values()),
+                "limit": getattr(connector, "limit", None),
+                "limit_per_host": getattr(connector, "limit_per_host", None),
+            }
+        return result
+
+
+http_pool = HttpSessionPool()
@@ -1,66 +1,193 @@
-import aiohttp
+import asyncio
 import logging
-import re
-from typing import List, Dict, Any
+import time
+from contextvars import Context
+from typing import List, Dict, Any, Optional
+from core.config import settings
+from core.request_context import DeadlineExceeded, join_lane, remaining, shared_context, wait_shared
 from core.schemas.response import ValidatorResponseItem, ValidatorRequest
+from domain.services.classifier import Classification, classify, classify_one
+from infrastructure.external.http_pool import http_pool, Upstreams
+from infrastructure.metrics import upstream_request_seconds, validator_fallbacks
+from infrastructure.scheduler import PriorityScheduler
+
+validator_scheduler = PriorityScheduler(
+    Upstreams.VALIDATOR, settings.VALIDATOR_CONCURRENCY, settings.SCHEDULER_BULK_SHARE
+)
 
 
 class ValidatorClient:
-    def __init__(self, base_url: str):
-        self.base_url = base_url
-    
+    def __init__(
+        self,
+        endpoint: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        local_first: Optional[bool] = None,
+        scheduler: Optional[PriorityScheduler] = None
+    ):
+        self.base_url = endpoint or settings.VALIDATOR_ENDPOINT
+        self.batch_size = batch_size or settings.VALIDATOR_BATCH_SIZE
+        self.local_first = settings.VALIDATOR_LOCAL_FIRST if local_first is None else local_first
+        self.scheduler = scheduler or validator_scheduler
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Context of the shared validation each in-flight query belongs to
+        self._contexts: Dict[str, Context] = {}
+        self._tasks = set()
+        self.coalesced = 0
+
     def _fallback_validation(self, queries: List[str]) -> List[ValidatorResponseItem]:
         """Fallback validation when Validator IS is unavailable"""
-        results = []
-        
-        for query in queries:
-            # Simple regex patterns for common data types
-            phone_pattern = r'^7\d{10}$'  # Russian phone format
-            email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-            
-            if re.match(phone_pattern, query):
-                data_type = "phone"
-            elif re.match(email_pattern, query):
-                data_type = "email"
-            else:
-                data_type = "unknown"
-            
-            # Create response item with proper structure
-            result_item = {
-                "headers": {"sender": "tw.tools.validator"},
-                "body": {
-                    "request_data": query,
-                    "type": data_type,
-                    "clean_data": query
-                },
-                "extra": {"fallback": True}
-            }
-            
-            # Convert to ValidatorResponseItem
-            results.append(ValidatorResponseItem(**result_item))
-        
-        return results
-    
+        return [
+            self._local_item(query, classification, {"fallback": True})
+            for query, classification in zip(queries, classify(queries))
+        ]
+
+    @staticmethod
+    def _local_item(query: str, classification: Classification, extra: Dict[str, Any]) -> ValidatorResponseItem:
+        # Fields are built here, so pydantic validation is skipped
+        return ValidatorResponseItem.model_construct(
+            headers={"sender": "tw.tools.validator"},
+            body={
+                "request_data": query,
+                "type": classification.data_type,
+                "clean_data": classification.clean_data
+            },
+            extra=extra
+        )
+
     async def validate_queries(self, queries: List[str]) -> List[ValidatorResponseItem]:
         """
-        Validate queries using SMK-RK Validator IS with fallback
+        Validate queries using SMK-RK Validator IS with fallback.
+        In local-first mode, inputs that the local classifier resolves
+        unambiguously are answered without calling Validator IS.
+        """
+        if not self.local_first:
+            return await self._validate_remote(queries)
+
+        resolved: Dict[str, ValidatorResponseItem] = {}
+        remote = []
+        for query in dict.fromkeys(queries):
+            classification = classify_one(query)
+            if classification.ambiguous:
+                remote.append(query)
+            else:
+                resolved[query] = self._local_item(query, classification, {"local": True})
+
+        if remote:
+            resolved.update(zip(remote, await self._validate_remote(remote)))
+        return [resolved[query] for query in queries]
+
+    async def _validate_remote(self, queries: List[str]) -> List[ValidatorResponseItem]:
+        """
+        Identical strings are classified once, including strings already in
+        flight for a concurrent call; the rest are split into chunks of
+        batch_size that are sent concurrently. Results follow the order of queries.
+        The validation runs without this caller's deadline, as other callers
+        may wait on it; a caller whose deadline passes first classifies locally.
         """
+        loop = asyncio.get_running_loop()
+        pending: Dict[str, asyncio.Future] = {}
+        owned: Dict[str, asyncio.Future] = {}
+        context = shared_context()
+        for query in dict.fromkeys(queries):
+            future = self._inflight.get(query)
+            if future is None or future.done() or future.get_loop() is not loop:
+                future = loop.create_future()
+                self._inflight[query] = future
+                self._contexts[query] = context
+                owned[query] = future
+            else:
+                self.coalesced += 1
+                join_lane(self._contexts[query])
+            pending[query] = future
+
+        if owned:
+            # Runs independently of this caller so cancellation cannot strand other waiters
+            task = loop.create_task(self._validate_owned(owned), context=context)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        waiting = asyncio.gather(*(asyncio.shield(future) for future in pending.values()))
+        try:
+            results = await wait_shared(waiting)
+        except DeadlineExceeded:
+            validator_fallbacks.inc("deadline", amount=len(pending))
+            return self._fallback_validation(queries)
+        finally:
+            # Only this caller waits on the gather; the shared futures go on
+            waiting.cancel()
+        by_query = dict(zip(pending, results))
+        return [by_query[query] for query in queries]
+
+    async def _validate_owned(self, owned: Dict[str, asyncio.Future]):
+        queries = list(owned)
+        chunks = [
+            queries[start:start + self.batch_size]
+            for start in range(0, len(queries), self.batch_size)
+        ]
+        try:
+            chunk_results = await asyncio.gather(*(self._validate_scheduled(chunk) for chunk in chunks))
+            items = [item for chunk in chunk_results for item in chunk]
+            if len(items) != len(queries):
+                raise ValueError(f"Validation returned {len(items)} items for {len(queries)} queries")
+            for query, item in zip(queries, items):
+                self._resolve(query, owned[query], item)
+        except Exception as e:
+            for query in queries:
+                self._resolve(query, owned[query], error=e)
+
+    def _resolve(self, query: str, future: asyncio.Future, item: Any = None, error: Exception = None):
+        if self._inflight.get(query) is future:
+            del self._inflight[query]
+            self._contexts.pop(query, None)
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+            # Retrieved here so an abandoned future does not log a warning
+            future.exception()
+        else:
+            future.set_result(item)
+
+    async def _validate_scheduled(self, queries: List[str]) -> List[ValidatorResponseItem]:
+        # Lane and client come from the request that started this validation
+        async with self.scheduler.slot():
+            return await self._validate_chunk(queries)
+
+    async def _validate_chunk(self, queries: List[str]) -> List[ValidatorResponseItem]:
+        started = time.perf_counter()
+        status = "error"
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/api/v1/validate",
-                    json={"query": queries},
-                    timeout=10
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        # Convert each item to ValidatorResponseItem
-                        return [ValidatorResponseItem(**item) for item in data]
-                    else:
-                        logging.error(f"Validator API returned status: {response.status}")
-                        # Use fallback validation
+            session = http_pool.get_session(Upstreams.VALIDATOR)
+            # Past the request's deadline there is no time to ask, so classify locally
+            async with session.post(
+                f"{self.base_url}/api/v1/validate",
+                json={"query": queries},
+                timeout=remaining(settings.VALIDATOR_TIMEOUT)
+            ) as response:
+                status = str(response.status)
+                if response.status == 200:
+                    data = await response.json()
+                    if len(data) != len(queries):
+                        logging.error(
+                            f"Validator API returned {len(data)} items for {len(queries)} queries"
+                        )
+                        validator_fallbacks.inc("length_mismatch", amount=len(queries))
                         return self._fallback_validation(queries)
+                    # Convert each item to ValidatorResponseItem
+                    return [ValidatorResponseItem(**item) for item in data]
+                else:
+                    logging.error(f"Validator API returned status: {response.status}")
+                    validator_fallbacks.inc("status", amount=len(queries))
+                    # Use fallback validation
+                    return self._fallback_validation(queries)
         except Exception as e:
+            if isinstance(e, DeadlineExceeded):
+                status = "deadline"
+            elif isinstance(e, asyncio.TimeoutError):
+                status = "timeout"
             logging.error(f"Validator client error: {e}")
+            validator_fallbacks.inc(status, amount=len(queries))
             # Use fallback validation when API is unavailable
-            return self._fallback_validation(queries)
\ No newline at end of file
+            return self._fallback_validation(queries)
+        finally:
+            upstream_request_seconds.observe(time.perf_counter() - started, Upstreams.VALIDATOR, status)
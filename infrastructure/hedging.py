@@ -0,0 +1,135 @@
+import asyncio
+import inspect
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar, Union
+from infrastructure.metrics import hedged_requests
+
+T = TypeVar("T")
+
+
+class Hedger:
+    """
+    Hedged calls for one idempotent upstream. When a call has not answered
+    within the `percentile` of recent latencies, an identical second call is
+    started and whichever succeeds first is used; the other is cancelled.
+    Hedges draw from a budget that grows by max_rate per call, so at most
+    that share of calls is ever doubled, even when the upstream slows down
+    as a whole and every call crosses the percentile.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        enabled: bool,
+        percentile: float = 95,
+        max_rate: float = 0.05,
+        min_delay: float = 0.05,
+        min_samples: int = 50,
+        window: int = 1000
+    ):
+        self.name = name
+        self.enabled = enabled
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.burst = max(1.0, max_rate * 100)
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._delay: Optional[float] = None
+        self._stale = 0
+        self._budget = 0.0
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.denied = 0
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, None until enough latencies are known"""
+        if len(self._samples) < self.min_samples:
+            return None
+        # Sorting the window on every call would cost more than the hedge saves
+        if self._delay is None or self._stale >= max(1, len(self._samples) // 20):
+            ordered = sorted(self._samples)
+            rank = max(1, math.ceil(self.percentile / 100 * len(ordered)))
+            self._delay = max(self.min_delay, ordered[rank - 1])
+            self._stale = 0
+        return self._delay
+
+    def observe(self, latency: float):
+        self._samples.append(latency)
+        self._stale += 1
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        allow: Optional[Callable[[], Union[bool, Awaitable[bool]]]] = None
+    ) -> T:
+        """
+        Await call(), hedging it when enabled and within budget. allow (plain
+        or async) is checked just before a hedge is started, e.g. to take a rate limit token.
+        """
+        self.calls += 1
+        self._budget = min(self.burst, self._budget + self.max_rate)
+        delay = self.delay() if self.enabled else None
+        started = time.perf_counter()
+        if delay is None:
+            result = await call()
+            self.observe(time.perf_counter() - started)
+            return result
+
+        primary = asyncio.ensure_future(call())
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                if self._budget >= 1 and await self._allowed(allow):
+                    self._budget -= 1
+                    self.hedged += 1
+                    hedged_requests.inc(self.name, "fired")
+                    tasks.append(asyncio.ensure_future(call()))
+                else:
+                    self.denied += 1
+                    hedged_requests.inc(self.name, "denied")
+
+            error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        # A hedge win still tells us the primary took at least this long
+                        self.observe(time.perf_counter() - started)
+                        if task is not primary:
+                            self.hedge_wins += 1
+                            hedged_requests.inc(self.name, "won")
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Marks the loser's exception as retrieved
+                    task.exception()
+
+    @staticmethod
+    async def _allowed(allow: Optional[Callable[[], Union[bool, Awaitable[bool]]]]) -> bool:
+        if allow is None:
+            return True
+        allowed = allow()
+        return await allowed if inspect.isawaitable(allowed) else allowed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "denied": self.denied,
+            "hedge_rate": round(self.hedged / self.calls, 4) if self.calls else 0.0,
+            "max_rate": self.max_rate,
+            "delay_ms": round(self._delay * 1000, 3) if self._delay is not None else None,
+        }
@@ -0,0 +1,186 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class JobStore:
+    """
+    SQLite-backed job persistence. Methods are blocking; callers on the event
+    loop run them through asyncio.to_thread.
+    """
+
+    def __init__(self, path: str, lease: float = 300.0):
+        self.path = path
+        self.lease = lease
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    processed INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    lease_until REAL,
+                    error TEXT
+                );
+                CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+                CREATE TABLE IF NOT EXISTS job_items (
+                    job_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    query TEXT NOT NULL,
+                    result TEXT,
+                    PRIMARY KEY (job_id, idx)
+                );
+            """)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def create_job(self, queries: List[str]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT INTO jobs (id, status, total, created_at) VALUES (?, ?, ?, ?)",
+                    (job_id, JobStatus.QUEUED, len(queries), time.time())
+                )
+                conn.executemany(
+                    "INSERT INTO job_items (job_id, idx, query) VALUES (?, ?, ?)",
+                    ((job_id, idx, query) for idx, query in enumerate(queries))
+                )
+        return job_id
+
+    def claim_next_job(self) -> Optional[str]:
+        """
+        Atomically claim the oldest queued job, or a running job whose lease
+        expired because the worker process that held it died. Safe to call
+        from several uvicorn workers sharing one database file.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                row = conn.execute(
+                    """
+                    UPDATE jobs SET status = ?, started_at = COALESCE(started_at, ?), lease_until = ?
+                    WHERE id = (
+                        SELECT id FROM jobs
+                        WHERE status = ? OR (status = ? AND lease_until < ?)
+                        ORDER BY created_at LIMIT 1
+                    )
+                    RETURNING id
+                    """,
+                    (JobStatus.RUNNING, now, now + self.lease, JobStatus.QUEUED, JobStatus.RUNNING, now)
+                ).fetchone()
+        return row["id"] if row is not None else None
+
+    def release_jobs(self, job_ids: List[str]):
+        """Put jobs this process was running back in the queue on shutdown"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "UPDATE jobs SET status = ?, lease_until = NULL WHERE id = ? AND status = ?",
+                    ((JobStatus.QUEUED, job_id, JobStatus.RUNNING) for job_id in job_ids)
+                )
+
+    def pending_items(self, job_id: str, limit: int) -> List[Tuple[int, str]]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT idx, query FROM job_items WHERE job_id = ? AND result IS NULL ORDER BY idx LIMIT ?",
+                (job_id, limit)
+            ).fetchall()
+        return [(row["idx"], row["query"]) for row in rows]
+
+    def save_results(self, job_id: str, results: List[Tuple[int, str, bool]]):
+        """
+        Store (idx, result_json, failed) rows and advance the job counters.
+        Items that already have a result keep it and are not counted again,
+        so a worker that lost its lease cannot double count a chunk.
+        """
+        processed = failed = 0
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                for idx, result, is_failed in results:
+                    saved = conn.execute(
+                        "UPDATE job_items SET result = ? WHERE job_id = ? AND idx = ? AND result IS NULL",
+                        (result, job_id, idx)
+                    ).rowcount
+                    processed += saved
+                    failed += saved if is_failed else 0
+                # Each saved chunk also renews the job lease
+                conn.execute(
+                    "UPDATE jobs SET processed = processed + ?, failed = failed + ?, lease_until = ? WHERE id = ?",
+                    (processed, failed, time.time() + self.lease, job_id)
+                )
+
+    def finish_job(self, job_id: str, status: str, error: Optional[str] = None):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+                    (status, time.time(), error, job_id)
+                )
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def get_results(self, job_id: str, offset: int, limit: int) -> List[Tuple[int, str, Optional[str]]]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT idx, query, result FROM job_items WHERE job_id = ? ORDER BY idx LIMIT ? OFFSET ?",
+                (job_id, limit, offset)
+            ).fetchall()
+        return [(row["idx"], row["query"], row["result"]) for row in rows]
+
+    def queue_stats(self) -> Dict[str, int]:
+        with self._lock:
+            conn = self._connect()
+            jobs = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall())
+            pending = conn.execute(
+                "SELECT COALESCE(SUM(total - processed), 0) FROM jobs WHERE status IN (?, ?)",
+                (JobStatus.QUEUED, JobStatus.RUNNING)
+            ).fetchone()[0]
+        return {
+            "queued_jobs": jobs.get(JobStatus.QUEUED, 0),
+            "running_jobs": jobs.get(JobStatus.RUNNING, 0),
+            "completed_jobs": jobs.get(JobStatus.COMPLETED, 0),
+            "failed_jobs": jobs.get(JobStatus.FAILED, 0),
+            "pending_queries": pending,
+        }
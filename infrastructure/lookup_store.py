@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import TypeAdapter
+from core.config import settings
+from domain.interfaces.lookup_store import ILookupStore
+from domain.models.search import SearchResult
+
+_results = TypeAdapter(List[SearchResult])
+
+
+class SQLiteLookupStore(ILookupStore):
+    """
+    Lookup results in SQLite (WAL), shared by all workers on the host.
+    record() only buffers in memory; a background task writes the buffer in
+    one transaction per batch through asyncio.to_thread, so requests never
+    wait on disk. Buffered writes for the same key collapse into the latest.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str], Tuple[bytes, float]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS lookups (
+                    namespace TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    results BLOB NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, query)
+                );
+                CREATE INDEX IF NOT EXISTS lookups_fetched ON lookups (namespace, fetched_at);
+            """)
+            self._conn = conn
+        return self._conn
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        await asyncio.to_thread(self.close)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def record(self, namespace: str, query: str, results: List[SearchResult]) -> None:
+        key = (namespace, query)
+        if len(self._pending) >= self.max_pending and key not in self._pending:
+            # The disk is not keeping up; losing a record only costs a warm entry
+            self.dropped += 1
+            return
+        self._pending[key] = (_results.dump_json(results), time.time())
+        if len(self._pending) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except Exception as e:
+            logging.error(f"Failed to write {len(batch)} lookups: {e}")
+            self.dropped += len(batch)
+
+    async def get(self, namespace: str, query: str) -> Optional[Tuple[List[SearchResult], float]]:
+        pending = self._pending.get((namespace, query))
+        if pending is not None:
+            return _results.validate_json(pending[0]), pending[1]
+        row = await asyncio.to_thread(self._read, namespace, query)
+        if row is None:
+            return None
+        return _results.validate_json(row[0]), row[1]
+
+    async def recent(
+        self, namespace: str, limit: int, max_age: float
+    ) -> List[Tuple[str, List[SearchResult], float]]:
+        rows = await asyncio.to_thread(self._read_recent, namespace, limit, time.time() - max_age)
+        return [(query, _results.validate_json(results), fetched_at) for query, results, fetched_at in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "sqlite",
+            "pending": len(self._pending),
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+        }
+
+    async def _flush_periodically(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def _write(self, batch: Dict[Tuple[str, str], Tuple[bytes, float]]):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    """
+                    INSERT INTO lookups (namespace, query, results, fetched_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (namespace, query) DO UPDATE
+                    SET results = excluded.results, fetched_at = excluded.fetched_at
+                    WHERE excluded.fetched_at > lookups.fetched_at
+                    """,
+                    ((namespace, query, results, fetched_at) for (namespace, query), (results, fetched_at) in batch.items())
+                )
+        self.written += len(batch)
+        self.flushes += 1
+
+    def _read(self, namespace: str, query: str) -> Optional[Tuple[bytes, float]]:
+        with self._lock:
+            return self._connect().execute(
+                "SELECT results, fetched_at FROM lookups WHERE namespace = ? AND query = ?",
+                (namespace, query)
+            ).fetchone()
+
+    def _read_recent(self, namespace: str, limit: int, since: float) -> List[Tuple[str, bytes, float]]:
+        with self._lock:
+            return self._connect().execute(
+                """
+                SELECT query, results, fetched_at FROM lookups
+                WHERE namespace = ? AND fetched_at > ?
+                ORDER BY fetched_at DESC LIMIT ?
+                """,
+                (namespace, since, limit)
+            ).fetchall()
+
+
+def create_lookup_store(path: Optional[str] = None) -> Optional[SQLiteLookupStore]:
+    path = settings.LOOKUP_STORE_PATH if path is None else path
+    if not path:
+        return None
+    return SQLiteLookupStore(
+        path,
+        batch_size=settings.LOOKUP_STORE_BATCH_SIZE,
+        flush_interval=settings.LOOKUP_STORE_FLUSH_INTERVAL
+    )
+
+
+lookup_store = create_lookup_store()
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+from core.config import settings
+from infrastructure.metrics import event_loop_lag_seconds, event_loop_stalls
+
+
+class LoopWatchdog:
+    """
+    Measures how late the event loop runs a timer that should fire every
+    `interval` seconds, and watches it from a thread: when the loop has
+    not come back for `threshold` seconds, the stack of whatever is holding
+    it is logged and kept among the last `keep` stalls. The stack is taken
+    while the blocking code still runs, so it points at the culprit.
+    """
+
+    def __init__(self, interval: float, threshold: float, keep: int = 10):
+        self.interval = interval
+        self.threshold = threshold
+        self.heartbeat = time.monotonic()
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=keep)
+        self._loop_thread: Optional[int] = None
+        self._reported_beat: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "last_lag_ms": round(self.last_lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "stalls": self.stalls,
+            "last_stall": self.recent[-1]["function"] if self.recent else None,
+        }
+
+    async def _tick(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.heartbeat = now
+            self.last_lag = max(0.0, now - expected)
+            self.max_lag = max(self.max_lag, self.last_lag)
+            event_loop_lag_seconds.observe(self.last_lag)
+
+    def _watch(self):
+        while not self._stopped.wait(min(self.interval, self.threshold / 2)):
+            self.check()
+
+    def check(self) -> Optional[Dict[str, Any]]:
+        """Report the loop thread's stack if it is overdue by threshold; once per stall"""
+        beat = self.heartbeat
+        blocked = time.monotonic() - beat - self.interval
+        if blocked < self.threshold or beat == self._reported_beat:
+            return None
+        self._reported_beat = beat
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return None
+        summary = traceback.extract_stack(frame)
+        stall = {
+            "at": time.time(),
+            "blocked_ms": round(blocked * 1000, 2),
+            "function": f"{summary[-1].name} ({summary[-1].filename}:{summary[-1].lineno})" if summary else None,
+            "stack": "".join(summary.format()),
+        }
+        self.stalls += 1
+        self.recent.append(stall)
+        event_loop_stalls.inc()
+        logging.warning(f"Event loop blocked for {stall['blocked_ms']}ms, in:\n{stall['stack']}")
+        return stall
+
+
+loop_watchdog = LoopWatchdog(settings.LOOP_LAG_INTERVAL, settings.LOOP_STALL_THRESHOLD)
@@ -1,15 +1,138 @@
+from infrastructure.startup import startup
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from api.v1.router import api_router
 from core.config import settings
+from infrastructure.external.http_pool import http_pool
+from infrastructure.cache import search_cache
+from infrastructure.external.domclick_resilience import (
+    domclick_breaker, domclick_hedger, domclick_limiter, domclick_scheduler
+)
+from infrastructure.external.validator_client import validator_scheduler
+from infrastructure.resilience import CircuitState
+from infrastructure.admission import AdaptiveLimit, AdmissionMiddleware
+from infrastructure.compression import CompressionMiddleware
+from infrastructure.deadline import DeadlineMiddleware
+from infrastructure.metrics import MetricsMiddleware, metrics
+from infrastructure.lookup_store import lookup_store
+from infrastructure.loop_watchdog import loop_watchdog
+from infrastructure.sidecar_client import SidecarUnavailable, sidecar
+from domain.services.providers import domclick_search_service, preload_providers
+from controllers.jobs_controller import job_runner
+
+startup.mark("import")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # With FAST_START the worker is ready as soon as it can answer: upstream
+    # sessions and providers are set up on first use, and steps that only
+    # make later requests faster run in the background
+    fast = settings.FAST_START
+    background = []
+    if settings.LOOP_WATCHDOG:
+        # Started first so that blocking startup steps are reported too
+        await loop_watchdog.start()
+    if not fast:
+        # One pooled connection set per upstream for the lifetime of the worker
+        with startup.step("http_pool"):
+            await http_pool.start()
+        with startup.step("providers"):
+            preload_providers()
+    with startup.step("metrics"):
+        await metrics.start()
+    if sidecar is not None:
+        if fast:
+            background.append(asyncio.create_task(_connect_sidecar()))
+        else:
+            with startup.step("sidecar"):
+                await _connect_sidecar()
+    if lookup_store is not None:
+        with startup.step("lookup_store"):
+            await lookup_store.start()
+        if fast:
+            background.append(asyncio.create_task(_warm_cache()))
+        else:
+            with startup.step("warm_cache"):
+                await _warm_cache()
+    with startup.step("refresh_ahead"):
+        await domclick_search_service.start()
+    with startup.step("job_runner"):
+        await job_runner.start()
+    startup.mark_ready()
+    steps = ", ".join(f"{name} {ms} ms" for name, ms in startup.report()["steps_ms"].items())
+    logging.info(f"Ready in {startup.report()['ready_after_ms']} ms ({steps})")
+    yield
+    # Readiness goes first so load balancers stop sending requests
+    startup.draining = True
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    await job_runner.stop()
+    await domclick_search_service.stop()
+    if lookup_store is not None:
+        await lookup_store.stop()
+    await metrics.stop()
+    if sidecar is not None:
+        await sidecar.close()
+    await http_pool.close()
+    await loop_watchdog.stop()
+
+async def _connect_sidecar():
+    # Without the sidecar the worker runs on local state and keeps retrying
+    try:
+        await sidecar.call("ping")
+    except SidecarUnavailable as e:
+        logging.error(f"Starting without shared state: {e}")
+
+async def _warm_cache():
+    # A missing or unreadable store only means a cold cache
+    try:
+        warmed = await domclick_search_service.warm(settings.LOOKUP_WARM_LIMIT)
+        logging.info(f"Warmed search cache with {warmed} stored lookups")
+    except Exception as e:
+        logging.error(f"Cache warm-up failed: {e}")
+
+admission = AdaptiveLimit(
+    settings.ADMISSION_INITIAL_LIMIT,
+    settings.ADMISSION_MIN_LIMIT,
+    settings.ADMISSION_MAX_LIMIT,
+    tolerance=settings.ADMISSION_LATENCY_TOLERANCE,
+    backoff=settings.ADMISSION_BACKOFF,
+    queued=lambda: domclick_scheduler.waiting + validator_scheduler.waiting,
+    capacity=domclick_scheduler.capacity + validator_scheduler.capacity,
+    max_backlog=settings.ADMISSION_MAX_BACKLOG
+)
 
 app = FastAPI(
     title="Sfera Information System",
     description="Refactored parsing services for Sfera system - Migrated to Python",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
+app.add_middleware(DeadlineMiddleware)
+if settings.COMPRESSION:
+    app.add_middleware(
+        CompressionMiddleware,
+        paths=("/api/v1/common", "/api/v1/domclick"),
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        gzip_level=settings.GZIP_LEVEL,
+        zstd_level=settings.ZSTD_LEVEL
+    )
+# Outside compression so shed requests cost as little as possible; inside metrics so they are counted
+if settings.ADMISSION_CONTROL:
+    app.add_middleware(
+        AdmissionMiddleware,
+        limit=admission,
+        paths=("/api/v1/common/process", "/api/v1/domclick/search")
+    )
+app.add_middleware(MetricsMiddleware)
+
 # Include API routes
 app.include_router(api_router, prefix="/api/v1")
 
@@ -23,7 +146,46 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "mode": settings.MODE}
+    refresh_ahead = domclick_search_service.refresh_ahead
+    upstreams = {
+        "domclick": {
+            "circuit_breaker": domclick_breaker.stats(),
+            "rate_limiter": domclick_limiter.stats(),
+            "scheduler": domclick_scheduler.stats(),
+            "hedging": domclick_hedger.stats()
+        },
+        "validator": {
+            "scheduler": validator_scheduler.stats()
+        }
+    }
+    # The service itself is up; an open breaker means lookups are failing fast
+    degraded = domclick_breaker.state != CircuitState.CLOSED
+    return {
+        "status": "degraded" if degraded else "healthy",
+        "mode": settings.MODE,
+        "upstreams": upstreams,
+        "http_pool": http_pool.stats(),
+        "cache": search_cache.stats(),
+        "refresh_ahead": refresh_ahead.stats() if refresh_ahead is not None else None,
+        "lookup_store": lookup_store.stats() if lookup_store is not None else None,
+        "sidecar": sidecar.stats() if sidecar is not None else None,
+        "event_loop": loop_watchdog.stats(),
+        "admission": admission.stats() if settings.ADMISSION_CONTROL else None
+    }
+
+@app.get("/ready")
+async def readiness_check():
+    # Unlike /health, says whether this worker should get traffic right now
+    report = startup.report()
+    return JSONResponse(report, status_code=200 if startup.ready else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    # Merged across uvicorn workers when METRICS_DIR is set
+    return PlainTextResponse(
+        await metrics.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 if __name__ == "__main__":
     import uvicorn
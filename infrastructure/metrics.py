@@ -0,0 +1,421 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from core.config import settings
+from infrastructure.sidecar_client import SidecarClient, SidecarUnavailable, sidecar
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._series[labels] = self._series.get(labels, 0.0) + amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "type": "counter",
+            "help": self.help,
+            "labelnames": self.labelnames,
+            "series": [[list(labels), value] for labels, value in self._series.items()],
+        }
+
+
+class Gauge:
+    """
+    Current value of something in this worker. Snapshots add a pid label,
+    so merging keeps one series per live worker instead of summing them.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str):
+        self._series[labels] = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        pid = str(os.getpid())
+        return {
+            "type": "gauge",
+            "help": self.help,
+            "labelnames": self.labelnames + ("pid",),
+            "series": [[list(labels) + [pid], value] for labels, value in self._series.items()],
+        }
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. observe() is a bisect and two additions, cheap
+    enough to stay on in production; buckets are made cumulative on render.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        # Per series: one count per bucket, one for +Inf, then the sum
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, *labels: str) -> "Timer":
+        return Timer(self, labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "type": "histogram",
+            "help": self.help,
+            "labelnames": self.labelnames,
+            "buckets": self.buckets,
+            "series": [[list(labels), list(values)] for labels, values in self._series.items()],
+        }
+
+
+class Timer:
+    """Context manager observing the elapsed time of its block"""
+
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class MetricsRegistry:
+    """
+    Metrics of one worker process. With METRICS_DIR set, every worker
+    periodically writes its snapshot to <dir>/<pid>.json and /metrics merges
+    all of them, so any worker can answer for the whole server. A file not
+    rewritten for three flush intervals belongs to a worker that is gone
+    and is deleted. With a sidecar, snapshots are pushed to it instead and
+    it does the merging.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        flush_interval: float = 5.0,
+        sidecar: Optional[SidecarClient] = None
+    ):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.sidecar = sidecar
+        self._metrics: Dict[str, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def stale_after(self) -> float:
+        return self.flush_interval * 3
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str]) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str]) -> Gauge:
+        return self._metrics.setdefault(name, Gauge(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help, labelnames, buckets))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    async def start(self):
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            # The directory may outlive the container: drop snapshots of workers from a previous run
+            await asyncio.to_thread(self._live_paths)
+        if self.directory or self.sidecar:
+            self._task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # A stopped worker no longer counts towards the merged metrics
+        if self.sidecar:
+            self.sidecar.notify("metrics.delete", str(os.getpid()))
+        if self.directory:
+            try:
+                os.remove(self._path())
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.error(f"Failed to remove metrics snapshot: {e}")
+
+    async def flush(self):
+        if self.sidecar:
+            try:
+                await self.sidecar.call("metrics.put", str(os.getpid()), self.snapshot())
+                return
+            except SidecarUnavailable:
+                pass
+        if self.directory:
+            await asyncio.to_thread(self._write, self.snapshot())
+
+    async def collect(self) -> Dict[str, Any]:
+        """This worker's metrics merged with the latest snapshots of the others"""
+        if self.sidecar:
+            try:
+                await self.sidecar.call("metrics.put", str(os.getpid()), self.snapshot())
+                return await self.sidecar.call("metrics.collect")
+            except SidecarUnavailable as e:
+                logging.error(f"Collecting metrics from the sidecar failed: {e}")
+        if not self.directory:
+            return self.snapshot()
+        await self.flush()
+        return await asyncio.to_thread(self._read_all)
+
+    async def render(self) -> str:
+        return render(await self.collect())
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Failed to write metrics snapshot: {e}")
+
+    def _path(self) -> str:
+        return os.path.join(self.directory, f"{os.getpid()}.json")
+
+    def _write(self, snapshot: Dict[str, Any]):
+        path = self._path()
+        with open(f"{path}.tmp", "w") as out:
+            json.dump(snapshot, out)
+        os.replace(f"{path}.tmp", path)
+
+    def _read_all(self) -> Dict[str, Any]:
+        snapshots = []
+        for path in self._live_paths():
+            try:
+                with open(path) as snapshot:
+                    snapshots.append(json.load(snapshot))
+            except (OSError, ValueError) as e:
+                logging.error(f"Skipping unreadable metrics snapshot {path}: {e}")
+        return merge(snapshots)
+
+    def _live_paths(self) -> List[str]:
+        """Snapshot files of running workers; the rest are deleted"""
+        cutoff = time.time() - self.stale_after
+        live = []
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    live.append(path)
+                else:
+                    os.remove(path)
+            except FileNotFoundError:
+                # Another worker removed it first
+                continue
+            except OSError as e:
+                logging.error(f"Failed to remove stale metrics snapshot {path}: {e}")
+        return live
+
+
+def merge(snapshots: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sum series with the same labels across worker snapshots"""
+    merged: Dict[str, Any] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "series": {}})
+            for labels, value in metric["series"]:
+                key = tuple(labels)
+                current = target["series"].get(key)
+                if current is None:
+                    target["series"][key] = value
+                elif metric["type"] == "histogram":
+                    target["series"][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target["series"][key] = current + value
+    for metric in merged.values():
+        metric["series"] = [[list(labels), value] for labels, value in metric["series"].items()]
+    return merged
+
+
+def render(snapshot: Dict[str, Any]) -> str:
+    """Prometheus text exposition format"""
+    lines = []
+    for name, metric in sorted(snapshot.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for labels, value in sorted(metric["series"]):
+            pairs = [f'{key}="{_escape(label)}"' for key, label in zip(metric["labelnames"], labels)]
+            if metric["type"] in ("counter", "gauge"):
+                lines.append(f"{name}{_labels(pairs)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric["buckets"]) + ["+Inf"], value[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(bound)
+                bucket_pairs = pairs + [f'le="{le}"']
+                lines.append(f"{name}_bucket{_labels(bucket_pairs)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(pairs)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(pairs)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def _labels(pairs: List[str]) -> str:
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class MetricsMiddleware:
+    """Times every HTTP request by handler and status, until the last body byte is sent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            endpoint = scope.get("endpoint")
+            handler = getattr(endpoint, "__name__", "not_found")
+            http_request_seconds.observe(time.perf_counter() - started, scope["method"], handler, status)
+
+
+metrics = MetricsRegistry(settings.METRICS_DIR or None, settings.METRICS_FLUSH_INTERVAL, sidecar)
+
+http_request_seconds = metrics.histogram(
+    "sfera_http_request_seconds",
+    "HTTP request duration including response serialization",
+    ("method", "handler", "status")
+)
+stage_seconds = metrics.histogram(
+    "sfera_stage_seconds",
+    "Duration of processing stages",
+    ("stage", "data_type", "status")
+)
+upstream_request_seconds = metrics.histogram(
+    "sfera_upstream_request_seconds",
+    "Duration of single upstream HTTP calls, retries counted separately",
+    ("upstream", "status")
+)
+scheduler_wait_seconds = metrics.histogram(
+    "sfera_scheduler_wait_seconds",
+    "Time spent queued for an upstream concurrency slot",
+    ("upstream", "lane")
+)
+upstream_retries = metrics.counter(
+    "sfera_upstream_retries_total",
+    "Upstream calls retried after a transient failure",
+    ("upstream",)
+)
+deduplicated_queries = metrics.counter(
+    "sfera_deduplicated_queries_total",
+    "Batch queries answered by the lookup of an equivalent query in the same batch",
+    ()
+)
+validator_fallbacks = metrics.counter(
+    "sfera_validator_fallbacks_total",
+    "Queries classified locally because Validator IS failed",
+    ("reason",)
+)
+hedged_requests = metrics.counter(
+    "sfera_hedged_requests_total",
+    "Hedged upstream calls by outcome: fired, won (the hedge answered first) or denied by the hedge budget",
+    ("upstream", "outcome")
+)
+cache_refreshes = metrics.counter(
+    "sfera_cache_refreshes_total",
+    "Background refreshes of hot cache entries: changed, unchanged, failed, or skipped at the concurrency cap",
+    ("namespace", "outcome")
+)
+response_bytes = metrics.counter(
+    "sfera_response_bytes_total",
+    "Response body bytes before (raw) and after (sent) compression",
+    ("encoding", "form")
+)
+event_loop_lag_seconds = metrics.histogram(
+    "sfera_event_loop_lag_seconds",
+    "How late the event loop ran the watchdog's timer",
+    ()
+)
+event_loop_stalls = metrics.counter(
+    "sfera_event_loop_stalls_total",
+    "Times the event loop was blocked for longer than LOOP_STALL_THRESHOLD",
+    ()
+)
+admission_limit = metrics.gauge(
+    "sfera_admission_limit",
+    "Concurrent lookups the worker admits right now, adapted to latency",
+    ()
+)
+admission_inflight = metrics.gauge(
+    "sfera_admission_inflight",
+    "Concurrent lookups admitted and still running",
+    ()
+)
+admission_queued_upstream = metrics.gauge(
+    "sfera_admission_queued_upstream_calls",
+    "Upstream calls waiting for a scheduler slot when admission last looked",
+    ()
+)
+admission_rejections = metrics.counter(
+    "sfera_admission_rejections_total",
+    "Requests shed with 503 because the admission limit was reached",
+    ("kind",)
+)
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+Frame = Tuple[str, str, int]
+
+
+class ProfilerBusy(RuntimeError):
+    """A profile is already running in this worker"""
+
+
+def _label(frame: Frame) -> str:
+    filename, name, _ = frame
+    return f"{os.path.basename(filename)}:{name}"
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread (the event loop's, by default) every
+    `interval` seconds from a background thread. Nothing is traced, so the
+    worker runs at full speed; samples whose innermost frame is the
+    selector are counted as idle, the rest show where the loop is busy.
+    """
+
+    def __init__(self, max_depth: int = 64):
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def profile(self, seconds: float, interval: float, thread_id: Optional[int] = None) -> Dict[str, Any]:
+        """Sample for `seconds` without blocking the loop; only one profile runs at a time"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        try:
+            target = thread_id if thread_id is not None else threading.get_ident()
+            stacks, elapsed = await asyncio.to_thread(self._sample, target, seconds, interval)
+        finally:
+            self._lock.release()
+        return self.report(stacks, elapsed, interval)
+
+    def _sample(self, thread_id: int, seconds: float, interval: float) -> Tuple[Counter, float]:
+        stacks: Counter = Counter()
+        started = time.monotonic()
+        deadline = started + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                break
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_name, frame.f_lineno))
+                frame = frame.f_back
+            stacks[tuple(reversed(stack))] += 1
+            time.sleep(interval)
+        return stacks, time.monotonic() - started
+
+    def report(self, stacks: Counter, elapsed: float, interval: float, top: int = 30) -> Dict[str, Any]:
+        """Sample counts by function (self: innermost frame, total: anywhere on the stack) and folded stacks"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        folded: Counter = Counter()
+        idle = 0
+        for stack, count in stacks.items():
+            if not stack:
+                continue
+            if os.path.basename(stack[-1][0]) == "selectors.py":
+                idle += count
+                continue
+            labels = [_label(frame) for frame in stack]
+            own[labels[-1]] += count
+            for label in set(labels):
+                total[label] += count
+            folded[";".join(labels)] += count
+        samples = sum(stacks.values())
+        return {
+            "seconds": round(elapsed, 3),
+            "interval": interval,
+            "samples": samples,
+            "idle_samples": idle,
+            "busy_ratio": round((samples - idle) / samples, 4) if samples else 0.0,
+            "top_self": [{"function": name, "samples": count} for name, count in own.most_common(top)],
+            "top_total": [{"function": name, "samples": count} for name, count in total.most_common(top)],
+            "folded": [f"{stack} {count}" for stack, count in folded.most_common()],
+        }
+
+
+def folded_text(report: Dict[str, Any]) -> str:
+    """The folded stacks as flamegraph.pl / speedscope input"""
+    return "\n".join(report["folded"]) + "\n"
+
+
+profiler = SamplingProfiler()
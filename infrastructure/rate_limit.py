@@ -0,0 +1,237 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional, Union
+from core.config import settings
+from core.request_context import DeadlineExceeded, within_deadline
+from infrastructure.sidecar_client import SidecarClient, SidecarUnavailable, sidecar
+
+
+class TokenBucket:
+    """Token bucket limiter; a rate of 0 disables limiting"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self.waited = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        if self.rate <= 0:
+            return
+        started = time.monotonic()
+        while True:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                self.waited += now - started
+                return
+            await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def reserve(self, tokens: float = 1.0, max_wait: Optional[float] = None) -> Optional[float]:
+        """
+        Take tokens now, going into debt if need be; returns how long the
+        caller must wait. When that would be over max_wait, nothing is taken
+        and None is returned, so the debt stays bounded.
+        """
+        if self.rate <= 0:
+            return 0.0
+        self._refill(time.monotonic())
+        wait = max(0.0, (tokens - self._tokens) / self.rate)
+        if max_wait is not None and wait > max_wait:
+            return None
+        self._tokens -= tokens
+        return wait
+
+    def refund(self, tokens: float = 1.0):
+        """Give back reserved tokens that were not used"""
+        if self.rate <= 0:
+            return
+        self._refill(time.monotonic())
+        self._tokens = min(self.burst, self._tokens + tokens)
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens only if they are available right now"""
+        if self.rate <= 0:
+            return True
+        self._refill(time.monotonic())
+        if self._tokens < tokens:
+            return False
+        self._tokens -= tokens
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill(time.monotonic())
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "tokens": round(self._tokens, 2),
+            "waited_seconds": round(self.waited, 3),
+        }
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """
+    Token bucket that backs off when the upstream throttles: a 429 halves the
+    rate (down to min_rate) and honours Retry-After, and each success adds
+    back a step until the configured rate is reached again.
+    """
+
+    def __init__(self, rate: float, min_rate: float, burst: Optional[float] = None):
+        super().__init__(rate, burst)
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate) if rate > 0 else min_rate
+        self.increase_step = max(rate / 20, 0.1)
+        self._blocked_until = 0.0
+        self.throttled = 0
+
+    async def acquire(self, tokens: float = 1.0):
+        delay = self._blocked_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await super().acquire(tokens)
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        if self._blocked_until > time.monotonic():
+            return False
+        return super().try_acquire(tokens)
+
+    def reserve(self, tokens: float = 1.0, max_wait: Optional[float] = None) -> Optional[float]:
+        blocked = self._blocked_until - time.monotonic()
+        if max_wait is not None and blocked > max_wait:
+            return None
+        wait = super().reserve(tokens, max_wait)
+        return None if wait is None else max(blocked, wait)
+
+    def on_throttled(self, retry_after: Optional[float] = None):
+        now = time.monotonic()
+        self.throttled += 1
+        if self.max_rate > 0:
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+        if retry_after:
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+
+    def on_success(self):
+        if 0 < self.rate < self.max_rate:
+            self._refill(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update({
+            "max_rate": self.max_rate,
+            "throttled": self.throttled,
+            "blocked_for": round(max(0.0, self._blocked_until - time.monotonic()), 3),
+        })
+        return stats
+
+
+class SharedRateLimiter:
+    """
+    An AdaptiveRateLimiter kept in the sidecar, so rate, throttling and
+    Retry-After hold for all workers of the host together. Tokens are
+    reserved with one call and waited for locally. A reservation is at most
+    max_wait ahead; past that the caller retries later, so the shared bucket
+    cannot be run into unbounded debt. Tokens of a caller that is cancelled,
+    or whose deadline would pass while waiting, are given back. While the
+    sidecar is unreachable, a local limiter with this worker's share of the
+    rate is used.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        client: SidecarClient,
+        rate: float,
+        min_rate: float,
+        workers: int = 1,
+        max_wait: float = settings.SIDECAR_LIMITER_MAX_WAIT
+    ):
+        self.name = name
+        self.client = client
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_wait = max_wait
+        workers = max(1, workers)
+        self.local = AdaptiveRateLimiter(rate / workers, min_rate / workers)
+        self.waited = 0.0
+        self.fallbacks = 0
+
+    async def acquire(self, tokens: float = 1.0):
+        if self.rate <= 0:
+            return
+        while True:
+            try:
+                delay = await self.client.call(
+                    "limiter.reserve", self.name, tokens, self.rate, self.min_rate, self.max_wait
+                )
+            except SidecarUnavailable:
+                self.fallbacks += 1
+                await self.local.acquire(tokens)
+                return
+            if delay is not None:
+                break
+            # The bucket is max_wait in debt already; come back once that is paid off
+            if not within_deadline(self.max_wait):
+                raise DeadlineExceeded("Request deadline exceeded waiting for a rate limit token")
+            self.waited += self.max_wait
+            await asyncio.sleep(self.max_wait)
+        if delay <= 0:
+            return
+        if not within_deadline(delay):
+            self.client.notify("limiter.refund", self.name, tokens, self.rate, self.min_rate)
+            raise DeadlineExceeded("Request deadline exceeded waiting for a rate limit token")
+        self.waited += delay
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.client.notify("limiter.refund", self.name, tokens, self.rate, self.min_rate)
+            raise
+
+    async def try_acquire(self, tokens: float = 1.0) -> bool:
+        if self.rate <= 0:
+            return True
+        try:
+            return await self.client.call("limiter.try_acquire", self.name, tokens, self.rate, self.min_rate)
+        except SidecarUnavailable:
+            self.fallbacks += 1
+            return self.local.try_acquire(tokens)
+
+    def on_throttled(self, retry_after: Optional[float] = None):
+        self.local.on_throttled(retry_after)
+        self.client.notify("limiter.throttled", self.name, self.rate, self.min_rate, retry_after)
+
+    def on_success(self):
+        self.local.on_success()
+        self.client.notify("limiter.success", self.name, self.rate, self.min_rate)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "shared": True,
+            "max_rate": self.rate,
+            "waited_seconds": round(self.waited, 3),
+            "fallbacks": self.fallbacks,
+            "local": self.local.stats(),
+        }
+
+
+def create_rate_limiter(
+    name: str, rate: float, min_rate: Optional[float] = None
+) -> Union[TokenBucket, SharedRateLimiter]:
+    """
+    Limiter for one upstream: shared by the workers through the sidecar when
+    SIDECAR_SOCKET is set, else per worker. Without min_rate it does not adapt to throttling.
+    """
+    adaptive = min_rate is not None
+    min_rate = min_rate if adaptive else rate
+    if sidecar is not None:
+        return SharedRateLimiter(name, sidecar, rate, min_rate, settings.WORKERS)
+    if adaptive:
+        return AdaptiveRateLimiter(rate, min_rate)
+    return TokenBucket(rate)
@@ -0,0 +1,108 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit for {name} is open, retry in {retry_in:.1f}s")
+        self.retry_in = retry_in
+
+
+class UpstreamError(Exception):
+    """A retryable upstream failure (429 or 5xx)"""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CircuitState:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls
+    until reset_timeout has passed; then lets half_open_max_calls probes
+    through and closes again on the first success.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._failures = 0
+        self._half_open_calls = 0
+        self._probe_started = 0.0
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == CircuitState.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = CircuitState.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def before_call(self):
+        state = self.state
+        now = time.monotonic()
+        if state == CircuitState.HALF_OPEN and now - self._probe_started >= self.reset_timeout:
+            # Probes that never reported back (e.g. cancelled) must not wedge the breaker
+            self._half_open_calls = 0
+        if state == CircuitState.OPEN or (
+            state == CircuitState.HALF_OPEN and self._half_open_calls >= self.half_open_max_calls
+        ):
+            self.rejected += 1
+            retry_in = max(0.0, self._opened_at + self.reset_timeout - now)
+            raise CircuitOpenError(self.name, retry_in)
+        if state == CircuitState.HALF_OPEN:
+            if self._half_open_calls == 0:
+                self._probe_started = now
+            self._half_open_calls += 1
+
+    def record_success(self):
+        self._failures = 0
+        self._state = CircuitState.CLOSED
+
+    def record_failure(self):
+        self._failures += 1
+        if self.state == CircuitState.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != CircuitState.OPEN:
+                self.opened += 1
+            self._state = CircuitState.OPEN
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (0-based)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
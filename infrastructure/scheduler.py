@@ -0,0 +1,127 @@
+import asyncio
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+from core.constants import Lanes
+from core.request_context import request_client, request_lane
+from infrastructure.metrics import scheduler_wait_seconds
+
+
+class PriorityScheduler:
+    """
+    Concurrency budget for one upstream, shared by two lanes. Interactive
+    requests may use the whole budget and are always admitted first; bulk
+    requests are capped at bulk_share of it. Within a lane, waiting clients
+    are served round-robin so one client's batch cannot hold up another's.
+    A capacity of 0 disables scheduling.
+    """
+
+    def __init__(self, name: str, capacity: int, bulk_share: float):
+        self.name = name
+        self.capacity = capacity
+        self.bulk_limit = max(1, int(capacity * bulk_share)) if capacity > 0 else 0
+        self._active = {Lanes.INTERACTIVE: 0, Lanes.BULK: 0}
+        self._waiting: Dict[str, "OrderedDict[str, Deque[asyncio.Future]]"] = {
+            Lanes.INTERACTIVE: OrderedDict(),
+            Lanes.BULK: OrderedDict(),
+        }
+        self.granted = Counter()
+        self.wait_seconds = Counter()
+
+    @asynccontextmanager
+    async def slot(self, lane: Optional[str] = None, client: Optional[str] = None) -> AsyncIterator[None]:
+        """Hold one unit of the budget; lane and client default to the current request's"""
+        if self.capacity <= 0:
+            yield
+            return
+        lane = lane or request_lane.get()
+        await self._acquire(lane, client or request_client.get())
+        try:
+            yield
+        finally:
+            self._active[lane] -= 1
+            self._dispatch()
+
+    async def _acquire(self, lane: str, client: str):
+        started = time.perf_counter()
+        if self._can_start(lane) and not self._queued_ahead(lane):
+            self._active[lane] += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._waiting[lane].setdefault(client, deque()).append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Granted just as it was cancelled; hand the slot on
+                    self._active[lane] -= 1
+                    self._dispatch()
+                else:
+                    self._forget(lane, client, future)
+                raise
+        waited = time.perf_counter() - started
+        self.granted[lane] += 1
+        self.wait_seconds[lane] += waited
+        scheduler_wait_seconds.observe(waited, self.name, lane)
+
+    def _can_start(self, lane: str) -> bool:
+        if self._active[Lanes.INTERACTIVE] + self._active[Lanes.BULK] >= self.capacity:
+            return False
+        return lane == Lanes.INTERACTIVE or self._active[Lanes.BULK] < self.bulk_limit
+
+    def _queued_ahead(self, lane: str) -> bool:
+        if lane == Lanes.INTERACTIVE:
+            return bool(self._waiting[Lanes.INTERACTIVE])
+        return any(self._waiting.values())
+
+    def _dispatch(self):
+        while True:
+            if self._waiting[Lanes.INTERACTIVE] and self._can_start(Lanes.INTERACTIVE):
+                lane = Lanes.INTERACTIVE
+            elif self._waiting[Lanes.BULK] and self._can_start(Lanes.BULK):
+                lane = Lanes.BULK
+            else:
+                return
+            # Serve the first waiting client, then move it to the back of the lane
+            clients = self._waiting[lane]
+            client, waiters = clients.popitem(last=False)
+            future = waiters.popleft()
+            if waiters:
+                clients[client] = waiters
+            if not future.done():
+                self._active[lane] += 1
+                future.set_result(None)
+
+    def _forget(self, lane: str, client: str, future: asyncio.Future):
+        waiters = self._waiting[lane].get(client)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(future)
+        except ValueError:
+            pass
+        if not waiters:
+            del self._waiting[lane][client]
+
+    @property
+    def waiting(self) -> int:
+        """Calls queued for a slot in either lane"""
+        return sum(len(waiters) for lane in self._waiting.values() for waiters in lane.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "bulk_limit": self.bulk_limit,
+            "lanes": {
+                lane: {
+                    "active": self._active[lane],
+                    "waiting": sum(len(waiters) for waiters in self._waiting[lane].values()),
+                    "waiting_clients": len(self._waiting[lane]),
+                    "granted": self.granted[lane],
+                    "mean_wait_ms": round(self.wait_seconds[lane] / self.granted[lane] * 1000, 3)
+                    if self.granted[lane] else 0.0,
+                }
+                for lane in (Lanes.INTERACTIVE, Lanes.BULK)
+            },
+        }
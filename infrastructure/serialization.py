@@ -0,0 +1,119 @@
+from typing import Any, List, Optional, Sequence, Tuple
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+from core.schemas.response import StandardResponse
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional binary encoding
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+NDJSON = "application/x-ndjson"
+# Names clients use for MessagePack, all served as MSGPACK
+_MSGPACK_ALIASES = {"application/x-msgpack", "application/vnd.msgpack"}
+
+_response = TypeAdapter(StandardResponse)
+_response_list = TypeAdapter(List[StandardResponse])
+
+
+def encode_response(response: StandardResponse) -> bytes:
+    return _response.dump_json(response)
+
+
+def encode_responses(responses: List[StandardResponse]) -> bytes:
+    """Encode a whole batch in one pydantic-core pass, nested SearchResult models included"""
+    return _response_list.dump_json(responses)
+
+
+def encode_msgpack(content: Any) -> bytes:
+    """MessagePack of a StandardResponse or a list of them, with the same shape as the JSON"""
+    adapter = _response_list if isinstance(content, list) else _response
+    return msgpack.packb(adapter.dump_python(content, mode="json"))
+
+
+def parse_qvalues(header: Optional[str]) -> List[Tuple[str, float]]:
+    """(value, q) pairs of an Accept or Accept-Encoding header, in header order"""
+    values = []
+    for part in (header or "").split(","):
+        value, _, params = part.partition(";")
+        value = value.strip().lower()
+        if not value:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, number = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        values.append((MSGPACK if value in _MSGPACK_ALIASES else value, q))
+    return values
+
+
+def preferred(header: Optional[str], offered: Sequence[str]) -> Optional[str]:
+    """
+    The offered value the header ranks highest; ties go to the earlier
+    offer. Exact matches beat type/* and * wildcards, q=0 refuses a value.
+    No header accepts the first offer, and None means nothing offered is acceptable.
+    """
+    if not header:
+        return offered[0] if offered else None
+    qvalues = parse_qvalues(header)
+    best, best_q = None, 0.0
+    for value in offered:
+        q = None
+        for candidate, candidate_q in qvalues:
+            if candidate == value:
+                q = candidate_q
+                break
+            if candidate == "*" or candidate == "*/*" or (
+                candidate.endswith("/*") and value.startswith(candidate[:-1])
+            ):
+                q = candidate_q if q is None else max(q, candidate_q)
+        if q is not None and q > best_q:
+            best, best_q = value, q
+    return best
+
+
+def response_type(request: Request) -> str:
+    """MSGPACK when the client's Accept prefers it and msgpack is installed, else JSON"""
+    offered = (JSON, MSGPACK) if msgpack is not None else (JSON,)
+    return preferred(request.headers.get("accept"), offered) or JSON
+
+
+class StandardJSONResponse(Response):
+    """
+    JSON response for StandardResponse models or lists of them. Returning it
+    from a route skips FastAPI's response_model re-validation and the
+    jsonable_encoder pass; response_model stays on the route for the docs.
+    """
+
+    media_type = JSON
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, list):
+            return encode_responses(content)
+        return encode_response(content)
+
+
+class StandardMsgPackResponse(Response):
+    """MessagePack counterpart of StandardJSONResponse"""
+
+    media_type = MSGPACK
+
+    def render(self, content: Any) -> bytes:
+        return encode_msgpack(content)
+
+
+def negotiated_response(request: Request, content: Any) -> Response:
+    """StandardJSONResponse or StandardMsgPackResponse, whichever the client's Accept prefers"""
+    if response_type(request) == MSGPACK:
+        response = StandardMsgPackResponse(content)
+    else:
+        response = StandardJSONResponse(content)
+    response.headers["Vary"] = "Accept"
+    return response
@@ -0,0 +1,181 @@
+"""
+State sidecar for multi-worker deployments. One process per host holds
+the lookup cache, the upstream rate limiters and the workers' metrics,
+and serves them over a Unix socket to every uvicorn worker:
+
+    python -m infrastructure.sidecar --socket /tmp/sfera-sidecar.sock
+
+Workers use it when SIDECAR_SOCKET points at the same path.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import os
+import signal
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from core.config import settings
+from infrastructure.cache import InMemoryCache
+from infrastructure.metrics import merge
+from infrastructure.rate_limit import AdaptiveRateLimiter
+from infrastructure.sidecar_client import LINE_LIMIT
+
+
+class SidecarServer:
+    """
+    Answers JSON-line requests {"id", "op", "args"} with {"id", "result"}
+    or {"id", "error"}; requests without an id get no answer. All state
+    lives in this one event loop, so operations need no locking. A worker's
+    metrics snapshot is dropped once it has not been renewed for
+    `metrics_stale_after` seconds.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        cache_size: int,
+        metrics_stale_after: float = settings.METRICS_FLUSH_INTERVAL * 3
+    ):
+        self.path = path
+        self.cache = InMemoryCache(cache_size)
+        self.limiters: Dict[str, AdaptiveRateLimiter] = {}
+        self.metrics_stale_after = metrics_stale_after
+        # worker -> (monotonic time received, snapshot)
+        self.snapshots: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self.connections = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: Dict[str, Callable[..., Any]] = {
+            "ping": lambda: "pong",
+            "stats": self.stats,
+            "cache.get": self.cache.get,
+            "cache.set": self.cache.set,
+            "cache.delete": self.cache.delete,
+            "limiter.reserve": self._reserve,
+            "limiter.try_acquire": self._try_acquire,
+            "limiter.throttled": self._throttled,
+            "limiter.success": self._success,
+            "limiter.refund": self._refund,
+            "metrics.put": self._put_metrics,
+            "metrics.delete": self._delete_metrics,
+            "metrics.collect": self._collect_metrics,
+        }
+
+    async def start(self):
+        # A socket file left by a previous sidecar would make the bind fail
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._server = await asyncio.start_unix_server(self._serve, path=self.path, limit=LINE_LIMIT)
+        logging.info(f"Sidecar listening on {self.path}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": self.connections,
+            "cache": self.cache.stats(),
+            "limiters": {name: limiter.stats() for name, limiter in self.limiters.items()},
+            "workers": sorted(self._live_snapshots()),
+        }
+
+    async def handle(self, op: str, args: List[Any]) -> Any:
+        result = self._handlers[op](*args)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                try:
+                    response = {"result": await self.handle(message["op"], message.get("args", []))}
+                except Exception as e:
+                    logging.error(f"Sidecar {message.get('op')} failed: {e}")
+                    response = {"error": f"{type(e).__name__}: {e}"}
+                if message.get("id") is not None:
+                    response["id"] = message["id"]
+                    writer.write(json.dumps(response, separators=(",", ":")).encode() + b"\n")
+        except (OSError, ValueError) as e:
+            logging.warning(f"Dropping sidecar connection: {e}")
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def _limiter(self, name: str, rate: float, min_rate: float) -> AdaptiveRateLimiter:
+        # Created by whichever worker asks first, with the rates every worker is configured with
+        limiter = self.limiters.get(name)
+        if limiter is None:
+            limiter = self.limiters[name] = AdaptiveRateLimiter(rate, min_rate)
+        return limiter
+
+    def _reserve(
+        self, name: str, tokens: float, rate: float, min_rate: float, max_wait: Optional[float] = None
+    ) -> Optional[float]:
+        return self._limiter(name, rate, min_rate).reserve(tokens, max_wait)
+
+    def _refund(self, name: str, tokens: float, rate: float, min_rate: float):
+        self._limiter(name, rate, min_rate).refund(tokens)
+
+    def _try_acquire(self, name: str, tokens: float, rate: float, min_rate: float) -> bool:
+        return self._limiter(name, rate, min_rate).try_acquire(tokens)
+
+    def _throttled(self, name: str, rate: float, min_rate: float, retry_after: Optional[float]):
+        self._limiter(name, rate, min_rate).on_throttled(retry_after)
+
+    def _success(self, name: str, rate: float, min_rate: float):
+        self._limiter(name, rate, min_rate).on_success()
+
+    def _put_metrics(self, worker: str, snapshot: Dict[str, Any]):
+        self.snapshots[worker] = (time.monotonic(), snapshot)
+
+    def _delete_metrics(self, worker: str):
+        self.snapshots.pop(worker, None)
+
+    def _collect_metrics(self) -> Dict[str, Any]:
+        return merge(self._live_snapshots().values())
+
+    def _live_snapshots(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshots of workers that still report; those of exited workers are evicted"""
+        cutoff = time.monotonic() - self.metrics_stale_after
+        for worker in [worker for worker, (received, _) in self.snapshots.items() if received < cutoff]:
+            del self.snapshots[worker]
+        return {worker: snapshot for worker, (_, snapshot) in self.snapshots.items()}
+
+
+async def serve(path: str, cache_size: int):
+    server = SidecarServer(path, cache_size)
+    await server.start()
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopped.set)
+    await stopped.wait()
+    await server.stop()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=settings.SIDECAR_SOCKET or "/tmp/sfera-sidecar.sock")
+    parser.add_argument("--cache-size", type=int, default=settings.CACHE_MAX_SIZE)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(args.socket, args.cache_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+from core.config import settings
+
+# Metrics snapshots of every worker travel in a single line
+LINE_LIMIT = 16 * 1024 * 1024
+
+
+class SidecarUnavailable(Exception):
+    """The sidecar could not be reached, did not answer in time or failed the call"""
+
+
+class SidecarClient:
+    """
+    One worker's connection to the state sidecar (infrastructure.sidecar).
+    Calls are JSON lines tagged with an id, so any number can be in flight
+    on the one connection. While the sidecar is unreachable calls fail fast
+    with SidecarUnavailable, and callers fall back to worker-local state;
+    reconnecting is retried every retry_interval seconds.
+    """
+
+    def __init__(self, path: str, timeout: float = 0.5, retry_interval: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._connecting: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._retry_at = 0.0
+        self.calls = 0
+        self.failures = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def call(self, op: str, *args: Any) -> Any:
+        await self._ensure_connected()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self.calls += 1
+        try:
+            self._send({"id": request_id, "op": op, "args": args})
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.failures += 1
+            raise SidecarUnavailable(f"Sidecar did not answer {op} within {self.timeout}s")
+        finally:
+            self._pending.pop(request_id, None)
+
+    def notify(self, op: str, *args: Any) -> bool:
+        """Send without waiting for an answer; dropped while disconnected"""
+        if not self.connected or self._loop is not asyncio.get_running_loop():
+            return False
+        self._send({"op": op, "args": args})
+        return True
+
+    async def close(self):
+        if self._read_task is not None:
+            self._read_task.cancel()
+            await asyncio.gather(self._read_task, return_exceptions=True)
+            self._read_task = None
+        self._disconnect()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "socket": self.path,
+            "connected": self.connected,
+            "calls": self.calls,
+            "failures": self.failures,
+            "in_flight": len(self._pending),
+        }
+
+    def _send(self, message: Dict[str, Any]):
+        if not self.connected:
+            raise SidecarUnavailable("Sidecar connection lost")
+        self._writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+    async def _ensure_connected(self):
+        loop = asyncio.get_running_loop()
+        if self.connected and self._loop is loop:
+            return
+        if time.monotonic() < self._retry_at:
+            raise SidecarUnavailable(f"Sidecar at {self.path} is unavailable")
+        # Concurrent callers share one connection attempt
+        if self._connecting is None or self._connecting.get_loop() is not loop:
+            self._connecting = loop.create_task(self._connect())
+        connecting = self._connecting
+        try:
+            await asyncio.shield(connecting)
+        finally:
+            if connecting.done() and self._connecting is connecting:
+                self._connecting = None
+
+    async def _connect(self):
+        self._disconnect()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_unix_connection(self.path, limit=LINE_LIMIT), self.timeout
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            self.failures += 1
+            self._retry_at = time.monotonic() + self.retry_interval
+            logging.warning(f"Sidecar at {self.path} unavailable, using local state: {e}")
+            raise SidecarUnavailable(f"Sidecar at {self.path} is unavailable: {e}") from e
+        self._reader, self._writer = reader, writer
+        self._loop = asyncio.get_running_loop()
+        self._read_task = self._loop.create_task(self._read_responses(reader))
+
+    async def _read_responses(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                future = self._pending.get(message.get("id"))
+                if future is None or future.done():
+                    continue
+                if "error" in message:
+                    future.set_exception(SidecarUnavailable(f"Sidecar call failed: {message['error']}"))
+                else:
+                    future.set_result(message.get("result"))
+        except (OSError, ValueError) as e:
+            logging.warning(f"Sidecar connection failed: {e}")
+        finally:
+            if self._reader is reader:
+                self._disconnect()
+
+    def _disconnect(self):
+        # The connection may belong to an event loop that is already closed
+        try:
+            if self._writer is not None:
+                self._writer.close()
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(SidecarUnavailable("Sidecar connection lost"))
+        except RuntimeError:
+            pass
+        self._reader = self._writer = None
+        self._pending.clear()
+
+
+def create_sidecar_client(path: Optional[str] = None) -> Optional[SidecarClient]:
+    path = settings.SIDECAR_SOCKET if path is None else path
+    if not path:
+        return None
+    return SidecarClient(path, settings.SIDECAR_TIMEOUT, settings.SIDECAR_RETRY_INTERVAL)
+
+
+sidecar = create_sidecar_client()
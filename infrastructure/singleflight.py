@@ -0,0 +1,46 @@
+import asyncio
+from contextvars import Context
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+from core.request_context import join_lane, shared_context, wait_shared
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls that share a key into one in-flight task.
+    The task belongs to no single caller: it runs without a deadline, in
+    the interactive lane once any interactive caller waits on it, and each
+    caller stops waiting at its own deadline.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Tuple[asyncio.Task, Context]] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        loop = asyncio.get_running_loop()
+        task, context = self._calls.get(key, (None, None))
+        if task is not None and task.get_loop() is loop and not task.done():
+            self.coalesced += 1
+            join_lane(context)
+        else:
+            # The call runs as its own task so a cancelled caller
+            # does not cancel the result other callers are waiting for
+            context = shared_context()
+            task = loop.create_task(fn(), context=context)
+            self._calls[key] = (task, context)
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.calls += 1
+        return await wait_shared(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key, (None,))[0] is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every caller went away
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
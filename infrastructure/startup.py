@@ -0,0 +1,128 @@
+"""
+Startup profiling. In a running worker, `startup` records how long the app
+took to import and how long each lifespan step took; /ready reports it.
+Run as a module, it profiles the cold import of the app in a fresh interpreter:
+
+    python -m infrastructure.startup --fast --top 15
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StartupProfile:
+    """Timings of one worker's startup, from the first app import until ready"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.steps: List[Tuple[str, float]] = []
+        self.ready_at: Optional[float] = None
+        self.draining = False
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None and not self.draining
+
+    def mark(self, name: str):
+        """Record a step that ran from the end of the previous one until now"""
+        previous = self.started + sum(seconds for _, seconds in self.steps)
+        self.steps.append((name, time.perf_counter() - previous))
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - started))
+
+    def mark_ready(self):
+        self.ready_at = time.perf_counter()
+        self.draining = False
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "draining": self.draining,
+            "ready_after_ms": round((self.ready_at - self.started) * 1000, 2) if self.ready_at else None,
+            "steps_ms": {name: round(seconds * 1000, 2) for name, seconds in self.steps},
+        }
+
+
+startup = StartupProfile()
+
+
+def parse_importtime(output: str) -> List[Dict[str, Any]]:
+    """Modules with their self and cumulative import time from python -X importtime"""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append({
+            "module": name.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    return modules
+
+
+def profile_import(module: str = "infrastructure.main", env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Cold import of module in a fresh interpreter: wall time plus the -X importtime breakdown"""
+    code = (
+        "import time; started = time.perf_counter(); "
+        f"import {module}; "
+        "print(time.perf_counter() - started)"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        env={**os.environ, "PYTHONPATH": ROOT, **(env or {})},
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return {
+        "module": module,
+        "import_seconds": float(completed.stdout.strip().splitlines()[-1]),
+        "modules": parse_importtime(completed.stderr),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="infrastructure.main")
+    parser.add_argument("--fast", action="store_true", help="profile with FAST_START=true")
+    parser.add_argument("--top", type=int, default=20, help="slowest modules to list")
+    args = parser.parse_args(argv)
+
+    profile = profile_import(args.module, {"FAST_START": "true"} if args.fast else None)
+    modules = profile["modules"]
+    # Top-level packages show where the time goes; single modules show what to defer
+    packages: Dict[str, float] = {}
+    for entry in modules:
+        package = entry["module"].split(".")[0]
+        packages[package] = packages.get(package, 0.0) + entry["self_ms"]
+    report = {
+        "module": profile["module"],
+        "fast_start": args.fast,
+        "import_ms": round(profile["import_seconds"] * 1000, 2),
+        "modules_imported": len(modules),
+        "packages_ms": {
+            name: round(ms, 2) for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:args.top]
+        },
+        "slowest_modules": sorted(modules, key=lambda entry: -entry["self_ms"])[:args.top],
+    }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import asyncio
+import codecs
+import json
+from functools import partial
+from typing import Any, AsyncIterator, List, Optional, Tuple
+import anyio
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+_decoder = json.JSONDecoder()
+_SEPARATORS = " \t\r\n,"
+
+
+def _as_query(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict) and isinstance(value.get("query"), str):
+        return value["query"]
+    raise ValueError(f"Expected a string or {{\"query\": ...}} object, got {type(value).__name__}")
+
+
+def _line_query(line: str) -> Optional[str]:
+    line = line.strip()
+    if not line:
+        return None
+    if line[0] in "\"{":
+        return _as_query(json.loads(line))
+    # Bare lines are taken as-is so plain text uploads work too
+    return line
+
+
+def _consume_array(buffer: str, final: bool) -> Tuple[List[str], str, bool]:
+    """Decode every complete array element in buffer; returns (queries, rest, closed)"""
+    queries = []
+    pos = 0
+    length = len(buffer)
+    while True:
+        while pos < length and buffer[pos] in _SEPARATORS:
+            pos += 1
+        if pos == length:
+            return queries, "", False
+        if buffer[pos] == "]":
+            return queries, buffer[pos + 1:], True
+        try:
+            value, end = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return queries, buffer[pos:], False
+        if end == length and not final and not isinstance(value, (str, dict, list)):
+            # A scalar at the very end of the buffer may still be incomplete
+            return queries, buffer[pos:], False
+        queries.append(_as_query(value))
+        pos = end
+
+
+async def iter_queries(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Incrementally parse queries from a request body that is either a JSON
+    array or NDJSON (one JSON string, {"query": ...} object or bare line per line).
+    Only the unparsed tail of the body is kept in memory.
+    """
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    mode = None
+    closed = False
+
+    async for chunk in chunks:
+        buffer += text.decode(chunk)
+        if mode is None:
+            buffer = buffer.lstrip()
+            if not buffer:
+                continue
+            if buffer[0] == "[":
+                mode, buffer = "array", buffer[1:]
+            else:
+                mode = "ndjson"
+
+        if mode == "ndjson":
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                query = _line_query(line)
+                if query is not None:
+                    yield query
+        elif not closed:
+            queries, buffer, closed = _consume_array(buffer, final=False)
+            for query in queries:
+                yield query
+
+    buffer += text.decode(b"", final=True)
+    if mode == "ndjson":
+        query = _line_query(buffer)
+        if query is not None:
+            yield query
+    elif mode == "array" and not closed:
+        queries, buffer, closed = _consume_array(buffer, final=True)
+        for query in queries:
+            yield query
+        if not closed:
+            raise ValueError("Unterminated JSON array")
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body iterator is still reading the request body.
+    The stock response listens for disconnect on the same receive channel and
+    would swallow request chunks, so listening starts only after body_read is set.
+    """
+
+    def __init__(self, content: AsyncIterator[bytes], body_read: asyncio.Event, **kwargs):
+        super().__init__(content, **kwargs)
+        self.body_read = body_read
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        async with anyio.create_task_group() as task_group:
+
+            async def wrap(func) -> None:
+                await func()
+                task_group.cancel_scope.cancel()
+
+            task_group.start_soon(wrap, partial(self.stream_response, send))
+            await self.body_read.wait()
+            await wrap(partial(self.listen_for_disconnect, receive))
+
+        if self.background is not None:
+            await self.background()
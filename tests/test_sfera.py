@@ -1,5 +1,6 @@
 import pytest
 import asyncio
+import time
 from unittest.mock import AsyncMock, patch, MagicMock
 from fastapi.testclient import TestClient
 
@@ -399,6 +400,2087 @@ class TestErrorScenarios:
                 assert "error" in data[1]["body"]
 
 
+class TestConcurrentProcessing:
+    """Test bounded concurrent fan-out in /common/process"""
+
+    def setup_method(self):
+        self.client = TestClient(app)
+
+    @staticmethod
+    def _validated(queries, data_type="phone"):
+        return [
+            {"body": {"type": data_type, "clean_data": query}, "extra": {}}
+            for query in queries
+        ]
+
+    def test_results_keep_input_order(self):
+        """Test results come back in input order regardless of completion order"""
+        queries = ["79310000001", "79310000002", "79310000003"]
+
+        async def fake_search(phone):
+            await asyncio.sleep(0.05 if phone == "79310000001" else 0)
+            return [SearchResult(first_name=phone)]
+
+        with patch('controllers.common_controller.validator_client.validate_queries') as mock_validate, \
+                patch('controllers.common_controller.domclick_service.search', side_effect=fake_search):
+            mock_validate.return_value = self._validated(queries)
+            response = self.client.post("/api/v1/common/process", json={"queries": queries})
+
+        assert response.status_code == 200
+        assert [item["body"]["results"][0]["first_name"] for item in response.json()] == queries
+        mock_validate.assert_called_once_with(queries)
+
+    def test_slow_query_times_out_alone(self):
+        """Test one slow query times out without failing the batch"""
+        async def fake_search(phone):
+            if phone == "79310000001":
+                await asyncio.sleep(1)
+            return [SearchResult(first_name=phone)]
+
+        with patch('controllers.common_controller.validator_client.validate_queries') as mock_validate, \
+                patch('controllers.common_controller.domclick_service.search', side_effect=fake_search), \
+                patch('controllers.common_controller.settings.QUERY_TIMEOUT', 0.1):
+            mock_validate.return_value = self._validated(["79310000001", "79310000002"])
+            response = self.client.post(
+                "/api/v1/common/process",
+                json={"queries": ["79310000001", "79310000002"]}
+            )
+
+        data = response.json()
+        assert response.status_code == 200
+        assert "timed out" in data[0]["body"]["error"]
+        assert data[1]["body"]["results"][0]["first_name"] == "79310000002"
+
+
+class TestValidatorBatching:
+    """Test chunked batch validation"""
+
+    @pytest.mark.asyncio
+    async def test_large_input_is_chunked_and_reassembled(self):
+        """Test inputs above batch_size are split and mapped back in order"""
+        client = ValidatorClient(endpoint="http://test-validator", batch_size=2)
+        queries = ["79310000001", "a@b.ru", "79310000003", "x", "79310000005"]
+        chunks = []
+
+        async def fake_chunk(chunk):
+            chunks.append(chunk)
+            return client._fallback_validation(chunk)
+
+        with patch.object(client, '_validate_chunk', side_effect=fake_chunk):
+            results = await client.validate_queries(queries)
+
+        assert sorted(len(chunk) for chunk in chunks) == [1, 2, 2]
+        assert [item.body["request_data"] for item in results] == queries
+
+
+class TestHttpSessionPool:
+    """Test app-scoped pooled HTTP sessions"""
+
+    @pytest.mark.asyncio
+    async def test_session_is_reused_per_upstream(self):
+        """Test the same session is returned until the pool is closed"""
+        from infrastructure.external.http_pool import HttpSessionPool
+
+        pool = HttpSessionPool()
+        session = pool.get_session("domclick")
+
+        assert pool.get_session("domclick") is session
+        assert pool.get_session("validator") is not session
+        assert pool.stats()["domclick"]["in_use"] == 0
+
+        await pool.close()
+        assert session.closed
+        assert pool.stats() == {}
+
+    def test_session_from_finished_loop_is_closed_when_replaced(self):
+        """Test a session left behind by a finished event loop is closed, not leaked"""
+        from infrastructure.external.http_pool import HttpSessionPool
+
+        pool = HttpSessionPool()
+
+        async def get():
+            return pool.get_session("domclick")
+
+        first = asyncio.run(get())
+        second = asyncio.run(get())
+
+        assert second is not first
+        assert first.closed
+        assert not second.closed
+        asyncio.run(pool.close())
+        assert second.closed
+
+    def test_lifespan_opens_and_closes_pool(self):
+        """Test the app lifespan manages the pool and /health reports it"""
+        from infrastructure.external.http_pool import http_pool
+
+        with patch('controllers.jobs_controller.job_runner.workers', 0), TestClient(app) as client:
+            data = client.get("/health").json()
+            assert set(data["http_pool"]) == {"domclick", "validator"}
+
+        assert http_pool.stats() == {}
+
+
+class TestSearchCache:
+    """Test the TTL + LRU cache in front of search services"""
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction_and_counters(self):
+        """Test least recently used entries are evicted past max_size"""
+        from infrastructure.cache import InMemoryCache
+
+        cache = InMemoryCache(max_size=2)
+        await cache.set("a", 1, ttl=60)
+        await cache.set("b", 2, ttl=60)
+        assert await cache.get("a") == 1
+        await cache.set("c", 3, ttl=60)
+
+        assert await cache.get("b") is None
+        assert await cache.get("a") == 1
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 1, 1)
+
+    @pytest.mark.asyncio
+    async def test_expired_entry_is_a_miss(self):
+        """Test entries are dropped once their TTL passes"""
+        from infrastructure.cache import InMemoryCache
+
+        cache = InMemoryCache(max_size=10)
+        with patch('infrastructure.cache.time.monotonic', return_value=100.0):
+            await cache.set("a", 1, ttl=5)
+        with patch('infrastructure.cache.time.monotonic', return_value=106.0):
+            assert await cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+
+    @pytest.mark.asyncio
+    async def test_cached_service_hits_and_negative_ttl(self):
+        """Test repeated lookups are served from cache and empty results use negative TTL"""
+        from infrastructure.cache import InMemoryCache
+        from domain.services.cached_search_service import CachedSearchService
+
+        inner = DomClickService()
+        cache = InMemoryCache(max_size=10)
+        service = CachedSearchService(inner, cache, "test", ttl=60, negative_ttl=5)
+        found = [SearchResult(first_name="Иван", user_id=1)]
+
+        with patch.object(inner, 'fetch', side_effect=[found, []]) as mock_fetch, \
+                patch.object(cache, 'set', wraps=cache.set) as mock_set:
+            assert await service.search("79319999999") == found
+            assert await service.search("79319999999") == found
+            assert await service.search("79310000000") == []
+
+        assert mock_fetch.call_count == 2
+        assert [call.args[2] for call in mock_set.call_args_list] == [60, 5]
+
+    @pytest.mark.asyncio
+    async def test_upstream_errors_are_not_cached(self):
+        """Test failed lookups propagate without populating the cache"""
+        from infrastructure.cache import InMemoryCache
+        from domain.services.cached_search_service import CachedSearchService
+
+        inner = DomClickService()
+        service = CachedSearchService(inner, InMemoryCache(max_size=10), "test")
+
+        with patch.object(inner, 'fetch', side_effect=Exception("API error")) as mock_fetch:
+            for _ in range(2):
+                with pytest.raises(Exception, match="API error"):
+                    await service.search("79319999999")
+
+        assert mock_fetch.call_count == 2
+
+
+class TestRequestCoalescing:
+    """Test single-flight deduplication of concurrent identical lookups"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_phone_lookups_share_one_call(self):
+        """Test concurrent misses for one phone make a single upstream call"""
+        from infrastructure.cache import InMemoryCache
+        from domain.services.cached_search_service import CachedSearchService
+
+        inner = DomClickService()
+        service = CachedSearchService(inner, InMemoryCache(max_size=10), "test")
+        found = [SearchResult(first_name="Иван", user_id=1)]
+
+        async def slow_fetch(phone):
+            await asyncio.sleep(0.05)
+            return found
+
+        with patch.object(inner, 'fetch', side_effect=slow_fetch) as mock_fetch:
+            results = await asyncio.gather(*(service.search("79319999999") for _ in range(5)))
+
+        assert mock_fetch.call_count == 1
+        assert all(result == found for result in results)
+        assert service.inflight.coalesced == 4
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_shared_call(self):
+        """Test the shared call survives the cancellation of its first caller"""
+        from infrastructure.singleflight import SingleFlight
+
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        first = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        assert await second == "done"
+        assert flight.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_shared_call_outlives_the_first_callers_deadline(self):
+        """Test a coalesced call runs without the first caller's deadline and lane"""
+        from core.constants import Lanes
+        from core.request_context import (
+            DeadlineExceeded, bind_request, remaining, request_deadline, request_lane, set_deadline
+        )
+        from infrastructure.singleflight import SingleFlight
+
+        flight = SingleFlight()
+        seen = []
+
+        async def work():
+            seen.append(request_deadline.get())
+            await asyncio.sleep(0.1)
+            seen.append(request_lane.get())
+            return remaining(1.0)
+
+        async def hurried():
+            set_deadline(0.02)
+            bind_request(Lanes.BULK, "batch")
+            return await flight.do("key", work)
+
+        async def patient():
+            bind_request(Lanes.INTERACTIVE, "user")
+            return await flight.do("key", work)
+
+        first = asyncio.ensure_future(hurried())
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(patient())
+        results = await asyncio.gather(first, second, return_exceptions=True)
+
+        assert isinstance(results[0], DeadlineExceeded)
+        assert results[1] == 1.0
+        assert seen == [None, Lanes.INTERACTIVE]
+        assert flight.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_coalesced_validation_ignores_the_first_callers_deadline(self):
+        """Test a short-deadline caller falls back locally while a patient one gets Validator IS results"""
+        from core.request_context import remaining, set_deadline
+
+        client = ValidatorClient(endpoint="http://test-validator")
+
+        async def fake_chunk(chunk):
+            timeout = remaining(1.0)
+            await asyncio.sleep(0.1)
+            return [item.model_copy(update={"extra": {"timeout": timeout}}) for item in client._fallback_validation(chunk)]
+
+        async def hurried():
+            set_deadline(0.02)
+            return await client.validate_queries(["79319999999"])
+
+        with patch.object(client, '_validate_chunk', side_effect=fake_chunk) as mock_chunk:
+            first = asyncio.ensure_future(hurried())
+            await asyncio.sleep(0)
+            second = await client.validate_queries(["79319999999"])
+            first = await first
+
+        assert mock_chunk.call_count == 1
+        assert first[0].extra == {"fallback": True}
+        assert second[0].extra == {"timeout": 1.0}
+
+    @pytest.mark.asyncio
+    async def test_identical_validator_queries_are_sent_once(self):
+        """Test duplicates within and across concurrent batches are classified once"""
+        client = ValidatorClient(endpoint="http://test-validator")
+        sent = []
+
+        async def fake_chunk(chunk):
+            sent.extend(chunk)
+            await asyncio.sleep(0.05)
+            return client._fallback_validation(chunk)
+
+        with patch.object(client, '_validate_chunk', side_effect=fake_chunk):
+            first, second = await asyncio.gather(
+                client.validate_queries(["79319999999", "a@b.ru", "79319999999"]),
+                client.validate_queries(["a@b.ru", "79310000000"]),
+            )
+
+        assert sorted(sent) == ["79310000000", "79319999999", "a@b.ru"]
+        assert [item.body["type"] for item in first] == ["phone", "email", "phone"]
+        assert [item.body["request_data"] for item in second] == ["a@b.ru", "79310000000"]
+
+
+class TestLocalClassifier:
+    """Test the local classification engine"""
+
+    @pytest.mark.parametrize("query,data_type,clean_data", [
+        ("+7 931 999-99-99", "phone", "79319999999"),
+        ("89319999999", "phone", "79319999999"),
+        ("112-233-445 95", "snils", "11223344595"),
+        ("7707083893", "inn", "7707083893"),
+        ("500100732259", "inn", "500100732259"),
+        ("1027700132195", "ogrn", "1027700132195"),
+        ("4111 1111 1111 1111", "bank_card", "4111111111111111"),
+        ("044525225", "bic", "044525225"),
+        ("1HGCM82633A004352", "vin", "1HGCM82633A004352"),
+        ("a123bc777", "car_plate", "А123ВС777"),
+        ("192.168.0.1", "ipv4", "192.168.0.1"),
+        ("2001:db8::1", "ipv6", "2001:db8::1"),
+        ("00-1a-2b-3c-4d-5e", "mac", "00:1A:2B:3C:4D:5E"),
+        ("Example.com", "domain", "example.com"),
+        ("31.12.2024", "date", "2024-12-31"),
+        ("4509 123456", "passport_rf", "4509123456"),
+    ])
+    def test_classify_known_types(self, query, data_type, clean_data):
+        """Test each supported type is recognised and cleaned"""
+        from domain.services.classifier import classify_one
+
+        result = classify_one(query)
+        assert (result.data_type, result.clean_data) == (data_type, clean_data)
+        assert not result.ambiguous
+
+    def test_checksum_failures_are_rejected(self):
+        """Test inputs with the right shape but a bad checksum stay unknown"""
+        from domain.services.classifier import classify
+
+        results = classify(["7707083894", "4111111111111112", "1027700132196"])
+        assert [result.data_type for result in results] == ["unknown", "unknown", "unknown"]
+
+    def test_phone_shaped_snils_is_ambiguous(self):
+        """Test an input valid as both phone and SNILS is flagged ambiguous"""
+        from domain.services.classifier import classify_one, is_valid_snils
+
+        query = next(
+            f"7{n:08d}{c:02d}" for n in range(1000, 100000) for c in range(100)
+            if is_valid_snils(f"7{n:08d}{c:02d}")
+        )
+        result = classify_one(query)
+        assert result.data_type == "phone"
+        assert result.ambiguous
+
+    @pytest.mark.parametrize("query", ["²²²²²²²²²²²", "٧٩٣١٩٩٩٩٩٩٩", "٠٤٤٥٢٥٢٢٥", "١٩٢.١٦٨.٠.١", "٣١.١٢.٢٠٢٤"])
+    def test_non_ascii_digits_are_unknown(self, query):
+        """Test superscript and Arabic-Indic digits are not read as numbers"""
+        from domain.services.classifier import classify_one
+
+        assert classify_one(query).data_type == "unknown"
+
+    def test_validator_outage_with_non_ascii_digits(self):
+        """Test one unreadable query does not fail a batch classified locally"""
+        with patch('aiohttp.ClientSession.post', side_effect=Exception("Connection refused")), \
+                patch('controllers.common_controller.domclick_service.search', return_value=[]):
+            response = TestClient(app).post(
+                "/api/v1/common/process", json={"queries": ["79319999999", "²²²²²²²²²²²"]}
+            )
+
+        assert response.status_code == 200
+        assert [item["extra"]["data_type"] for item in response.json()] == ["phone", "unknown"]
+
+    @pytest.mark.asyncio
+    async def test_local_first_skips_validator_for_unambiguous_inputs(self):
+        """Test local-first mode only sends ambiguous inputs to Validator IS"""
+        client = ValidatorClient(endpoint="http://test-validator", local_first=True)
+        sent = []
+
+        async def fake_remote(queries):
+            sent.extend(queries)
+            return client._fallback_validation(queries)
+
+        with patch.object(client, '_validate_remote', side_effect=fake_remote):
+            results = await client.validate_queries(["79319999999", "Иванов Иван", "a@b.ru"])
+
+        assert sent == ["Иванов Иван"]
+        assert [item.body["type"] for item in results] == ["phone", "unknown", "email"]
+        assert results[0].extra == {"local": True}
+
+
+class TestStreamingProcessing:
+    """Test the streaming NDJSON variant of /common/process"""
+
+    @staticmethod
+    async def _collect(*chunks):
+        from infrastructure.streaming import iter_queries
+
+        async def source():
+            for chunk in chunks:
+                yield chunk
+
+        return [query async for query in iter_queries(source())]
+
+    @pytest.mark.asyncio
+    async def test_json_array_split_across_chunks(self):
+        """Test array elements split mid-token across chunks are reassembled"""
+        queries = await self._collect(b' ["7931', b'9999999", {"query": "a@', 'b.ru"}, "Ж'.encode()[:-1],
+                                      'Ж"]'.encode()[1:])
+        assert queries == ["79319999999", "a@b.ru", "Ж"]
+
+    @pytest.mark.asyncio
+    async def test_ndjson_lines(self):
+        """Test NDJSON accepts JSON strings, objects and bare lines"""
+        queries = await self._collect(b'"79319999999"\n{"query": "a@b', b'.ru"}\n\nplain text')
+        assert queries == ["79319999999", "a@b.ru", "plain text"]
+
+    @pytest.mark.asyncio
+    async def test_unterminated_array_is_rejected(self):
+        """Test a truncated JSON array raises after yielding complete items"""
+        with pytest.raises(ValueError):
+            await self._collect(b'["79319999999", "a@b')
+
+    def test_stream_endpoint_emits_indexed_lines(self):
+        """Test every query produces one NDJSON line tagged with its input index"""
+        import json
+
+        client = TestClient(app)
+        body = b'"79319999999"\n"a@b.ru"\n"random_text"\n'
+        with patch('controllers.common_controller.validator_client.validate_queries',
+                   side_effect=lambda queries: ValidatorClient()._fallback_validation(queries)):
+            response = client.post(
+                "/api/v1/common/process/stream",
+                content=body,
+                headers={"Content-Type": "application/x-ndjson"}
+            )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        by_index = {line["extra"]["index"]: line for line in lines}
+        assert sorted(by_index) == [0, 1, 2]
+        assert by_index[1]["body"]["error"] == "Unsupported data type: email"
+
+
+class TestBulkJobs:
+    """Test the bulk job queue"""
+
+    @staticmethod
+    def _runner(tmp_path, **kwargs):
+        from core.schemas.response import StandardResponse
+        from domain.services.job_runner import JobRunner
+        from infrastructure.job_store import JobStore
+
+        async def classify(queries):
+            return ValidatorClient()._fallback_validation(queries)
+
+        async def process(query, item):
+            if item.body["type"] != "phone":
+                return StandardResponse(headers={"sender": "common-controller"}, body={"error": "Unsupported"})
+            return StandardResponse(headers={"sender": "domclick-service"}, body={"results": [], "query": query})
+
+        options = dict(
+            store=JobStore(str(tmp_path / "jobs.sqlite3")),
+            classify=classify,
+            process=process,
+            upstreams_for=lambda item: ["domclick"] if item.body["type"] == "phone" else [],
+            rate_limits={},
+            classify_upstream="validator",
+            workers=1,
+            chunk_size=2,
+            query_concurrency=2,
+        )
+        options.update(kwargs)
+        return JobRunner(**options)
+
+    @pytest.mark.asyncio
+    async def test_job_runs_to_completion_in_chunks(self, tmp_path):
+        """Test a job is processed chunk by chunk and results page in input order"""
+        runner = self._runner(tmp_path)
+        job_id = await runner.submit(["79310000001", "a@b.ru", "79310000003"])
+
+        assert runner.store.claim_next_job() == job_id
+        await runner.run_job(job_id)
+
+        job = await runner.job_status(job_id)
+        assert (job["status"], job["processed"], job["failed"], job["progress"]) == ("completed", 3, 1, 1.0)
+        rows = await runner.get_results(job_id, offset=1, limit=5)
+        assert [(idx, query) for idx, query, _ in rows] == [(1, "a@b.ru"), (2, "79310000003")]
+
+    @pytest.mark.asyncio
+    async def test_rate_limits_apply_per_upstream(self, tmp_path):
+        """Test each phone query takes a DomClick token and each chunk a validator token"""
+        from infrastructure.rate_limit import TokenBucket
+
+        domclick, validator = TokenBucket(rate=1000), TokenBucket(rate=1000)
+        runner = self._runner(tmp_path, rate_limits={"domclick": domclick, "validator": validator})
+        job_id = await runner.submit(["79310000001", "a@b.ru", "79310000003"])
+
+        with patch.object(domclick, 'acquire', wraps=domclick.acquire) as domclick_acquire, \
+                patch.object(validator, 'acquire', wraps=validator.acquire) as validator_acquire:
+            await runner.run_job(job_id)
+
+        assert domclick_acquire.call_count == 2
+        assert validator_acquire.call_count == 2
+
+    def test_expired_lease_is_reclaimed_and_release_requeues(self, tmp_path):
+        """Test a job held by a dead worker is claimed again once its lease expires"""
+        from infrastructure.job_store import JobStore
+
+        store = JobStore(str(tmp_path / "jobs.sqlite3"), lease=60)
+        job_id = store.create_job(["79310000001"])
+
+        assert store.claim_next_job() == job_id
+        assert store.claim_next_job() is None
+        with patch('infrastructure.job_store.time.time', return_value=time.time() + 120):
+            assert store.claim_next_job() == job_id
+
+        store.release_jobs([job_id])
+        assert store.get_job(job_id)["status"] == "queued"
+
+    def test_results_saved_twice_are_counted_once(self, tmp_path):
+        """Test a chunk saved again by a worker that lost its lease keeps the counters exact"""
+        from infrastructure.job_store import JobStore
+
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        job_id = store.create_job(["79310000001", "79310000002"])
+
+        store.save_results(job_id, [(0, '"first"', True), (1, '"first"', False)])
+        store.save_results(job_id, [(0, '"second"', False), (1, '"second"', True)])
+
+        job = store.get_job(job_id)
+        assert (job["processed"], job["failed"]) == (2, 1)
+        assert [result for _, _, result in store.get_results(job_id, 0, 10)] == ['"first"', '"first"']
+
+    def test_job_endpoints(self, tmp_path):
+        """Test submitting a plain-text file and polling the job over HTTP"""
+        from infrastructure.job_store import JobStore
+
+        client = TestClient(app)
+        with patch('controllers.jobs_controller.job_runner.store', JobStore(str(tmp_path / "jobs.sqlite3"))):
+            response = client.post(
+                "/api/v1/jobs",
+                content=b"79310000001\na@b.ru\n",
+                headers={"Content-Type": "text/plain"}
+            )
+            assert response.status_code == 202
+            job_id = response.json()["body"]["job_id"]
+
+            status = client.get(f"/api/v1/jobs/{job_id}").json()
+            assert (status["body"]["status"], status["body"]["total"]) == ("queued", 2)
+            assert client.get("/api/v1/jobs").json()["body"]["pending_queries"] == 2
+            assert client.get("/api/v1/jobs/missing").status_code == 404
+
+
+class TestDomClickResilience:
+    """Test rate limiting, circuit breaking and retries around DomClickClient"""
+
+    def _client(self, threshold=3):
+        from infrastructure.external.domclick_client import DomClickClient
+        from infrastructure.rate_limit import AdaptiveRateLimiter
+        from infrastructure.resilience import CircuitBreaker
+
+        return DomClickClient(
+            limiter=AdaptiveRateLimiter(rate=100, min_rate=1),
+            breaker=CircuitBreaker("domclick", failure_threshold=threshold, reset_timeout=30)
+        )
+
+    @pytest.mark.asyncio
+    async def test_transient_errors_are_retried(self):
+        """Test a 503 followed by success returns the result"""
+        from infrastructure.resilience import UpstreamError
+
+        client = self._client()
+        with patch.object(client, '_get_user_info', side_effect=[
+            UpstreamError(503, "unavailable"), {"casId": "1"}
+        ]) as mock_get, patch('infrastructure.external.domclick_client.asyncio.sleep') as mock_sleep:
+            assert await client.search_user("79319999999") == {"casId": "1"}
+
+        assert mock_get.call_count == 2
+        assert mock_sleep.call_count == 1
+        assert client.breaker.stats()["consecutive_failures"] == 0
+
+    @pytest.mark.asyncio
+    async def test_429_slows_limiter_and_honours_retry_after(self):
+        """Test throttling halves the rate and waits at least Retry-After"""
+        from infrastructure.resilience import UpstreamError
+
+        client = self._client()
+        with patch.object(client, '_get_user_info', side_effect=[
+            UpstreamError(429, "throttled", retry_after=3), {"casId": "1"}
+        ]), patch('asyncio.sleep') as mock_sleep:
+            await client.search_user("79319999999")
+
+        assert mock_sleep.call_args_list
+        assert all(call.args[0] >= 2.9 for call in mock_sleep.call_args_list)
+        assert client.limiter.throttled == 1
+        assert client.limiter.rate == 50 + client.limiter.increase_step
+
+    @pytest.mark.asyncio
+    async def test_breaker_opens_and_fails_fast(self):
+        """Test repeated failures open the breaker so later calls skip the upstream"""
+        from infrastructure.resilience import CircuitOpenError, UpstreamError
+
+        client = self._client(threshold=2)
+        client.retries = 0
+        with patch.object(client, '_get_user_info', side_effect=UpstreamError(502, "bad gateway")) as mock_get:
+            for _ in range(2):
+                with pytest.raises(UpstreamError):
+                    await client.search_user("79319999999")
+            with pytest.raises(CircuitOpenError):
+                await client.search_user("79319999999")
+
+        assert mock_get.call_count == 2
+        assert client.breaker.state == "open"
+
+    def test_breaker_half_open_probe(self):
+        """Test the breaker lets one probe through after reset_timeout and closes on success"""
+        from infrastructure.resilience import CircuitBreaker, CircuitOpenError
+
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=10)
+        with patch('infrastructure.resilience.time.monotonic', return_value=100.0):
+            breaker.record_failure()
+        with patch('infrastructure.resilience.time.monotonic', return_value=111.0):
+            assert breaker.state == "half_open"
+            breaker.before_call()
+            with pytest.raises(CircuitOpenError):
+                breaker.before_call()
+            breaker.record_success()
+        assert breaker.state == "closed"
+
+    def test_health_reports_degraded_upstream(self):
+        """Test /health reports degraded while the DomClick breaker is open"""
+        from infrastructure.resilience import CircuitState
+
+        client = TestClient(app)
+        with patch('infrastructure.external.domclick_client.domclick_breaker._state', CircuitState.OPEN), \
+                patch('infrastructure.external.domclick_client.domclick_breaker._opened_at', time.monotonic()):
+            data = client.get("/health").json()
+
+        assert data["status"] == "degraded"
+        assert data["upstreams"]["domclick"]["circuit_breaker"]["state"] == "open"
+
+
+class TestProviderRegistry:
+    """Test concurrent multi-provider dispatch"""
+
+    @staticmethod
+    def _service(search):
+        service = MagicMock()
+        service.search = search
+        return service
+
+    @pytest.mark.asyncio
+    async def test_slow_provider_returns_partial_result(self):
+        """Test providers run concurrently and a slow one times out alone"""
+        from domain.services.provider_registry import ProviderRegistry
+        from controllers.common_controller import _provider_response
+
+        async def fast(query):
+            await asyncio.sleep(0.05)
+            return [SearchResult(first_name="Иван")]
+
+        async def slow(query):
+            await asyncio.sleep(1)
+            return [SearchResult(first_name="Пётр")]
+
+        registry = ProviderRegistry()
+        registry.register("phone", "fast", self._service(fast), "fast-service", "Fast", timeout=0.5)
+        registry.register("phone", "fast2", self._service(fast), "fast-service", "Fast 2", timeout=0.5)
+        registry.register("phone", "slow", self._service(slow), "slow-service", "Slow", timeout=0.1)
+
+        started = time.perf_counter()
+        results = await registry.dispatch("phone", "79319999999")
+        assert time.perf_counter() - started < 0.3
+
+        response = _provider_response("79319999999", "phone", results)
+        assert response.headers["sender"] == "common-controller"
+        assert [found.first_name for found in response.body["results"]] == ["Иван", "Иван"]
+        assert response.extra["partial"] is True
+        assert response.extra["providers"]["fast"]["status"] == "ok"
+        assert response.extra["providers"]["slow"]["status"] == "timeout"
+        assert response.extra["service_used"] == "Fast, Fast 2"
+
+    @pytest.mark.asyncio
+    async def test_all_providers_failing_is_an_error(self):
+        """Test a query fails only when every provider fails"""
+        from domain.services.provider_registry import ProviderRegistry
+        from controllers.common_controller import _provider_response
+
+        registry = ProviderRegistry()
+        registry.register(
+            "phone", "domclick", self._service(AsyncMock(side_effect=Exception("API error"))),
+            "domclick-service", "DomClick API", timeout=1, upstream="domclick"
+        )
+
+        response = _provider_response("79319999999", "phone", await registry.dispatch("phone", "79319999999"))
+        assert response.headers["sender"] == "domclick-service"
+        assert response.body["error"] == "Processing failed: API error"
+        assert response.extra["providers"]["domclick"]["status"] == "error"
+        assert registry.upstreams_for("phone") == ["domclick"]
+        assert registry.upstreams_for("email") == []
+
+
+    @pytest.mark.asyncio
+    async def test_deadline_during_call_is_a_timeout(self):
+        """Test a provider that runs out of request time mid-call reports a timeout"""
+        from core.request_context import DeadlineExceeded
+        from domain.services.provider_registry import ProviderRegistry
+
+        registry = ProviderRegistry()
+        registry.register(
+            "phone", "domclick", self._service(AsyncMock(side_effect=DeadlineExceeded("Request deadline exceeded"))),
+            "domclick-service", "DomClick API", timeout=1
+        )
+
+        result, = await registry.dispatch("phone", "79319999999")
+        assert result.status == "timeout"
+        assert result.error == "DomClick API: request deadline exceeded"
+
+class TestBenchmarkHarness:
+    """Test benchmark report helpers and fake upstreams"""
+
+    def test_summarize_percentiles(self):
+        """Test nearest-rank percentiles and throughput in the report"""
+        from collections import Counter
+        from benchmarks.run import summarize
+
+        latencies = [i / 1000 for i in range(1, 101)]
+        report = summarize(latencies, Counter({"200": 99, "503": 1}), 2, 2.0, 10)
+
+        assert report["latency_ms"]["p50"] == 50.0
+        assert report["latency_ms"]["p95"] == 95.0
+        assert report["latency_ms"]["p99"] == 99.0
+        assert report["throughput_rps"] == 50.0
+        assert report["queries_per_second"] == 500.0
+        assert report["errors"] == 1
+
+    def test_compare_flags_regressions(self):
+        """Test throughput drops and tail latency growth beyond tolerance are reported"""
+        from benchmarks.run import compare
+
+        def report(rps, p95, p99):
+            return {"scenarios": {"search": {"throughput_rps": rps, "latency_ms": {"p95": p95, "p99": p99}}}}
+
+        baseline = report(100, 50, 80)
+        assert compare(report(95, 54, 80), baseline, 0.1) == []
+        regressions = compare(report(80, 60, 80), baseline, 0.1)
+        assert len(regressions) == 2
+        assert regressions[0].startswith("search: throughput")
+
+    @pytest.mark.asyncio
+    async def test_fake_upstreams(self):
+        """Test fake upstreams answer like the real ones and count calls"""
+        import aiohttp
+        from benchmarks.fake_upstreams import FakeUpstreams, UpstreamBehavior
+
+        fakes = FakeUpstreams(
+            validator=UpstreamBehavior(latency=0, jitter=0),
+            domclick=UpstreamBehavior(latency=0, jitter=0, throttle_rate=1.0, retry_after=2)
+        )
+        base_url = await fakes.start()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(f"{base_url}/api/v1/validate", json={"query": ["79319999999"]}) as response:
+                    items = await response.json()
+                async with session.get(f"{base_url}/portal/api/v1/user_info", params={"phone": "9319999999"}) as response:
+                    status, retry_after = response.status, response.headers.get("Retry-After")
+        finally:
+            await fakes.stop()
+
+        assert items[0]["body"]["type"] == "phone"
+        assert (status, retry_after) == (429, "2")
+        assert fakes.stats() == {"validator": 1, "validator_queries": 1, "domclick": 1, "domclick_429": 1}
+
+
+class TestMetrics:
+    """Test latency histograms and the /metrics endpoint"""
+
+    def test_histogram_renders_cumulative_buckets(self):
+        """Test observations land in le buckets and render cumulatively"""
+        from infrastructure.metrics import MetricsRegistry, render
+
+        registry = MetricsRegistry()
+        histogram = registry.histogram("test_seconds", "Test", ("stage",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value, "lookup")
+
+        text = render(registry.snapshot())
+        assert 'test_seconds_bucket{stage="lookup",le="0.1"} 2' in text
+        assert 'test_seconds_bucket{stage="lookup",le="1"} 3' in text
+        assert 'test_seconds_bucket{stage="lookup",le="+Inf"} 4' in text
+        assert 'test_seconds_sum{stage="lookup"} 2.65' in text
+        assert 'test_seconds_count{stage="lookup"} 4' in text
+
+    @pytest.mark.asyncio
+    async def test_collect_merges_worker_snapshots(self, tmp_path):
+        """Test /metrics data sums the snapshots of every worker"""
+        import json
+        from infrastructure.metrics import MetricsRegistry
+
+        def worker_metrics():
+            registry = MetricsRegistry(str(tmp_path))
+            registry.histogram("test_seconds", "Test", ("stage",), buckets=(1.0,)).observe(0.5, "lookup")
+            registry.counter("test_total", "Test", ("upstream",)).inc("domclick", amount=2)
+            return registry
+
+        # Another worker's last snapshot, as written by its flush task
+        (tmp_path / "1.json").write_text(json.dumps(worker_metrics().snapshot()))
+
+        merged = await worker_metrics().collect()
+        assert merged["test_seconds"]["series"] == [[["lookup"], [2, 0, 1.0]]]
+        assert merged["test_total"]["series"] == [[["domclick"], 4.0]]
+
+    @pytest.mark.asyncio
+    async def test_stale_snapshots_are_removed(self, tmp_path):
+        """Test snapshots of gone workers are dropped and a stopped worker removes its own"""
+        import json
+        import os
+        from infrastructure.metrics import MetricsRegistry
+
+        stale = tmp_path / "1.json"
+        snapshot = json.dumps({"test_total": {"type": "counter", "help": "Test", "labelnames": [], "series": [[[], 5]]}})
+        stale.write_text(snapshot)
+        os.utime(stale, (time.time() - 60, time.time() - 60))
+
+        registry = MetricsRegistry(str(tmp_path), flush_interval=5)
+        registry.counter("test_total", "Test", ()).inc()
+        await registry.start()
+        assert not stale.exists()
+
+        stale.write_text(snapshot)
+        os.utime(stale, (time.time() - 60, time.time() - 60))
+        merged = await registry.collect()
+        assert merged["test_total"]["series"] == [[[], 1.0]]
+        assert not stale.exists()
+
+        await registry.stop()
+        assert list(tmp_path.iterdir()) == []
+
+    def test_gauges_stay_per_worker(self):
+        """Test gauges of different workers are kept apart by pid rather than summed"""
+        import os
+        from infrastructure.metrics import MetricsRegistry, merge
+
+        registry = MetricsRegistry()
+        registry.gauge("test_limit", "Test", ()).set(40)
+        other = {"test_limit": {"type": "gauge", "help": "Test", "labelnames": ["pid"], "series": [[["1"], 60]]}}
+
+        merged = merge([registry.snapshot(), other])
+        assert sorted(merged["test_limit"]["series"]) == [[["1"], 60], [[str(os.getpid())], 40]]
+
+    def test_metrics_endpoint_reports_stages(self):
+        """Test processing records per-stage histograms exposed on /metrics"""
+        client = TestClient(app)
+        with patch('controllers.common_controller.validator_client.validate_queries') as mock_validate, \
+                patch('controllers.common_controller.domclick_service.search', return_value=[]):
+            mock_validate.return_value = [{"body": {"type": "phone", "clean_data": "79319999999"}, "extra": {}}]
+            client.post("/api/v1/common/process", json={"queries": ["79319999999"]})
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'sfera_stage_seconds_count{stage="classify",data_type="all",status="ok"}' in response.text
+        assert 'sfera_stage_seconds_count{stage="query",data_type="phone",status="ok"}' in response.text
+        assert 'sfera_http_request_seconds_count{method="POST",handler="process_queries",status="200"}' in response.text
+
+
+class TestFastSerialization:
+    """Test responses are encoded straight from models"""
+
+    def test_batch_encoding_matches_model_dump(self):
+        """Test batch encoding gives the same JSON as per-response dumps"""
+        import json
+        from core.schemas.response import StandardResponse
+        from infrastructure.serialization import encode_responses
+
+        responses = [
+            StandardResponse.model_construct(
+                headers={"sender": "domclick-service"},
+                body={"results": [SearchResult(first_name="Иван", user_id=1)]},
+                extra={"query": "79319999999"}
+            ),
+            StandardResponse(headers={"sender": "common-controller"}, body={"error": "Unsupported data type: email"}),
+        ]
+
+        encoded = json.loads(encode_responses(responses))
+        assert encoded == [json.loads(response.model_dump_json()) for response in responses]
+        assert encoded[0]["body"]["results"][0]["first_name"] == "Иван"
+        assert encoded[1]["extra"] is None
+
+    def test_adapt_response_defaults(self):
+        """Test adapting a payload without a partner card keeps model defaults"""
+        service = DomClickService()
+        result = service._adapt_response({"casId": "42", "firstName": "Иван"})[0]
+
+        assert result.user_id == 42
+        assert result.is_partner == "Нет"
+        assert result.avatar is None
+        assert result.model_dump()["deals_count"] is None
+
+    def test_search_route_encodes_models(self):
+        """Test /domclick returns SearchResult fields without a dict round-trip"""
+        client = TestClient(app)
+        with patch('controllers.search_controller.search_service.search') as mock_search:
+            mock_search.return_value = [SearchResult(first_name="Иван", user_id=1234567)]
+            response = client.get("/api/v1/domclick/search/phone/79319999999")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        data = response.json()
+        assert data["body"]["results"][0]["first_name"] == "Иван"
+        assert data["extra"] == {"query": "79319999999", "results_count": 1}
+
+
+class TestLookupStore:
+    """Test the persistent lookup store, stale reads and cache warm-up"""
+
+    @pytest.mark.asyncio
+    async def test_writes_are_batched(self, tmp_path):
+        """Test records are buffered, collapsed per key and written in one flush"""
+        from infrastructure.lookup_store import SQLiteLookupStore
+
+        store = SQLiteLookupStore(str(tmp_path / "lookups.sqlite3"), batch_size=100)
+        store.record("domclick:phone", "79319999999", [SearchResult(first_name="Пётр")])
+        store.record("domclick:phone", "79319999999", [SearchResult(first_name="Иван")])
+        store.record("domclick:phone", "79310000000", [])
+        assert store.stats()["written"] == 0
+
+        await store.flush()
+        results, fetched_at = await store.get("domclick:phone", "79319999999")
+        recent = await store.recent("domclick:phone", 10, 60)
+        store.close()
+
+        assert results[0].first_name == "Иван"
+        assert time.time() - fetched_at < 5
+        assert sorted(query for query, _, _ in recent) == ["79310000000", "79319999999"]
+        assert store.stats()["written"] == 2 and store.stats()["flushes"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_results_only_when_allowed(self, tmp_path):
+        """Test upstream failures fall back to stored results only in stale-ok mode"""
+        from core.request_context import allow_stale
+        from domain.models.search import StaleResults
+        from domain.services.cached_search_service import CachedSearchService
+        from infrastructure.cache import InMemoryCache
+        from infrastructure.lookup_store import SQLiteLookupStore
+
+        store = SQLiteLookupStore(str(tmp_path / "lookups.sqlite3"))
+        inner = DomClickService()
+        service = CachedSearchService(inner, InMemoryCache(max_size=10), "test", store=store)
+
+        with patch.object(inner, 'fetch', return_value=[SearchResult(first_name="Иван")]):
+            await service.search("79319999999")
+        await store.flush()
+        await service.cache.delete("test:79319999999")
+
+        with patch.object(inner, 'fetch', side_effect=Exception("API error")):
+            with pytest.raises(Exception, match="API error"):
+                await service.search("79319999999")
+            allow_stale.set(True)
+            try:
+                results = await service.search("79319999999")
+            finally:
+                allow_stale.set(False)
+        store.close()
+
+        assert isinstance(results, StaleResults)
+        assert results[0].first_name == "Иван"
+        assert service.stale_served == 1
+
+    @pytest.mark.asyncio
+    async def test_warm_loads_fresh_entries(self, tmp_path):
+        """Test warm-up fills the cache with stored results that are still fresh"""
+        from domain.services.cached_search_service import CachedSearchService
+        from infrastructure.cache import InMemoryCache
+        from infrastructure.lookup_store import SQLiteLookupStore
+
+        store = SQLiteLookupStore(str(tmp_path / "lookups.sqlite3"))
+        store.record("test", "79319999999", [SearchResult(first_name="Иван")])
+        store.record("test", "79310000000", [])
+        store.record("other", "79311111111", [])
+        await store.flush()
+
+        service = CachedSearchService(DomClickService(), InMemoryCache(max_size=10), "test", store=store)
+        with patch.object(service.cache, 'set', wraps=service.cache.set) as mock_set:
+            assert await service.warm(100) == 2
+        store.close()
+
+        ttls = {call.args[0]: call.args[2] for call in mock_set.call_args_list}
+        assert 3500 < ttls["test:79319999999"] <= 3600
+        assert 200 < ttls["test:79310000000"] <= 300
+        assert (await service.cache.get("test:79319999999"))[0].first_name == "Иван"
+
+
+class TestNormalization:
+    """Test canonical phone forms and batch deduplication"""
+
+    def test_phone_spellings_share_a_canonical_form(self):
+        """Test common phone spellings normalize to 7XXXXXXXXXX"""
+        from domain.services.classifier import normalize_phone
+
+        for spelling in ("+7 931 999-99-99", "89319999999", "79319999999", "8 (931) 999-99-99", "9319999999"):
+            assert normalize_phone(spelling) == "79319999999"
+        assert normalize_phone("+1 931 999 9999") is None
+        assert normalize_phone("12345") is None
+        assert normalize_phone("8٩٣١٩٩٩٩٩٩٩") is None
+        assert normalize_phone("+7 ²³¹ 999 99 99") is None
+
+    def test_duplicates_share_one_lookup(self):
+        """Test one upstream lookup is fanned out to every spelling in the batch"""
+        client = TestClient(app)
+        queries = ["+7 931 999-99-99", "89319999999", "79319999999", " 79319999999", "79310000000"]
+
+        async def validate(inputs):
+            return ValidatorClient()._fallback_validation(inputs)
+
+        with patch('controllers.common_controller.validator_client.validate_queries', side_effect=validate) as mock_validate, \
+                patch('controllers.common_controller.domclick_service.search') as mock_search:
+            mock_search.return_value = [SearchResult(first_name="Иван")]
+            response = client.post("/api/v1/common/process", json={"queries": queries})
+
+        data = response.json()
+        assert response.status_code == 200
+        assert mock_validate.call_args.args[0] == ["+7 931 999-99-99", "89319999999", "79319999999", "79310000000"]
+        assert sorted(call.args[0] for call in mock_search.call_args_list) == ["79310000000", "79319999999"]
+        assert [item["extra"]["query"] for item in data] == queries
+        assert all(item["body"]["results"][0]["first_name"] == "Иван" for item in data)
+
+    @pytest.mark.asyncio
+    async def test_client_sends_national_number(self):
+        """Test DomClick gets the 10-digit national number whatever the spelling"""
+        from infrastructure.external.domclick_client import DomClickClient
+
+        client = DomClickClient()
+        with patch.object(client, '_get_user_info', return_value={"casId": "1"}) as mock_get:
+            await client.search_user("+7 (931) 999-99-99")
+            await client.search_user("89319999999")
+            with pytest.raises(ValueError, match="Invalid phone number"):
+                await client.search_user("12345")
+
+        assert [call.args[0]["phone"] for call in mock_get.call_args_list] == ["9319999999", "9319999999"]
+
+    def test_phone_route_normalizes_and_rejects_invalid(self):
+        """Test /domclick looks up the canonical phone and rejects non-phones"""
+        client = TestClient(app)
+        with patch('controllers.search_controller.search_service.search', return_value=[]) as mock_search:
+            response = client.get("/api/v1/domclick/search/phone/89319999999")
+            invalid = client.get("/api/v1/domclick/search/phone/hello")
+            non_ascii = client.get("/api/v1/domclick/search/phone/8٩٣١٩٩٩٩٩٩٩")
+
+        assert response.status_code == 200
+        assert response.json()["extra"]["query"] == "89319999999"
+        mock_search.assert_called_once_with("79319999999")
+        assert invalid.status_code == 400
+        assert non_ascii.status_code == 400
+
+
+class TestPriorityScheduler:
+    """Test priority lanes, bulk cap and per-client fairness"""
+
+    @staticmethod
+    async def _run(scheduler, jobs):
+        """Start (lane, client, name) jobs in order; each holds its slot until released"""
+        started, releases, tasks = [], {}, []
+
+        async def job(lane, client, name):
+            releases[name] = asyncio.Event()
+            async with scheduler.slot(lane, client):
+                started.append(name)
+                await releases[name].wait()
+
+        for lane, client, name in jobs:
+            tasks.append(asyncio.create_task(job(lane, client, name)))
+            await asyncio.sleep(0)
+        return started, releases, tasks
+
+    @pytest.mark.asyncio
+    async def test_interactive_goes_first(self):
+        """Test a freed slot goes to waiting interactive work before bulk"""
+        from infrastructure.scheduler import PriorityScheduler
+
+        scheduler = PriorityScheduler("test", capacity=2, bulk_share=0.5)
+        started, releases, tasks = await self._run(scheduler, [
+            ("bulk", "a", "bulk-1"),
+            ("interactive", "b", "interactive-1"),
+            ("bulk", "a", "bulk-2"),
+            ("interactive", "b", "interactive-2"),
+        ])
+        assert started == ["bulk-1", "interactive-1"]
+
+        releases["interactive-1"].set()
+        await asyncio.sleep(0.01)
+        assert started[-1] == "interactive-2"
+
+        for release in releases.values():
+            release.set()
+        await asyncio.gather(*tasks)
+        assert started == ["bulk-1", "interactive-1", "interactive-2", "bulk-2"]
+
+    @pytest.mark.asyncio
+    async def test_bulk_is_capped(self):
+        """Test bulk cannot take the whole budget while interactive still can"""
+        from infrastructure.scheduler import PriorityScheduler
+
+        scheduler = PriorityScheduler("test", capacity=4, bulk_share=0.5)
+        started, releases, tasks = await self._run(scheduler, [
+            ("bulk", "a", "bulk-1"),
+            ("bulk", "a", "bulk-2"),
+            ("bulk", "a", "bulk-3"),
+            ("interactive", "b", "interactive-1"),
+        ])
+        assert started == ["bulk-1", "bulk-2", "interactive-1"]
+        assert scheduler.stats()["lanes"]["bulk"]["waiting"] == 1
+
+        for release in releases.values():
+            release.set()
+        await asyncio.gather(*tasks)
+        assert scheduler.stats()["lanes"]["bulk"]["granted"] == 3
+
+    @pytest.mark.asyncio
+    async def test_clients_are_served_round_robin(self):
+        """Test a client with many queued calls does not hold up another client"""
+        from infrastructure.scheduler import PriorityScheduler
+
+        scheduler = PriorityScheduler("test", capacity=1, bulk_share=1.0)
+        started, releases, tasks = await self._run(scheduler, [
+            ("bulk", "a", "a-1"),
+            ("bulk", "a", "a-2"),
+            ("bulk", "a", "a-3"),
+            ("bulk", "b", "b-1"),
+        ])
+        for name in ("a-1", "a-2", "b-1", "a-3"):
+            releases[name].set()
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*tasks)
+
+        assert started == ["a-1", "a-2", "b-1", "a-3"]
+        stats = scheduler.stats()["lanes"]["bulk"]
+        assert stats["granted"] == 4 and stats["mean_wait_ms"] > 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self):
+        """Test a cancelled waiter does not keep its place or leak a slot"""
+        from infrastructure.scheduler import PriorityScheduler
+
+        scheduler = PriorityScheduler("test", capacity=1, bulk_share=1.0)
+        started, releases, tasks = await self._run(scheduler, [
+            ("interactive", "a", "first"),
+            ("interactive", "a", "cancelled"),
+        ])
+        tasks[1].cancel()
+        await asyncio.sleep(0)
+        releases["first"].set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        lanes = scheduler.stats()["lanes"]
+        assert started == ["first"]
+        assert lanes["interactive"]["active"] == 0 and lanes["interactive"]["waiting"] == 0
+
+
+class TestDeadlinesAndHedging:
+    """Test deadline propagation and hedged upstream calls"""
+
+    def test_remaining_is_bounded_by_deadline(self):
+        """Test timeouts shrink to the request's budget and fail fast once it is spent"""
+        import contextvars
+        from core.request_context import DeadlineExceeded, remaining, set_deadline
+
+        def check():
+            assert remaining(10) == 10
+            set_deadline(0.5)
+            assert 0 < remaining(10) <= 0.5
+            assert remaining(0.1) == 0.1
+            set_deadline(0.001)
+            time.sleep(0.01)
+            with pytest.raises(DeadlineExceeded):
+                remaining(10)
+
+        contextvars.copy_context().run(check)
+
+    def test_request_timeout_header_bounds_queries(self):
+        """Test X-Request-Timeout cuts slow lookups short instead of QUERY_TIMEOUT"""
+        async def slow_search(phone):
+            await asyncio.sleep(1)
+            return []
+
+        client = TestClient(app)
+        with patch('controllers.common_controller.domclick_service.search', side_effect=slow_search):
+            started = time.perf_counter()
+            response = client.post(
+                "/api/v1/common/process",
+                json={"queries": ["79319999999"]},
+                headers={"X-Request-Timeout": "0.2"}
+            )
+            elapsed = time.perf_counter() - started
+
+        assert response.status_code == 200
+        assert elapsed < 0.9
+        assert "error" in response.json()[0]["body"]
+
+    @pytest.mark.asyncio
+    async def test_hedge_wins_over_slow_primary(self):
+        """Test a second call is fired after the latency percentile and the first answer wins"""
+        from infrastructure.hedging import Hedger
+
+        hedger = Hedger("test", enabled=True, percentile=50, max_rate=1.0, min_delay=0.01, min_samples=3)
+        for latency in (0.01, 0.01, 0.01):
+            hedger.observe(latency)
+        delays = iter([1.0, 0.0])
+
+        async def call():
+            await asyncio.sleep(next(delays))
+            return "ok"
+
+        started = time.perf_counter()
+        assert await hedger.run(call) == "ok"
+        assert time.perf_counter() - started < 0.5
+        assert hedger.hedged == 1 and hedger.hedge_wins == 1
+
+    @pytest.mark.asyncio
+    async def test_hedge_rate_is_capped(self):
+        """Test hedges stop once the budget of max_rate per call is used up"""
+        from infrastructure.hedging import Hedger
+
+        hedger = Hedger("test", enabled=True, percentile=50, max_rate=0.1, min_delay=0.001, min_samples=1)
+        for _ in range(1000):
+            hedger.observe(0.001)
+
+        async def call():
+            await asyncio.sleep(0.005)
+            return "ok"
+
+        for _ in range(30):
+            await hedger.run(call)
+        assert 1 <= hedger.hedged <= 3
+        assert hedger.denied > 0
+
+    @pytest.mark.asyncio
+    async def test_hedge_needs_permission(self):
+        """Test no hedge is fired when allow() refuses, e.g. without a rate limit token"""
+        from infrastructure.hedging import Hedger
+
+        hedger = Hedger("test", enabled=True, percentile=50, max_rate=1.0, min_delay=0.001, min_samples=1)
+        hedger.observe(0.001)
+        calls = 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        assert await hedger.run(call, allow=lambda: False) == "ok"
+        assert calls == 1 and hedger.hedged == 0
+
+
+class TestSidecar:
+    """Test state shared between workers through the sidecar"""
+
+    @staticmethod
+    def _search_results():
+        return [SearchResult(user_id=1, first_name="Иван", last_name="Сидоров")]
+
+    @pytest.mark.asyncio
+    async def test_cache_is_shared_between_clients(self, tmp_path):
+        """Test a value cached through one worker's client is a hit for another"""
+        from infrastructure.cache import InMemoryCache, SharedCache, _results
+        from infrastructure.sidecar import SidecarServer
+        from infrastructure.sidecar_client import SidecarClient
+
+        server = SidecarServer(str(tmp_path / "sidecar.sock"), cache_size=100)
+        await server.start()
+        first, second = SidecarClient(server.path), SidecarClient(server.path)
+        caches = [
+            SharedCache(
+                client,
+                encode=lambda results: _results.dump_json(results).decode(),
+                decode=_results.validate_json,
+                fallback=InMemoryCache(100)
+            )
+            for client in (first, second)
+        ]
+        try:
+            assert await caches[1].get("domclick:phone:79319999999") is None
+            await caches[0].set("domclick:phone:79319999999", self._search_results(), 60)
+            await asyncio.sleep(0.01)
+            cached = await caches[1].get("domclick:phone:79319999999")
+            assert cached == self._search_results()
+            assert caches[1].stats()["hits"] == 1
+        finally:
+            await first.close()
+            await second.close()
+            await server.stop()
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_is_global(self, tmp_path):
+        """Test workers draw from one token bucket rather than one each"""
+        from infrastructure.rate_limit import SharedRateLimiter
+        from infrastructure.sidecar import SidecarServer
+        from infrastructure.sidecar_client import SidecarClient
+
+        server = SidecarServer(str(tmp_path / "sidecar.sock"), cache_size=10)
+        await server.start()
+        clients = [SidecarClient(server.path) for _ in range(2)]
+        limiters = [SharedRateLimiter("domclick", client, rate=10, min_rate=1, workers=2) for client in clients]
+        try:
+            started = time.perf_counter()
+            # Burst of 10, then 10/s shared: 14 tokens take about 0.4s whichever worker asks
+            await asyncio.gather(*(limiters[i % 2].acquire() for i in range(14)))
+            elapsed = time.perf_counter() - started
+            assert 0.3 < elapsed < 1.0
+            assert server.limiters["domclick"].rate == 10
+        finally:
+            for client in clients:
+                await client.close()
+            await server.stop()
+
+    @pytest.mark.asyncio
+    async def test_metrics_are_merged(self, tmp_path):
+        """Test /metrics data from every worker is summed by the sidecar"""
+        from infrastructure.metrics import MetricsRegistry
+        from infrastructure.sidecar import SidecarServer
+        from infrastructure.sidecar_client import SidecarClient
+
+        server = SidecarServer(str(tmp_path / "sidecar.sock"), cache_size=10)
+        await server.start()
+        client = SidecarClient(server.path)
+        try:
+            registry = MetricsRegistry(sidecar=client)
+            registry.counter("requests_total", "Requests", ("worker",)).inc("a", amount=2)
+            await client.call("metrics.put", "other", {
+                "requests_total": {
+                    "type": "counter", "help": "Requests", "labelnames": ["worker"],
+                    "series": [[["a"], 3]]
+                }
+            })
+            collected = await registry.collect()
+            assert collected["requests_total"]["series"] == [[["a"], 5.0]]
+        finally:
+            await client.close()
+            await server.stop()
+
+    @pytest.mark.asyncio
+    async def test_snapshots_of_gone_workers_are_evicted(self, tmp_path):
+        """Test the sidecar stops merging snapshots that are no longer renewed or were deleted"""
+        from infrastructure.sidecar import SidecarServer
+
+        server = SidecarServer(str(tmp_path / "sidecar.sock"), cache_size=10, metrics_stale_after=60)
+        snapshot = {"requests_total": {"type": "counter", "help": "Requests", "labelnames": [], "series": [[[], 1]]}}
+        for worker in ("1", "2", "3"):
+            await server.handle("metrics.put", [worker, snapshot])
+        await server.handle("metrics.delete", ["3"])
+
+        with patch('infrastructure.sidecar.time.monotonic', return_value=time.monotonic() + 30):
+            await server.handle("metrics.put", ["2", snapshot])
+        with patch('infrastructure.sidecar.time.monotonic', return_value=time.monotonic() + 70):
+            collected = await server.handle("metrics.collect", [])
+            assert server.stats()["workers"] == ["2"]
+        assert collected["requests_total"]["series"] == [[[], 1]]
+
+    def test_reservations_are_bounded_and_refundable(self):
+        """Test the shared bucket refuses reservations past max_wait and takes refunds back"""
+        from infrastructure.rate_limit import AdaptiveRateLimiter
+
+        limiter = AdaptiveRateLimiter(rate=10, min_rate=1)
+        assert limiter.reserve(10, max_wait=1) == 0.0
+        assert limiter.reserve(10, max_wait=1) == pytest.approx(1.0, abs=0.01)
+        assert limiter.reserve(1, max_wait=1) is None
+        assert limiter.stats()["tokens"] == pytest.approx(-10, abs=0.1)
+
+        limiter.refund(10)
+        assert limiter.reserve(1, max_wait=1) == pytest.approx(0.1, abs=0.01)
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_gives_tokens_back(self, tmp_path):
+        """Test a caller cancelled while waiting for its reservation refunds it"""
+        from infrastructure.rate_limit import SharedRateLimiter
+        from infrastructure.sidecar import SidecarServer
+        from infrastructure.sidecar_client import SidecarClient
+
+        server = SidecarServer(str(tmp_path / "sidecar.sock"), cache_size=10)
+        await server.start()
+        client = SidecarClient(server.path)
+        limiter = SharedRateLimiter("domclick", client, rate=10, min_rate=1, max_wait=1)
+        try:
+            await limiter.acquire(10)
+            waiter = asyncio.create_task(limiter.acquire(5))
+            await asyncio.sleep(0.1)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            await client.call("ping")
+            assert server.limiters["domclick"].stats()["tokens"] > 0
+        finally:
+            await client.close()
+            await server.stop()
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_local_state(self, tmp_path):
+        """Test a missing sidecar degrades to worker-local cache and limiter"""
+        from infrastructure.cache import InMemoryCache, SharedCache
+        from infrastructure.rate_limit import SharedRateLimiter
+        from infrastructure.sidecar_client import SidecarClient
+
+        client = SidecarClient(str(tmp_path / "missing.sock"), retry_interval=60)
+        cache = SharedCache(client, encode=str, decode=str, fallback=InMemoryCache(10))
+        await cache.set("key", "value", 60)
+        assert await cache.get("key") == "value"
+
+        limiter = SharedRateLimiter("domclick", client, rate=100, min_rate=1, workers=4)
+        await limiter.acquire()
+        assert limiter.local.max_rate == 25
+        assert limiter.fallbacks == 1 and cache.fallbacks >= 1
+
+
+class TestStartup:
+    """Test fast start, the readiness probe and the import-time budget"""
+
+    def test_cold_import_within_budget(self):
+        """Test a fresh interpreter imports the app within budget and without aiohttp or DomClick"""
+        import os
+        import subprocess
+        import sys
+        from infrastructure.startup import ROOT
+
+        budget = float(os.getenv("STARTUP_IMPORT_BUDGET", "2.0"))
+        code = (
+            "import sys, time; started = time.perf_counter(); import infrastructure.main; "
+            "print(time.perf_counter() - started); "
+            "print('aiohttp' in sys.modules, 'domain.services.domclick_service' in sys.modules)"
+        )
+        completed = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=ROOT,
+            env={**os.environ, "PYTHONPATH": ROOT, "FAST_START": "true"},
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        seconds, loaded = completed.stdout.strip().splitlines()[-2:]
+        assert loaded == "False False"
+        assert float(seconds) < budget, f"Cold import took {float(seconds):.3f}s, budget is {budget}s"
+
+    def test_ready_follows_lifespan(self):
+        """Test /ready answers 200 with step timings only between startup and shutdown"""
+        from infrastructure.startup import startup
+
+        with patch('controllers.jobs_controller.job_runner.workers', 0), TestClient(app) as client:
+            response = client.get("/ready")
+            assert response.status_code == 200
+            data = response.json()
+            assert data["ready"] is True
+            assert {"import", "metrics", "job_runner"} <= set(data["steps_ms"])
+        assert startup.ready is False
+        assert TestClient(app).get("/ready").status_code == 503
+
+    def test_lazy_instance_loads_on_first_use(self):
+        """Test the wrapped module is only imported when an attribute is needed"""
+        from core.lazy import LazyInstance
+
+        lazy = LazyInstance("collections", "OrderedDict", [("a", 1)])
+        assert not lazy.loaded
+        assert list(lazy.keys()) == ["a"]
+        assert lazy.loaded and lazy.load() is lazy.load()
+
+    def test_parse_importtime(self):
+        """Test -X importtime output is parsed into per-module timings"""
+        from infrastructure.startup import parse_importtime
+
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   json.decoder\n"
+            "import time:       300 |        420 | json\n"
+        )
+        assert parse_importtime(output) == [
+            {"module": "json.decoder", "self_ms": 0.12, "cumulative_ms": 0.12},
+            {"module": "json", "self_ms": 0.3, "cumulative_ms": 0.42},
+        ]
+
+
+class TestDomClickPayload:
+    """Test the DomClick user_info fast-path decoder"""
+
+    def test_keeps_only_needed_fields(self):
+        """Test unused keys are dropped and the result adapts as before"""
+        import json
+        from benchmarks.payload import user_info
+        from infrastructure.external.domclick_payload import decode_user_info
+
+        body = user_info(reviews=5)
+        decoded = decode_user_info(body)
+        assert "reviews" not in decoded["partnerCard"]
+        assert decoded["casId"] == 1234567
+        adapt = DomClickService._adapt_response
+        assert adapt(None, decoded) == adapt(None, json.loads(body))
+
+    def test_not_found_payload(self):
+        """Test an empty object decodes to no results"""
+        from infrastructure.external.domclick_payload import decode_user_info
+
+        assert decode_user_info(b" {} ") == {}
+        assert DomClickService._adapt_response(None, decode_user_info(b"{}")) == []
+
+    @pytest.mark.parametrize("body", [
+        b"[]",
+        b"<html>Bad gateway</html>",
+        b'{"casId": 1',
+        b'{"casId": "abc"}',
+        b'{"casId": 1, "firstName": 5}',
+        b'{"casId": 1, "partnerCard": []}',
+        b'{"casId": 1, "partnerCard": {"dealsCount": "many"}}',
+    ])
+    def test_rejects_malformed_payloads(self, body):
+        """Test bodies that are not the expected object fail with MalformedPayload"""
+        from infrastructure.external.domclick_payload import MalformedPayload, decode_user_info
+
+        with pytest.raises(MalformedPayload):
+            decode_user_info(body)
+
+    def test_rejects_oversized_payloads(self):
+        """Test a body above max_size is rejected before parsing"""
+        from infrastructure.external.domclick_payload import MalformedPayload, decode_user_info
+
+        with pytest.raises(MalformedPayload):
+            decode_user_info(b'{"casId": 1}' + b" " * 100, max_size=64)
+
+    def test_benchmark_runs(self):
+        """Test the payload benchmark reports both paths"""
+        from benchmarks.payload import run
+
+        result = run(iterations=5, reviews=[3])["reviews_3"]
+        assert result["previous_us"] > 0 and result["fast_path_us"] > 0
+
+
+class TestRefreshAhead:
+    """Test hot cache entries are refreshed before they expire"""
+
+    @staticmethod
+    def _service(inner, **kwargs):
+        from infrastructure.cache import InMemoryCache
+        from domain.services.cached_search_service import CachedSearchService
+        from domain.services.refresh_ahead import RefreshAhead
+
+        options = dict(ahead=0.15, grace=1.0, concurrency=2, min_hits=2, window=600, interval=0.02)
+        options.update(kwargs)
+        return CachedSearchService(
+            inner, InMemoryCache(max_size=10), "test", ttl=0.2, negative_ttl=0.2,
+            refresh_ahead=RefreshAhead("test", **options)
+        )
+
+    def test_hits_decay_into_hot_and_cold(self):
+        """Test a key is hot at min_hits and cools down with the half-life"""
+        from domain.services.refresh_ahead import RefreshAhead
+
+        refresh = RefreshAhead("test", ahead=1, grace=1, concurrency=1, min_hits=2, window=10, interval=1)
+        with patch('domain.services.refresh_ahead.time.monotonic', return_value=100.0):
+            refresh.hit("a")
+            assert not refresh.is_hot("a")
+            refresh.hit("a")
+            assert refresh.is_hot("a")
+        with patch('domain.services.refresh_ahead.time.monotonic', return_value=110.0):
+            assert not refresh.is_hot("a")
+
+    @pytest.mark.asyncio
+    async def test_hot_entry_is_refreshed_before_expiry(self):
+        """Test the refresh loop re-fetches a hot entry so it never misses"""
+        inner = DomClickService()
+        service = self._service(inner)
+        versions = [[SearchResult(first_name="Иван", user_id=i)] for i in range(1, 10)]
+
+        with patch.object(inner, 'fetch', side_effect=versions) as mock_fetch:
+            for _ in range(3):
+                await service.search("79319999999")
+            await service.start()
+            try:
+                await asyncio.sleep(0.3)
+                result = await service.search("79319999999")
+            finally:
+                await service.stop()
+
+        stats = service.refresh_ahead.stats()
+        assert mock_fetch.call_count >= 2
+        assert result[0].user_id > 1
+        assert stats["refreshed"] >= 1 and stats["changed"] >= 1
+        assert stats["stale_served"] == 0
+
+    @pytest.mark.asyncio
+    async def test_cold_entry_is_left_to_expire(self):
+        """Test entries below min_hits are not refreshed"""
+        inner = DomClickService()
+        service = self._service(inner)
+
+        with patch.object(inner, 'fetch', return_value=[]) as mock_fetch:
+            await service.search("79319999999")
+            await service.start()
+            try:
+                await asyncio.sleep(0.3)
+            finally:
+                await service.stop()
+
+        assert mock_fetch.call_count == 1
+        assert service.refresh_ahead.refreshed == 0
+
+    @pytest.mark.asyncio
+    async def test_expired_hot_entry_is_served_stale_within_grace(self):
+        """Test an expired hot entry answers at once while a refresh runs"""
+        inner = DomClickService()
+        service = self._service(inner)
+        found = [SearchResult(first_name="Иван", user_id=1)]
+        refreshed = asyncio.Event()
+
+        async def fetch(phone):
+            if mock_fetch.call_count > 1:
+                await asyncio.sleep(0.05)
+                refreshed.set()
+            return found
+
+        with patch.object(inner, 'fetch', side_effect=fetch) as mock_fetch:
+            await service.search("79319999999")
+            await service.search("79319999999")
+            await asyncio.sleep(0.25)
+            started = time.perf_counter()
+            assert await service.search("79319999999") == found
+            assert time.perf_counter() - started < 0.05
+            await asyncio.wait_for(refreshed.wait(), 1)
+            await asyncio.sleep(0.01)
+
+        stats = service.refresh_ahead.stats()
+        assert (stats["stale_served"], stats["refreshed"], stats["changed"]) == (1, 1, 0)
+
+    @pytest.mark.asyncio
+    async def test_refreshes_beyond_concurrency_are_skipped(self):
+        """Test refreshes never exceed the concurrency cap"""
+        inner = DomClickService()
+        service = self._service(inner, concurrency=1)
+        release = asyncio.Event()
+
+        async def fetch(phone):
+            await release.wait()
+            return []
+
+        with patch.object(inner, 'fetch', side_effect=fetch):
+            refresh = service.refresh_ahead
+            assert refresh.trigger("test:1", "1", service.refresh)
+            assert not refresh.trigger("test:2", "2", service.refresh)
+            assert not refresh.trigger("test:1", "1", service.refresh)
+            release.set()
+            await asyncio.sleep(0.01)
+
+        stats = refresh.stats()
+        assert (stats["refreshed"], stats["skipped"], stats["refreshing"]) == (1, 1, 0)
+
+    @pytest.mark.asyncio
+    async def test_failed_refresh_keeps_cached_value(self):
+        """Test a failing refresh is counted and does not evict the entry"""
+        inner = DomClickService()
+        service = self._service(inner)
+        found = [SearchResult(first_name="Иван", user_id=1)]
+
+        with patch.object(inner, 'fetch', side_effect=[found, Exception("API error")]):
+            await service.search("79319999999")
+            service.refresh_ahead.trigger("test:79319999999", "79319999999", service.refresh)
+            await asyncio.sleep(0.01)
+            assert await service.search("79319999999") == found
+
+        assert service.refresh_ahead.failed == 1
+
+class TestResponseEncoding:
+    """Test content negotiation and compression on /common and /domclick"""
+
+    @staticmethod
+    def _post_process(headers, count=60):
+        client = TestClient(app)
+        queries = [f"user{i}@example.ru" for i in range(count)]
+        with patch('controllers.common_controller.validator_client.validate_queries',
+                   side_effect=lambda queries: ValidatorClient()._fallback_validation(queries)):
+            return client.post("/api/v1/common/process", json={"queries": queries}, headers=headers)
+
+    @staticmethod
+    async def _run_middleware(chunks, accept_encoding, minimum_size=1024):
+        from infrastructure.compression import CompressionMiddleware
+
+        async def endpoint(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"application/x-ndjson")]})
+            for position, chunk in enumerate(chunks):
+                await send({"type": "http.response.body", "body": chunk,
+                            "more_body": position < len(chunks) - 1})
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        middleware = CompressionMiddleware(endpoint, paths=("/api/v1/common",), minimum_size=minimum_size)
+        headers = [(b"accept-encoding", accept_encoding.encode())] if accept_encoding is not None else []
+        scope = {"type": "http", "path": "/api/v1/common/process/stream", "headers": headers}
+        await middleware(scope, None, send)
+        return dict(sent[0]["headers"]), [message["body"] for message in sent[1:]]
+
+    def test_preferred_follows_quality_values(self):
+        """Test Accept and Accept-Encoding are ranked by q, with wildcards and refusals"""
+        from infrastructure.serialization import JSON, MSGPACK, preferred
+
+        encodings = ("zstd", "gzip")
+        assert preferred("gzip;q=0.5, zstd", encodings) == "zstd"
+        assert preferred("gzip, zstd;q=0", encodings) == "gzip"
+        assert preferred("br, gzip, zstd", encodings) == "zstd"
+        assert preferred("*;q=0.1, gzip", encodings) == "gzip"
+        assert preferred("identity", encodings) is None
+        assert preferred(None, encodings) == "zstd"
+        assert preferred("application/x-msgpack, application/json;q=0.9", (JSON, MSGPACK)) == MSGPACK
+        assert preferred("application/*", (JSON, MSGPACK)) == JSON
+        assert preferred("text/html", (JSON, MSGPACK)) is None
+
+    def test_large_process_response_is_gzipped(self):
+        """Test a batch response above the threshold is sent gzip-compressed"""
+        response = self._post_process({"Accept-Encoding": "gzip"})
+
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert int(response.headers["content-length"]) < len(response.content) / 5
+        assert len(response.json()) == 60
+
+    def test_small_or_unwanted_responses_are_not_compressed(self):
+        """Test bodies under the threshold and clients without gzip get plain JSON"""
+        client = TestClient(app)
+        with patch('controllers.search_controller.search_service.search') as mock_search:
+            mock_search.return_value = [SearchResult(first_name="Иван", user_id=1)]
+            small = client.get("/api/v1/domclick/search/phone/79319999999", headers={"Accept-Encoding": "gzip"})
+        identity = self._post_process({"Accept-Encoding": "identity"})
+
+        assert "content-encoding" not in small.headers
+        assert small.json()["body"]["results"][0]["user_id"] == 1
+        assert "content-encoding" not in identity.headers
+        assert int(identity.headers["content-length"]) == len(identity.content)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("accept_encoding", [None, "", "*", "identity"])
+    async def test_compression_needs_a_listed_coding(self, accept_encoding):
+        """Test a client that does not name gzip or zstd gets an uncompressed body"""
+        body = b'{"index": 0}\n' * 200
+        headers, bodies = await self._run_middleware([body], accept_encoding)
+
+        assert b"content-encoding" not in headers
+        assert bodies == [body]
+
+    @pytest.mark.asyncio
+    async def test_streamed_chunks_are_flushed(self):
+        """Test each streamed chunk decompresses on arrival, before the stream ends"""
+        import zlib
+
+        lines = [b'{"index": %d}\n' % i for i in range(3)]
+        headers, bodies = await self._run_middleware(lines, "gzip")
+
+        assert headers[b"content-encoding"] == b"gzip"
+        assert b"content-length" not in headers
+        decompressor = zlib.decompressobj(31)
+        assert [decompressor.decompress(body) for body in bodies] == lines
+        assert decompressor.eof
+
+    @pytest.mark.asyncio
+    async def test_existing_content_encoding_is_kept(self):
+        """Test a response that is already encoded passes through untouched"""
+        from infrastructure.compression import CompressionMiddleware
+
+        async def endpoint(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": [(b"content-encoding", b"br")]})
+            await send({"type": "http.response.body", "body": b"x" * 2048})
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "path": "/api/v1/common/process", "headers": [(b"accept-encoding", b"gzip")]}
+        await CompressionMiddleware(endpoint, paths=("/api/v1/common",))(scope, None, send)
+        assert sent[1]["body"] == b"x" * 2048
+
+    @pytest.mark.asyncio
+    async def test_zstd_is_preferred_when_installed(self):
+        """Test zstd is chosen on a tie with gzip and decodes back to the body"""
+        zstandard = pytest.importorskip("zstandard")
+
+        body = b'{"query": "79319999999"}\n' * 100
+        headers, bodies = await self._run_middleware([body], "gzip, zstd")
+
+        assert headers[b"content-encoding"] == b"zstd"
+        assert zstandard.ZstdDecompressor().decompressobj().decompress(b"".join(bodies)) == body
+
+    def test_msgpack_matches_json(self):
+        """Test Accept: application/msgpack returns the same responses as MessagePack"""
+        msgpack = pytest.importorskip("msgpack")
+
+        as_json = self._post_process({}, count=3)
+        as_msgpack = self._post_process({"Accept": "application/msgpack"}, count=3)
+
+        assert as_msgpack.headers["content-type"] == "application/msgpack"
+        assert "Accept" in as_msgpack.headers["vary"]
+        assert msgpack.unpackb(as_msgpack.content) == as_json.json()
+
+class TestLoopWatchdog:
+    """Test event loop lag measurement, stall stacks and the admin profiler"""
+
+    @pytest.mark.asyncio
+    async def test_blocking_call_is_reported_with_its_stack(self):
+        """Test a synchronous call holding the loop is logged with its own frame"""
+        from infrastructure.loop_watchdog import LoopWatchdog
+
+        def hold_the_loop():
+            time.sleep(0.3)
+
+        watchdog = LoopWatchdog(interval=0.02, threshold=0.1)
+        await watchdog.start()
+        try:
+            await asyncio.sleep(0.05)
+            hold_the_loop()
+            await asyncio.sleep(0.05)
+        finally:
+            await watchdog.stop()
+
+        stats = watchdog.stats()
+        assert stats["stalls"] == 1
+        assert stats["max_lag_ms"] >= 200
+        assert "hold_the_loop" in stats["last_stall"]
+        assert "hold_the_loop" in watchdog.recent[-1]["stack"]
+
+    @pytest.mark.asyncio
+    async def test_idle_loop_has_no_stalls(self):
+        """Test an idle loop stays below the stall threshold"""
+        from infrastructure.loop_watchdog import LoopWatchdog
+
+        watchdog = LoopWatchdog(interval=0.01, threshold=0.1)
+        await watchdog.start()
+        await asyncio.sleep(0.1)
+        await watchdog.stop()
+
+        assert watchdog.stalls == 0
+        assert watchdog.stats()["running"] is False
+
+    @pytest.mark.asyncio
+    async def test_profiler_finds_busy_function(self):
+        """Test sampling attributes loop time to the function burning CPU"""
+        from infrastructure.profiler import ProfilerBusy, SamplingProfiler
+
+        profiler = SamplingProfiler()
+
+        def spin(seconds):
+            until = time.perf_counter() + seconds
+            while time.perf_counter() < until:
+                pass
+
+        async def busy():
+            until = time.perf_counter() + 0.3
+            # Each yield ends in a zero-timeout select that releases the GIL, so the sampler
+            # often lands there; long spins keep those idle samples a small minority
+            while time.perf_counter() < until:
+                spin(0.05)
+                await asyncio.sleep(0)
+
+        profile = asyncio.ensure_future(profiler.profile(0.25, 0.002))
+        await asyncio.sleep(0)
+        with pytest.raises(ProfilerBusy):
+            await profiler.profile(0.1, 0.01)
+        await busy()
+        report = await profile
+
+        assert report["samples"] > 10
+        assert report["busy_ratio"] > 0.5
+        assert report["top_self"][0]["function"] == "test_sfera.py:spin"
+        assert any(line.endswith(f" {report['top_self'][0]['samples']}") for line in report["folded"])
+        assert not profiler.running
+
+    def test_admin_endpoints_require_token(self):
+        """Test admin routes are hidden without ADMIN_TOKEN and refuse a wrong token"""
+        from core.config import settings
+
+        client = TestClient(app)
+        with patch.object(settings, "ADMIN_TOKEN", ""):
+            assert client.get("/api/v1/admin/loop").status_code == 404
+        with patch.object(settings, "ADMIN_TOKEN", "secret"):
+            assert client.get("/api/v1/admin/loop").status_code == 403
+            assert client.get("/api/v1/admin/loop", headers={"X-Admin-Token": "wrong"}).status_code == 403
+            response = client.get("/api/v1/admin/loop", headers={"X-Admin-Token": "secret"})
+
+        assert response.status_code == 200
+        assert {"max_lag_ms", "stalls", "recent"} <= set(response.json())
+
+    def test_profile_endpoint(self):
+        """Test a time-boxed profile is returned as JSON or folded stacks"""
+        from core.config import settings
+
+        client = TestClient(app)
+        headers = {"X-Admin-Token": "secret"}
+        with patch.object(settings, "ADMIN_TOKEN", "secret"), patch.object(settings, "PROFILE_MAX_SECONDS", 1):
+            report = client.post("/api/v1/admin/profile?seconds=0.05&interval=0.005", headers=headers)
+            folded = client.post("/api/v1/admin/profile?seconds=0.05&format=folded", headers=headers)
+            too_long = client.post("/api/v1/admin/profile?seconds=5", headers=headers)
+
+        assert report.status_code == 200
+        assert report.json()["samples"] > 0
+        assert folded.headers["content-type"].startswith("text/plain")
+        assert too_long.status_code == 400
+
+class TestAdmissionControl:
+    """Test the adaptive concurrency limit and load shedding"""
+
+    @staticmethod
+    def _limit(**kwargs):
+        from infrastructure.admission import AdaptiveLimit
+
+        options = dict(initial=10, min_limit=2, max_limit=20)
+        options.update(kwargs)
+        return AdaptiveLimit(**options)
+
+    def test_admits_up_to_the_limit(self):
+        """Test weights are admitted while they fit and an idle worker admits anything"""
+        limit = self._limit()
+
+        assert limit.try_acquire(50)
+        assert not limit.try_acquire(1)
+        limit.release(50)
+        assert limit.try_acquire(6) and limit.try_acquire(4)
+        assert not limit.try_acquire(1)
+        assert (limit.admitted, limit.rejected) == (3, 2)
+
+    def test_latency_above_tolerance_cuts_limit_once_per_round_trip(self):
+        """Test slow completions back the limit off, one cut per round trip"""
+        limit = self._limit()
+        for _ in range(5):
+            limit.try_acquire(1)
+            limit.release(1, latency=0.5)
+        baseline = limit.baseline
+
+        for _ in range(10):
+            limit.try_acquire(1)
+            limit.release(1, latency=5.0)
+
+        assert limit.limit == pytest.approx(9.0)
+        assert limit.decreases == 1
+        assert limit.baseline == pytest.approx(baseline)
+
+    def test_busy_fast_completions_raise_limit(self):
+        """Test the limit grows additively while it is used and latency holds"""
+        limit = self._limit(max_limit=11)
+        for _ in range(100):
+            for _ in range(8):
+                limit.try_acquire(1)
+            for _ in range(8):
+                limit.release(1, latency=0.01)
+
+        assert limit.limit == 11
+
+    def test_slow_start_until_first_cut(self):
+        """Test the limit grows by whole weights until congestion, then by weight / limit"""
+        limit = self._limit(max_limit=100)
+        sizes = []
+        while limit.limit < 100:
+            weight = limit.limit
+            limit.try_acquire(weight)
+            limit.release(weight, latency=0.01)
+            sizes.append(limit.limit)
+        assert sizes == [20, 40, 80, 100]
+
+        limit.release(0, overloaded=True)
+        limit.try_acquire(60)
+        limit.release(10, latency=0.01)
+        assert limit.limit == pytest.approx(90 + 10 / 90)
+
+    def test_idle_completions_keep_limit(self):
+        """Test a mostly idle worker does not inflate its limit"""
+        limit = self._limit()
+        for _ in range(50):
+            limit.try_acquire(1)
+            limit.release(1, latency=0.01)
+
+        assert limit.limit == 10
+
+    def test_timeouts_and_upstream_queue_cut_limit(self):
+        """Test 504s and a backlog of upstream calls count as overload"""
+        queued = [0]
+        limit = self._limit(queued=lambda: queued[0], capacity=10, max_backlog=2)
+        limit.try_acquire(1)
+        limit.release(1, overloaded=True)
+        assert limit.limit == pytest.approx(9.0)
+
+        queued[0] = 20
+        limit.try_acquire(1)
+        limit.release(1, latency=0.01)
+        assert limit.limit == pytest.approx(9.0)
+
+        queued[0] = 21
+        limit._decreased_at = 0.0
+        limit.try_acquire(1)
+        limit.release(1, latency=0.01)
+        assert limit.limit == pytest.approx(8.1)
+        assert limit.stats()["queued_upstream"] == 21
+
+    @pytest.mark.asyncio
+    async def test_batches_weigh_their_queries(self):
+        """Test a batch is admitted by its length, then holds one unit per parsed query"""
+        import json
+        from infrastructure.admission import AdmissionMiddleware, admit_queries
+
+        release = asyncio.Event()
+        received = []
+
+        async def endpoint(scope, receive, send):
+            body, more_body = b"", True
+            while more_body:
+                message = await receive()
+                body += message["body"]
+                more_body = message["more_body"]
+            received.append(body)
+            admit_queries(len(json.loads(body)["queries"]))
+            await release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        middleware = AdmissionMiddleware(endpoint, self._limit(initial=8), ("/api/v1/common/process",))
+
+        async def call(queries):
+            body = json.dumps({"queries": queries}).encode()
+            chunks = [
+                {"type": "http.request", "body": body[:10], "more_body": True},
+                {"type": "http.request", "body": body[10:], "more_body": False},
+            ]
+
+            async def receive():
+                return chunks.pop(0)
+
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {"type": "http", "method": "POST", "path": "/api/v1/common/process",
+                     "headers": [(b"content-length", str(len(body)).encode())]}
+            await middleware(scope, receive, send)
+            return sent
+
+        first = asyncio.ensure_future(call(["79319999999"] * 5))
+        await asyncio.sleep(0.01)
+        assert middleware.limit.inflight == 5
+        # Unparsed, four phones may be up to 18 queries by their length
+        rejected = await call(["79310000000"] * 4)
+        release.set()
+        accepted = await first
+
+        assert rejected[0]["status"] == 503
+        assert dict(rejected[0]["headers"])[b"retry-after"] == b"1"
+        assert accepted[0]["status"] == 200
+        assert json.loads(received[0]) == {"queries": ["79319999999"] * 5}
+        assert middleware.limit.inflight == 0
+
+    def test_overloaded_worker_answers_503(self):
+        """Test the app sheds lookups at once when its limit is used up"""
+        from infrastructure.main import admission
+
+        client = TestClient(app)
+        with patch.object(admission, "inflight", admission.limit), \
+                patch('controllers.search_controller.search_service.search') as mock_search:
+            response = client.get("/api/v1/domclick/search/phone/79319999999")
+
+        assert response.status_code == 503
+        assert int(response.headers["retry-after"]) >= 1
+        mock_search.assert_not_called()
+        assert admission.stats()["rejected"] >= 1
+
 # Run tests
 if __name__ == "__main__":
     pytest.main([__file__, "-v", "-s"])